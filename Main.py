@@ -1,7 +1,9 @@
-from typing import Dict
+from typing import Dict, List
 
 import tkinter as tk
 from tkinter import ttk
+from tkinter import messagebox
+from tkinter import filedialog
 from tkinterdnd2 import DND_FILES, TkinterDnD
 
 import os
@@ -9,20 +11,21 @@ import os
 from utils import utils
 from widgets import widgets
 import models
-import writers
+import generator
+import validators
+import history
+from store import SpellStore
+from project import Project
 from data import BG3Database
 
 # Main Frame
 class FolderStructure(tk.Frame):
-    ATLAS_BASE_PATH = os.path.join("Assets", "Textures", "Icons", "Icons_" + "{0}" + ".dds")
-    ATLAS_PATH = os.path.join("Public", "{0}", ATLAS_BASE_PATH)
-    CONTROLLER_ICON_PATH = os.path.join("Public", "Game", "GUI", "Assets", "ControllerUIIcons", "skills_png", "{0}" + ".DDS")
-    TOOLTIP_ICON_PATH = os.path.join("Public", "Game", "GUI", "Assets", "Tooltips", "Icons", "{0}" + ".DDS")
-
     def __init__(self, master=None, **kwargs) -> None:
         super().__init__(master, **kwargs)
 
-        self.spells: Dict[str,models.Spell] = {}
+        self.spells: SpellStore = SpellStore()
+        self.validator = validators.SpellValidator()
+        self.history = history.History()
 
         top_frame = tk.Frame(master)
         top_frame.pack(side=tk.TOP, fill=tk.X)
@@ -46,13 +49,14 @@ class FolderStructure(tk.Frame):
         button_AddSpell = tk.Button(add_remove_spell_frame, text="+", command=self.on_add_spell_click)
         button_AddSpell.pack(side=tk.RIGHT, fill=tk.X, expand=True)
 
-        self.spellTabWidget = widgets.ReorderableList(self.left_frame, width=150, cellHeight=20)
+        self.spellTabWidget = widgets.ReorderableList(self.left_frame, width=150, cellHeight=20, on_reorder=self.on_reorder)
         self.spellTabWidget.pack(fill=tk.Y, expand=True)
 
         self.on_add_spell_click()        
+        self.history.clear()
 
         # Spell Container for Information relevant to the a single spell
-        self.spellWidget = widgets.SpellWidget(center_frame)
+        self.spellWidget = widgets.SpellWidget(center_frame, validator=self.validator)
         self.spellWidget.fromSpell(self.spells[next(iter(self.spells.keys()))])
         self.spellWidget.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True) 
         
@@ -60,79 +64,187 @@ class FolderStructure(tk.Frame):
         bottom_frame = tk.Frame(master, background="green")
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, expand=False)
         button_Generate = tk.Button(bottom_frame, text="Generate Files", command=self.on_Generate_Click)
-        button_Generate.pack()
+        button_Generate.pack(side=tk.RIGHT)
+        button_SaveProject = tk.Button(bottom_frame, text="Save Project", command=self.on_SaveProject_Click)
+        button_SaveProject.pack(side=tk.LEFT)
+        button_LoadProject = tk.Button(bottom_frame, text="Load Project", command=self.on_LoadProject_Click)
+        button_LoadProject.pack(side=tk.LEFT)
 
-    def on_reorderable_click(self, value: models.Spell) -> None:
+        master.bind_all("<Control-z>", self.on_undo)
+        master.bind_all("<Control-y>", self.on_redo)
+        master.bind_all("<Control-Z>", self.on_redo)
+
+    # Writes the spell widget back to its spell and the store, returning whether anything changed
+    # The fields the user changed are recorded for undo, filling in the defaults a new spell shows is not an edit
+    def saveSpell(self) -> bool:
+        spell = self.spellWidget.ref_spell
+        if not self.spellWidget.dirty:
+            return False
+
+        edited = self.spellWidget.edited
+        before = spell.toDict()
         self.spellWidget.save()
-        self.spellTabWidget.renameLables({uuid : spell.getName() for uuid, spell in self.spells.items()}) 
+        self.spells.refresh(spell)
+        if edited:
+            self.history.record(history.Edit(f"Edit {spell.id}", history.Change.Diff(spell.uuid, before, spell.toDict())))
+        return True
+
+    def on_reorder(self, uuid: str, old: int, new: int) -> None:
+        self.history.record(history.Edit("Move spell", [history.Change("move", uuid, None, old, new)]))
+
+    # Unsaved edits to the shown spell are recorded first, so they are what gets undone
+    def on_undo(self, event=None) -> None:
+        self.saveSpell()
+        edit = self.history.undo(self.applyChange)
+        if edit:
+            self.showChanged(edit)
+
+    def on_redo(self, event=None) -> None:
+        self.saveSpell()
+        edit = self.history.redo(self.applyChange)
+        if edit:
+            self.showChanged(edit)
+
+    # Reverts (undo=True) or reapplies one recorded change to the spells, the list and the validator
+    def applyChange(self, change: history.Change, undo: bool) -> None:
+        value = change.before if undo else change.after
+        if change.kind == "field":
+            spell = self.spells[change.uuid]
+            history.Change.Set(spell, change.key, value)
+            self.spells.refresh(spell)
+            self.validator.updateSpell(spell)
+            if change.key == "name":
+                self.spellTabWidget.renameLabel(spell.uuid, spell.getName())
+        elif change.kind == "move":
+            self.spellTabWidget.move(change.uuid, value)
+        elif (change.kind == "add") != undo:
+            self.addSpell(change.after or change.before, index=change.key)
+        else:
+            self.removeSpell(change.uuid)
+
+    # Shows the spell an undone or redone edit touched, or the one shown before if it was removed
+    def showChanged(self, edit: history.Edit) -> None:
+        spell = self.spells.get(edit.changes[-1].uuid) or self.spells.get(self.spellWidget.ref_spell.uuid)
+        if spell is None:
+            spell = self.spells[self.spellTabWidget.widget_data[-1]["ref_uuid"]]
+        self.spellWidget.fromSpell(spell)
+
+    # Only the spell being left can have been edited, so only its label is renamed
+    def on_reorderable_click(self, value: models.Spell) -> None:
+        spell = self.spellWidget.ref_spell
+        if self.saveSpell():
+            self.spellTabWidget.renameLabel(spell.uuid, spell.getName())
         self.spellWidget.fromSpell(value)
 
     def on_add_spell_click(self) -> None:
         spell = models.Spell(uuid=utils.Generate_UUID())
         spell.id = f"Default_Spell_{len(self.spells)}"
         spell.setName(f"Spell {len(self.spells)}")
+        self.history.record(history.Edit("Add spell", [history.Change("add", spell.uuid, len(self.spellTabWidget.widget_data), None, spell)]))
+        self.addSpell(spell)
+
+    # Appends the spell to the list, or inserts it at index
+    def addSpell(self, spell: models.Spell, index: int = None) -> None:
         self.spells[spell.uuid] = spell
+        self.validator.addSpell(spell)
         
         widget = tk.Label(self.left_frame, text=f"{spell.getName()}", width=16, padx=4)
-        self.spellTabWidget.add_widget(widget, ref_uuid=spell.uuid, callback=lambda s=spell: self.on_reorderable_click(s))
+        self.spellTabWidget.add_widget(widget, ref_uuid=spell.uuid, callback=lambda s=spell: self.on_reorderable_click(s), index=index)
+
+    def removeSpell(self, uuid: str) -> models.Spell:
+        self.spellTabWidget.remove_widget(uuid=uuid)
+        spell = self.spells.pop(uuid)
+        self.validator.removeSpell(spell)
+        return spell
 
     def on_remove_spell_click(self) -> None:
         if len(self.spells) > 1:
+            self.saveSpell()
             uuid = self.spellWidget.ref_spell.uuid
+            index = self.spellTabWidget.index(uuid)
             
-            self.spellTabWidget.remove_widget(uuid=uuid)
-            self.spells.pop(uuid)
+            spell = self.removeSpell(uuid)
+            self.history.record(history.Edit(f"Remove {spell.id}", [history.Change("remove", uuid, index, spell, None)]))
             
             (_,nextSpell) = list(self.spells.items())[-1]
             self.spellWidget.fromSpell(nextSpell)
             
+    def toProject(self) -> Project:
+        self.saveSpell()
+        spells = [self.spells[data["ref_uuid"]] for data in self.spellTabWidget.widget_data]
+        return self.modWidget.toProject(Project(spells=spells))
+
+    def on_SaveProject_Click(self) -> None:
+        path = filedialog.asksaveasfilename(defaultextension=Project.fileExtension, filetypes=[("Spell Project", "*" + Project.fileExtension)], initialfile=self.modWidget.Name)
+        if path:
+            self.toProject().save(path)
+
+    def on_LoadProject_Click(self) -> None:
+        path = filedialog.askopenfilename(filetypes=[("Spell Project", "*" + Project.fileExtension)])
+        if not path:
+            return
+
+        project = Project.Load(path)
+        if not project.spells:
+            return
+
+        for uuid in list(self.spells.keys()):
+            self.removeSpell(uuid)
+
+        for spell in project.spells:
+            self.addSpell(spell)
+        self.history.clear()
+
+        self.modWidget.fromProject(project)
+        self.spellWidget.fromSpell(project.spells[0])
+
+    # The validation problems of one severity, one line each and at most 20 of them
+    def validationLines(self, severity: str) -> List[str]:
+        lines = []
+        for (uuid, results) in self.validator.getIssues().items():
+            for r in results:
+                if r.severity == severity:
+                    lines.append(f"{self.spells[uuid].id}: {r}")
+
+        return lines[:20] + ([f"... and {len(lines) - 20} more"] if len(lines) > 20 else [])
+
+    # Only errors ask whether to generate anyway, warnings are shown once the mod is generated
+    def confirmValidation(self) -> bool:
+        if not self.validator.hasErrors():
+            return True
+
+        return messagebox.askyesno("Validation", "\n".join(self.validationLines(validators.ValidationResult.ERROR)) + "\n\nGenerate anyway?")
+
     # Create a button widget and define its click action
     def on_Generate_Click(self):
         
         # Parse UI
         modName = self.modWidget.Name
         modPath = self.modWidget.Path
-        spellWidget = self.spellWidget
-        spellWidget.save()
+        self.saveSpell()
 
-        spellTemplateFile = writers.SpellFile(fileName=f"{modName}_Spells")
-        localizationFile = writers.LocalizationFile(fileName=modName)
-        spellListCombinerFile = writers.SpellListCombinerFile()
-        
-        imageMover = writers.ImageMover()
-
-        atlasFile = writers.AtlasFile(uuid=utils.Generate_UUID(), fileName=f"Icons_{modName}",atlasTemplate="templates/atlas_256.dds", iconSize=64, icons=[])
-        atlasTemplateFile = writers.AtlasTemplateFile(fileName=atlasFile.fileName, path=self.ATLAS_BASE_PATH.format(modName), atlas=atlasFile, icons=[])
-        mergedTemplateFile = writers.MergedFile(uuid=atlasFile.uuid, name=atlasFile.fileName, sourceFile=self.ATLAS_PATH.format(modName), template=f"Icons_{modName}")
-               
-        for data in self.spellTabWidget.widget_data:
-            spell = self.spells[data["ref_uuid"]]
-            
-            spellTemplateFile.addSpell(spell)
+        spells = [self.spells[data["ref_uuid"]] for data in self.spellTabWidget.widget_data]
 
-            localizationFile.addElement(spell.name)
-            localizationFile.addElement(spell.description)
+        # Icons may have changed on disc since they were dropped
+        self.validator.validateIcons(spells)
+        if not self.confirmValidation():
+            return
 
-            imageMover.addImage(models.PathVector(inPath=spell.controllerIcon, outPath=self.CONTROLLER_ICON_PATH.format(spell.id)))
-            imageMover.addImage(models.PathVector(inPath=spell.tooltipIcon, outPath=self.TOOLTIP_ICON_PATH.format(spell.id)))
+        modGenerator = generator.ModGenerator(modName=modName, spells=spells, binary=self.modWidget.Binary, atlasFormat=self.modWidget.AtlasFormat, factorStats=self.modWidget.FactorStats, mergeStats=self.modWidget.MergeStats)
 
-            atlasFile.addIcon(spell.controllerIcon)
-            atlasTemplateFile.addIcon(spell.id)
+        # Do Exports to disc
+        if self.modWidget.WriteFiles:
+            modGenerator.export(modPath)
 
-            spellListCombinerFile.addElement(name=f"{spell.spellType}_{spell.id}", listUUIDs=spell.lists)
+        if self.modWidget.Pack:
+            modGenerator.pack(modPath)
 
-        # Do Exports to disc
-        spellTemplateFile.export(os.path.join(modPath, modName, "Public", modName, "Stats", "Generated", "Data"))
-        localizationFile.export(os.path.join(modPath, modName, "Localization", "English"))
-        imageMover.export(os.path.join(modPath, modName))
-        atlasTemplateFile.export(os.path.join(modPath, modName, "Public", modName, "GUI"))
-        mergedTemplateFile.export(os.path.join(modPath, modName, "Public", modName, "Content", "UI", "[PAK]_UI"))
-        spellListCombinerFile.export(os.path.join(modPath, modName, "Public", modName , "Lists"))
-
-        atlasFile.export(os.path.join(modPath, modName, os.path.dirname(self.ATLAS_PATH.format(modName))))
-        
-        if not os.path.exists(os.path.join(modPath, modName, "Mods")):
-            os.makedirs(os.path.join(modPath, modName, "Mods"))
+        if self.modWidget.Archive:
+            modGenerator.archive(modPath, self.modWidget.Archive)
+
+        warnings = self.validationLines(validators.ValidationResult.WARNING)
+        if warnings:
+            messagebox.showwarning("Validation", "Generated with warnings:\n\n" + "\n".join(warnings))
 
 
 # Create the main window
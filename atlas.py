@@ -0,0 +1,237 @@
+from typing import List, Dict
+
+import os
+import io
+import json
+import base64
+import hashlib
+import numpy as np
+from PIL import Image
+
+import bcn
+import writers
+from dds import DDS
+
+# Which atlas cell each spell id occupies and what was drawn in every cell, kept next to the mod between builds
+# Spells keep their cell while they exist, so the atlas UVs of unchanged spells never move
+class AtlasLayout:
+    VERSION: int = 1
+
+    def __init__(self) -> None:
+        self.cells: Dict[str, int] = {}
+
+        # What the atlas was last built from: the template, the icon signature of each cell and the resulting file
+        self.source: dict = {}
+        self.signatures: Dict[int, list] = {}
+        self.hash: str = None
+
+        # The block compressed mip levels too small to patch a cell at a time, as RGBA pixels
+        self.tail: np.ndarray = None
+
+    # Gives every id a cell, keeping the cells of ids seen before and filling the lowest free cells
+    # Ids that don't fit get None, and duplicates share the first one's cell
+    def assign(self, ids: List[str], capacity: int) -> List[int | None]:
+        present = set(ids)
+        self.cells = {id: cell for (id, cell) in self.cells.items() if id in present and cell < capacity}
+
+        used = set(self.cells.values())
+        free = (cell for cell in range(capacity) if cell not in used)
+        for id in ids:
+            if id not in self.cells:
+                cell = next(free, None)
+                if cell is None:
+                    break
+                self.cells[id] = cell
+
+        return [self.cells.get(id) for id in ids]
+
+    @staticmethod
+    def Load(path: str) -> "AtlasLayout":
+        layout = AtlasLayout()
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                value = json.load(file)
+        except (OSError, ValueError):
+            return layout
+
+        if value.get("version") != AtlasLayout.VERSION:
+            return layout
+
+        layout.cells = value.get("cells", {})
+        layout.source = value.get("source", {})
+        layout.signatures = {int(k): v for (k, v) in value.get("signatures", {}).items()}
+        layout.hash = value.get("hash")
+        if value.get("tail"):
+            (h, w) = value["tailSize"]
+            layout.tail = np.frombuffer(base64.b64decode(value["tail"]), dtype=np.uint8).reshape(h, w, 4).copy()
+
+        return layout
+
+    def save(self, path: str) -> None:
+        value = {
+            "version": AtlasLayout.VERSION,
+            "cells": self.cells,
+            "source": self.source,
+            "signatures": {str(k): v for (k, v) in self.signatures.items()},
+            "hash": self.hash,
+        }
+        if self.tail is not None:
+            value["tailSize"] = list(self.tail.shape[:2])
+            value["tail"] = base64.b64encode(self.tail.tobytes()).decode("ascii")
+
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(value, file)
+        os.replace(temporary, path)
+
+# Rewrites only the changed cells of an atlas file that was built from the same template and settings
+# Block compressed mip levels are re-encoded a cell at a time while a cell still covers whole blocks,
+# the rest of the chain is rebuilt from the small tail image kept in the layout. The result matches a full rebuild
+class AtlasPatcher:
+    def __init__(self, atlas: writers.AtlasFile) -> None:
+        self.atlas: writers.AtlasFile = atlas
+        (self.width, self.height) = atlas.size
+        self.cellSize: int = atlas.iconSize[0]
+        self.columns: int = self.width // self.cellSize
+        self.rows: int = self.height // self.cellSize
+
+        # Mip levels 0 .. cellLevels-1 are block aligned within a cell
+        self.cellLevels: int = 1
+        if atlas.compression:
+            while (self.cellSize >> self.cellLevels) % 4 == 0 and (self.cellSize >> self.cellLevels) > 0:
+                self.cellLevels += 1
+
+    # Only square power of two cells that tile the atlas exactly can be patched
+    def patchable(self) -> bool:
+        size = self.cellSize
+        return size >= 4 and size & (size - 1) == 0 and self.width % size == 0 and self.height % size == 0
+
+    # Everything a finished atlas depends on besides its icons
+    def source(self) -> dict:
+        stat = os.stat(self.atlas.atlasTemplate)
+        return {
+            "template": [os.path.abspath(self.atlas.atlasTemplate), stat.st_mtime_ns, stat.st_size],
+            "size": [self.width, self.height],
+            "cellSize": self.cellSize,
+            "compression": self.atlas.compression,
+        }
+
+    # What is drawn in each cell: the icon file and its modification time, or None for the bare template
+    def signatures(self) -> Dict[int, list]:
+        signatures = {}
+        for cell in range(self.columns * self.rows):
+            path = self.atlas.icons[cell] if cell < len(self.atlas.icons) else None
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                signatures[cell] = [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+        return signatures
+
+    # The RGBA pixels of some cells, reading each template row once
+    def cellPixels(self, cells: List[int]) -> Dict[int, np.ndarray]:
+        pixels = {}
+        size = self.cellSize
+
+        for row in sorted({cell // self.columns for cell in cells}):
+            band = self.atlas.templateBand(row * size, size)
+
+            for cell in cells:
+                if cell // self.columns != row:
+                    continue
+
+                column = cell % self.columns
+                image = band.crop((column * size, 0, (column + 1) * size, size))
+                path = self.atlas.icons[cell] if cell < len(self.atlas.icons) else None
+                if path and os.path.exists(path):
+                    image.paste(writers.imageCache.get(path), (0, 0))
+                pixels[cell] = np.asarray(image, dtype=np.uint8)
+
+        return pixels
+
+    # The tail image, the first mip level in which cells no longer cover whole blocks
+    def buildTail(self) -> np.ndarray | None:
+        if not self.atlas.compression or not self.patchable():
+            return None
+
+        tailSize = self.cellSize >> self.cellLevels
+        tail = np.zeros((self.rows * tailSize, self.columns * tailSize, 4), dtype=np.uint8)
+        for (cell, pixels) in self.cellPixels(list(range(self.columns * self.rows))).items():
+            self._setTail(tail, cell, pixels)
+        return tail
+
+    def _setTail(self, tail: np.ndarray, cell: int, pixels: np.ndarray) -> List[np.ndarray]:
+        levels = [pixels]
+        for _ in range(1, self.cellLevels + 1):
+            levels.append(bcn.BCEncoder.Downsample(levels[-1], fy=2))
+
+        tailSize = self.cellSize >> self.cellLevels
+        (row, column) = divmod(cell, self.columns)
+        tail[row*tailSize:(row+1)*tailSize, column*tailSize:(column+1)*tailSize] = levels[-1]
+        return levels[:-1]
+
+    # Cells whose icon changed since the layout was saved
+    def changedCells(self, layout: AtlasLayout) -> List[int]:
+        old = layout.signatures
+        new = self.signatures()
+        return [cell for cell in range(self.columns * self.rows) if old.get(cell) != new.get(cell)]
+
+    # The atlas with only some cells rewritten, or None when the existing file can't be patched
+    def patch(self, data: bytes, cells: List[int], layout: AtlasLayout) -> bytes | None:
+        if not self.patchable():
+            return None
+
+        info = DDS.StreamInfo(io.BytesIO(data))
+        if not info or info.size != (self.width, self.height):
+            return None
+
+        output = bytearray(data)
+        pixels = self.cellPixels(cells)
+
+        if not self.atlas.compression:
+            # PIL's layout: one level of 32 bit BGRA
+            if info.format != "RGBA32" or info.mipCount != 1 or len(data) != DDS.HEADER_SIZE + self.width * self.height * 4:
+                return None
+
+            size = self.cellSize
+            for (cell, cellPixels) in pixels.items():
+                (row, column) = divmod(cell, self.columns)
+                rows = Image.fromarray(cellPixels, "RGBA").tobytes("raw", "BGRA")
+                for y in range(size):
+                    offset = DDS.HEADER_SIZE + ((row * size + y) * self.width + column * size) * 4
+                    output[offset:offset + size * 4] = rows[y * size * 4:(y + 1) * size * 4]
+            return bytes(output)
+
+        encoder = bcn.BCEncoder(self.atlas.compression)
+        fourCC = bcn.BCEncoder.FOURCC[self.atlas.compression]
+        blockSize = DDS.BLOCK_SIZES[fourCC]
+        mipCount = bcn.BCEncoder.MipCount(self.width, self.height)
+        if info.format != fourCC or info.mipCount != mipCount or layout.tail is None:
+            return None
+
+        levelOffsets = [DDS.HEADER_SIZE]
+        for level in range(mipCount):
+            levelOffsets.append(levelOffsets[-1] + DDS.LevelSize(fourCC, max(1, self.width >> level), max(1, self.height >> level)))
+        if levelOffsets[-1] != len(data):
+            return None
+
+        tail = layout.tail.copy()
+        for (cell, cellPixels) in pixels.items():
+            (row, column) = divmod(cell, self.columns)
+            for (level, levelPixels) in enumerate(self._setTail(tail, cell, cellPixels)):
+                # Blocks of this cell at this level, written a block row at a time
+                cellBlocks = (self.cellSize >> level) // 4
+                rowBytes = ((self.width >> level) + 3) // 4 * blockSize
+                encoded = encoder.encodeLevel(levelPixels)
+                for blockRow in range(cellBlocks):
+                    offset = levelOffsets[level] + (row * cellBlocks + blockRow) * rowBytes + column * cellBlocks * blockSize
+                    output[offset:offset + cellBlocks * blockSize] = encoded[blockRow * cellBlocks * blockSize:(blockRow + 1) * cellBlocks * blockSize]
+
+        # The small levels are cheap enough to re-encode whole
+        tailLevels = bcn.BCEncoder.MipChain(tail)
+        output[levelOffsets[self.cellLevels]:] = b"".join(encoder.encodeLevel(level) for level in tailLevels)
+        layout.tail = tail
+
+        return bytes(output)
+
+# The sha256 of an atlas file
+def Hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,245 @@
+from typing import List, Iterable, Iterator
+
+import tempfile
+import numpy as np
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+
+from dds import DDS
+
+# Block compression (BC1 / BC3) of RGBA images with a box filtered mip chain, vectorized over every 4x4 block
+class BCEncoder:
+    FOURCC = {"BC1": "DXT1", "BC3": "DXT5"}
+
+    def __init__(self, format: str = "BC3", mipmaps: bool = True, workers: int = None) -> None:
+        if format not in BCEncoder.FOURCC:
+            raise ValueError(f"Unsupported block compression '{format}'")
+
+        self.format: str = format
+        self.mipmaps: bool = mipmaps
+        self.workers: int = workers
+
+    # A complete .dds file
+    def encode(self, image: Image.Image) -> bytes:
+        levels = BCEncoder.Mipmaps(image) if self.mipmaps else [BCEncoder.Pixels(image)]
+
+        data = DDS.Header(image.width, image.height, BCEncoder.FOURCC[self.format], len(levels))
+        for level in levels:
+            data += self.encodeLevel(level)
+
+        return data
+
+    def encodeLevel(self, pixels: np.ndarray) -> bytes:
+        encode = EncodeBC3 if self.format == "BC3" else EncodeBC1
+
+        # Split into bands of block rows for the process pool, only worth it on large levels
+        blockRows = (pixels.shape[0] + 3) // 4
+        if self.workers and self.workers > 1 and blockRows >= self.workers * 16:
+            bandRows = (blockRows + self.workers - 1) // self.workers * 4
+            bands = [pixels[y:y+bandRows] for y in range(0, pixels.shape[0], bandRows)]
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                return b"".join(executor.map(encode, bands))
+
+        return encode(pixels)
+
+    @staticmethod
+    def Pixels(image: Image.Image) -> np.ndarray:
+        return np.asarray(image.convert("RGBA"), dtype=np.uint8)
+
+    # Every mip level down to 1x1, each the 2x2 average of the one before
+    @staticmethod
+    def Mipmaps(image: Image.Image) -> List[np.ndarray]:
+        return BCEncoder.MipChain(BCEncoder.Pixels(image))
+
+    @staticmethod
+    def MipChain(level: np.ndarray) -> List[np.ndarray]:
+        levels = [level]
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            level = BCEncoder.Downsample(level)
+            levels.append(level)
+
+        return levels
+
+    # The next mip level, dimensions that are already 1 stay 1
+    @staticmethod
+    def Downsample(level: np.ndarray, fy: int = None) -> np.ndarray:
+        fy = fy or (2 if level.shape[0] > 1 else 1)
+        fx = 2 if level.shape[1] > 1 else 1
+        h = level.shape[0] // fy
+        w = level.shape[1] // fx
+
+        source = level[:h*fy, :w*fx].astype(np.uint16).reshape(h, fy, w, fx, 4)
+        return ((source.sum(axis=(1, 3)) + (fy * fx) // 2) // (fy * fx)).astype(np.uint8)
+
+    @staticmethod
+    def MipCount(width: int, height: int) -> int:
+        count = 1
+        while width > 1 or height > 1:
+            (width, height) = (max(1, width // 2), max(1, height // 2))
+            count += 1
+        return count
+
+    # A complete .dds file from an image given as equal height row bands, holding only one band at a time
+    # bandHeight must divide the height and be a multiple of 4. The output is identical to encode() on the whole image
+    # The top level is streamed straight out, smaller levels are spooled to temporary files until it is done,
+    # and the last few levels, too small to split into bands of whole blocks, are encoded from a small image in memory
+    def encodeBands(self, bands: Iterable[np.ndarray], width: int, height: int, bandHeight: int) -> Iterator[bytes]:
+        if height % bandHeight or bandHeight % 4:
+            raise ValueError(f"Band height {bandHeight} must be a multiple of 4 dividing {height}")
+
+        mipCount = BCEncoder.MipCount(width, height) if self.mipmaps else 1
+        yield DDS.Header(width, height, BCEncoder.FOURCC[self.format], mipCount)
+
+        # Levels whose band height is still a whole number of blocks are encoded band by band
+        bandLevels = 1
+        while self.mipmaps and bandLevels < mipCount and (bandHeight >> bandLevels) % 4 == 0 and (bandHeight >> bandLevels) > 0:
+            bandLevels += 1
+
+        spools = [tempfile.TemporaryFile() for _ in range(1, bandLevels)]
+        tail = []
+        try:
+            for band in bands:
+                yield self.encodeLevel(band)
+
+                level = band
+                for spool in spools:
+                    level = BCEncoder.Downsample(level, fy=2)
+                    spool.write(self.encodeLevel(level))
+
+                if bandLevels < mipCount:
+                    tail.append(BCEncoder.Downsample(level, fy=2))
+
+            for spool in spools:
+                spool.seek(0)
+                for chunk in iter(lambda: spool.read(1024 * 1024), b""):
+                    yield chunk
+
+            if tail:
+                for level in BCEncoder.MipChain(np.concatenate(tail, axis=0)):
+                    yield self.encodeLevel(level)
+        finally:
+            for spool in spools:
+                spool.close()
+
+# Splits pixels into (N, 16, 4) blocks in row-major block order, padding the edges by repetition
+def To_Blocks(pixels: np.ndarray) -> np.ndarray:
+    h, w = pixels.shape[:2]
+    ph, pw = (h + 3) // 4 * 4, (w + 3) // 4 * 4
+    if (ph, pw) != (h, w):
+        pixels = np.pad(pixels, ((0, ph - h), (0, pw - w), (0, 0)), mode="edge")
+
+    return pixels.reshape(ph // 4, 4, pw // 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(-1, 16, 4)
+
+# The 16 indices of each block packed into one integer, `bits` bits apiece
+def _Pack_Indices(indices: np.ndarray, bits: int) -> np.ndarray:
+    shifts = (np.arange(16, dtype=np.uint64) * bits)
+    return (indices.astype(np.uint64) << shifts).sum(axis=1)
+
+def _To_565(colors: np.ndarray) -> np.ndarray:
+    c = colors.astype(np.uint32)
+    return (((c[:, 0] * 31 + 127) // 255) << 11) | (((c[:, 1] * 63 + 127) // 255) << 5) | ((c[:, 2] * 31 + 127) // 255)
+
+def _From_565(values: np.ndarray) -> np.ndarray:
+    r = (values >> 11) & 31
+    g = (values >> 5) & 63
+    b = values & 31
+    return np.stack([(r * 255 + 15) // 31, (g * 255 + 31) // 63, (b * 255 + 15) // 31], axis=1).astype(np.int32)
+
+# The 8 byte colour half of a block, always in 4 colour mode
+# Endpoints are the extremes of each block along its principal axis
+def _Encode_Color(blocks: np.ndarray) -> np.ndarray:
+    rgb = blocks[:, :, :3].astype(np.float32)
+    mean = rgb.mean(axis=1, keepdims=True)
+    centered = rgb - mean
+
+    covariance = np.einsum("nki,nkj->nij", centered, centered)
+    axis = np.ones((len(blocks), 3), dtype=np.float32)
+    for _ in range(4):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        axis /= np.maximum(np.abs(axis).max(axis=1, keepdims=True), 1e-8)
+
+    projection = np.einsum("nki,ni->nk", centered, axis)
+    lo = rgb[np.arange(len(blocks)), projection.argmin(axis=1)]
+    hi = rgb[np.arange(len(blocks)), projection.argmax(axis=1)]
+
+    c0 = _To_565(hi)
+    c1 = _To_565(lo)
+
+    # 4 colour mode needs c0 > c1
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    e0 = _From_565(c0)
+    e1 = _From_565(c1)
+    palette = np.stack([e0, e1, (2 * e0 + e1) // 3, (e0 + 2 * e1) // 3], axis=1)
+
+    distance = ((blocks[:, :, None, :3].astype(np.int32) - palette[:, None, :, :]) ** 2).sum(axis=3)
+    indices = distance.argmin(axis=2)
+    indices[c0 == c1] = 0
+
+    out = np.zeros((len(blocks), 8), dtype=np.uint8)
+    out[:, 0:2] = c0.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 2:4] = c1.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 4:8] = _Pack_Indices(indices, 2).astype("<u4").view(np.uint8).reshape(-1, 4)
+
+    return out
+
+# The 8 byte alpha half of a BC3 block, in 8 value interpolated mode
+def _Encode_Alpha(blocks: np.ndarray) -> np.ndarray:
+    alpha = blocks[:, :, 3].astype(np.int32)
+    a0 = alpha.max(axis=1)
+    a1 = alpha.min(axis=1)
+
+    weights = np.array([[7, 0], [0, 7], [6, 1], [5, 2], [4, 3], [3, 4], [2, 5], [1, 6]], dtype=np.int32)
+    palette = (a0[:, None] * weights[:, 0] + a1[:, None] * weights[:, 1]) // 7
+
+    indices = np.abs(alpha[:, :, None] - palette[:, None, :]).argmin(axis=2)
+    indices[a0 == a1] = 0
+
+    out = np.zeros((len(blocks), 8), dtype=np.uint8)
+    out[:, 0] = a0
+    out[:, 1] = a1
+    out[:, 2:8] = _Pack_Indices(indices, 3).astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+
+    return out
+
+# Opaque BC1 (DXT1), alpha is dropped
+def EncodeBC1(pixels: np.ndarray) -> bytes:
+    return _Encode_Color(To_Blocks(pixels)).tobytes()
+
+# BC3 (DXT5), interpolated alpha followed by BC1 colour
+def EncodeBC3(pixels: np.ndarray) -> bytes:
+    blocks = To_Blocks(pixels)
+    return np.concatenate([_Encode_Alpha(blocks), _Encode_Color(blocks)], axis=1).tobytes()
+
+# Compares the block compressed atlas with PIL's output on a random icon atlas
+# Run with: python bcn.py [size]
+if __name__ == "__main__":
+    import sys
+    import io
+    import time
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    rng = np.random.default_rng(0)
+
+    # Smooth gradients with noise, closer to real icons than pure noise
+    y, x = np.mgrid[0:size, 0:size]
+    pixels = np.stack([x * 255 // size, y * 255 // size, (x + y) * 127 // size, np.full_like(x, 255)], axis=2)
+    pixels = np.clip(pixels + rng.integers(-8, 8, pixels.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, "RGBA")
+
+    def Psnr(data: bytes) -> float:
+        decoded = np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"), dtype=np.float64)
+        mse = ((decoded[:, :, :3] - pixels[:, :, :3]) ** 2).mean()
+        return 10 * np.log10(255 ** 2 / mse) if mse else float("inf")
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    image.save(buffer, format="DDS")
+    print(f"PIL           {len(buffer.getvalue()):>12,} bytes {(time.perf_counter()-start)*1000:>8.1f} ms")
+
+    for (format, mipmaps, workers) in [("BC1", False, None), ("BC3", False, None), ("BC3", True, None), ("BC3", True, 4)]:
+        start = time.perf_counter()
+        data = BCEncoder(format, mipmaps, workers).encode(image)
+        elapsed = time.perf_counter() - start
+        print(f"{format} mips={mipmaps!s:<5} workers={workers or 1} {len(data):>12,} bytes {elapsed*1000:>8.1f} ms  PSNR {Psnr(data):.1f} dB")
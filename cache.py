@@ -0,0 +1,90 @@
+from typing import List, Dict
+
+import time
+import threading
+from collections import OrderedDict
+
+# Rendered fragments, e.g. one spell's stats block, kept in memory for processes that build the same project again
+# (watch, serve), so spells that haven't changed since the last build are never re-rendered
+# Fragments are keyed by a plain tuple of everything that goes into them, and the least recently used are
+# dropped once the fragments grow past maxBytes. Nothing is kept on disc: reading a fragment back costs more than rendering it
+class RenderCache:
+    def __init__(self, maxBytes: int = 64 * 1024 * 1024) -> None:
+        self.maxBytes: int = maxBytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.size: int = 0
+
+        self._fragments: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Returns the cached fragment for every key, rendering and storing the missing ones
+    # Keys are plain tuples of a kind and the values the fragment is rendered from, e.g. ("stats", *spell.statsKey())
+    # render(key) is only called for keys that aren't cached
+    def fetch(self, keys: List[tuple], render) -> Dict[tuple, bytes]:
+        fragments = {}
+        with self._lock:
+            for k in keys:
+                data = self._fragments.get(k)
+                if data is not None:
+                    self._fragments.move_to_end(k)
+                    fragments[k] = data
+
+        missing = {k: render(k) for k in keys if k not in fragments}
+        self.hits += len(fragments)
+        self.misses += len(missing)
+
+        with self._lock:
+            for (k, data) in missing.items():
+                if k not in self._fragments:
+                    self._fragments[k] = data
+                    self.size += len(data)
+
+            while self.size > self.maxBytes and self._fragments:
+                self.size -= len(self._fragments.popitem(last=False)[1])
+
+        fragments.update(missing)
+        return fragments
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+if __name__ == "__main__":
+    import models
+    import writers
+    from data import BG3Database
+
+    BG3Database.LoadData()
+    spells = []
+    for i in range(10000):
+        spell = models.Spell(uuid=str(i))
+        (spell.id, spell.spellType, spell.level, spell.damageType) = (f"Spell_{i}", "Projectile", "1", "Fire")
+        spell.setStableUUIDs("Benchmark")
+        spells.append(spell)
+
+    def Build(cache: RenderCache) -> float:
+        spellFile = writers.SpellFile(fileName="Benchmark", cache=cache)
+        localizationFile = writers.LocalizationFile(fileName="Benchmark", cache=cache)
+        for spell in spells:
+            spellFile.addSpell(spell)
+            localizationFile.addElement(spell.name)
+            localizationFile.addElement(spell.description)
+
+        start = time.perf_counter()
+        spellFile.serialize()
+        localizationFile.serialize()
+        return (time.perf_counter() - start) * 1000
+
+    cache = RenderCache()
+    print(f"No cache:   {Build(None):.0f} ms")
+    print(f"Cold cache: {Build(cache):.0f} ms")
+    print(f"Warm cache: {Build(cache):.0f} ms ({len(cache)} fragments, {cache.size / 1024 / 1024:.1f} MB)")
+
+    # One spell edited, as the watcher sees it
+    spells[0].level = "2"
+    print(f"One edit:   {Build(cache):.0f} ms")
@@ -0,0 +1,227 @@
+from typing import List, Dict
+
+import argparse
+import os
+import sys
+import time
+
+import models
+import generator
+import sinks
+from project import Project
+from watcher import ProjectWatcher
+from workspace import Workspace
+from store import SpellStore
+from importers import SpellImporter
+from server import GenerationServer
+from data import BG3Database
+
+# Headless entry point, run from the tool's folder so the data/ and templates/ folders resolve
+#   python cli.py generate MyMod.json [--out PATH] [--pack] [--archive zip]
+#   python cli.py watch MyMod.json [--out PATH] [--poll]
+#   python cli.py workspace Mods/ Other.json [--out PATH] [--workers N] [--pack]
+#   python cli.py edit MyMod.json --where school=Evocation --set damageType=Cold --set level=3 [--set "name.French=Boule de feu"] [--out PATH]
+#   python cli.py import Spells.csv --mod MyMod [--out PATH] [--project MyMod.json] [--map "Dmg=damageType"] [--pack]
+#   python cli.py serve [--host 127.0.0.1] [--port 8765] [--workers N] [--queue N] [--root DIR] [--allow-origin URL]
+def Generate(args: argparse.Namespace) -> None:
+    project = Project.Load(args.project)
+    modPath = args.out if args.out is not None else project.modPath
+    modGenerator = generator.ModGenerator.FromProject(project)
+
+    for (uuid, results) in modGenerator.validateIcons().items():
+        for r in results.values():
+            print(f"{uuid}: {r}")
+
+    if project.options.get("writeFiles", True) and not args.pack_only:
+        modGenerator.export(modPath)
+    if project.options.get("pack", False) or args.pack or args.pack_only:
+        modGenerator.pack(modPath)
+    if args.archive or project.options.get("archive"):
+        modGenerator.archive(modPath, args.archive or project.options.get("archive"))
+
+def Watch(args: argparse.Namespace) -> None:
+    ProjectWatcher(args.project, modPath=args.out, debounce=args.debounce, polling=args.poll).run()
+
+def BuildWorkspace(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    results = Workspace(args.projects, modPath=args.out, pack=args.pack, workers=args.workers).build()
+
+    for r in results:
+        print(r)
+
+    failed = len([r for r in results if not r.ok])
+    print(f"Built {len(results) - failed}/{len(results)} mods in {time.perf_counter() - start:.1f} s")
+    if failed:
+        sys.exit(1)
+
+# "field=value" pairs as a dict, repeating a field in a condition matches any of its values
+def ParseFields(pairs: List[str], multiple: bool = False) -> Dict[str, str | List[str]]:
+    fields = {}
+    for pair in pairs or []:
+        (field, separator, value) = pair.partition("=")
+        if not separator:
+            raise ValueError(f"Expected field=value, got '{pair}'")
+        if multiple:
+            fields.setdefault(field, []).append(value)
+        else:
+            fields[field] = value
+
+    return fields
+
+# Matches each value of a field with a fixed list of values to its database name, without case, refusing unknown ones
+def CheckChoices(values: Dict[str, str]) -> Dict[str, str]:
+    checked = {}
+    for (field, value) in values.items():
+        choices = SpellImporter.Choices(field)
+        if choices:
+            match = {SpellImporter.Fold(c): c for c in choices}.get(SpellImporter.Fold(value))
+            if match is None:
+                names = [c for c in choices if c]
+                more = f" and {len(names) - 20} more" if len(names) > 20 else ""
+                raise ValueError(f"Unknown {field} '{value}', expected one of: {', '.join(names[:20])}{more}")
+            value = match
+        checked[field] = value
+
+    return checked
+
+# Localized fields aren't store columns, "name.French=..." sets the French name of every matching spell
+def Edit(args: argparse.Namespace) -> None:
+    project = Project.Load(args.project)
+    store = SpellStore(project.spells)
+
+    try:
+        values = ParseFields(args.set)
+        texts = {field: values.pop(field) for field in list(values) if field.partition(".")[0] in models.Spell.LOCALIZED_FIELDS}
+        mask = store.select(**ParseFields(args.where, multiple=True))
+        changed = {spell.uuid: spell for spell in store.update(mask, **CheckChoices(values))}
+    except (KeyError, ValueError) as e:
+        print(e.args[0])
+        sys.exit(1)
+
+    for spell in store.spellsAt(mask):
+        for (field, value) in texts.items():
+            (field, _, language) = field.partition(".")
+            if spell.setText(field, value, language or None):
+                changed[spell.uuid] = spell
+
+    print(f"Matched {int(mask.sum())} of {len(store)} spells, changed {len(changed)}")
+    if changed:
+        project.save(args.out or args.project, relative=True)
+
+# Builds a mod straight from a spreadsheet, reporting the rows that couldn't be imported
+# The project is saved a batch at a time as the sheet is read
+# Generating needs every spell at once (shared stats, the atlas, the spell lists), so only then are they all kept
+def Import(args: argparse.Namespace) -> None:
+    importer = SpellImporter(mapping=ParseFields(args.map))
+    project = Project(modName=args.mod, modPath=args.out or "")
+    generate = args.out is not None or args.pack
+
+    def batches():
+        for batch in importer.read(args.sheet):
+            if generate:
+                project.spells += batch
+            yield batch
+
+    # Saved beside the project and only swapped in when a spell was imported
+    temporary = args.project + ".tmp" if args.project else None
+    try:
+        if temporary:
+            project.save(temporary, relative=True, batches=batches())
+        else:
+            for _ in batches():
+                pass
+    except ValueError as e:
+        if temporary and os.path.exists(temporary):
+            os.remove(temporary)
+        print(e.args[0])
+        sys.exit(1)
+
+    for issue in importer.issues[:args.show]:
+        print(issue)
+    print(f"Imported {importer.imported}/{importer.rows} rows, {importer.errors} errors, {importer.warnings} warnings")
+
+    if temporary:
+        if importer.imported:
+            os.replace(temporary, args.project)
+            project.path = args.project
+        else:
+            os.remove(temporary)
+
+    if project.spells:
+        modGenerator = generator.ModGenerator.FromProject(project)
+        if args.out:
+            modGenerator.export(args.out)
+        if args.pack:
+            modGenerator.pack(args.out or ".")
+
+    if importer.errors:
+        sys.exit(1)
+
+def Serve(args: argparse.Namespace) -> None:
+    server = GenerationServer(host=args.host, port=args.port, workers=args.workers, queueSize=args.queue, root=args.root, allowOrigins=args.allow_origin)
+    (host, port) = server.address
+    print(f"Serving JSON-RPC on http://{host}:{port}/ with {server.workers} workers, {server.queueSize} queued at most")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+def Main() -> None:
+    parser = argparse.ArgumentParser(description="BG3 Spell Maker without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Generate a project's mod files once")
+    generate.add_argument("project", help="Project .json saved from the GUI")
+    generate.add_argument("--out", help="Export path, defaults to the project's Mod Path")
+    generate.add_argument("--pack", action="store_true", help="Also write <Mod Name>.pak")
+    generate.add_argument("--pack-only", action="store_true", help="Only write <Mod Name>.pak, skipping the loose files")
+    generate.add_argument("--archive", choices=list(sinks.ARCHIVE_FORMATS.keys()), help="Also write the mod folder as one <Mod Name>.zip/.tar/.tar.gz")
+    generate.set_defaults(func=Generate)
+
+    watch = commands.add_parser("watch", help="Regenerate whenever the project or one of its icons changes")
+    watch.add_argument("project", help="Project .json saved from the GUI")
+    watch.add_argument("--out", help="Export path, defaults to the project's Mod Path")
+    watch.add_argument("--debounce", type=float, default=0.3, help="Seconds to wait for a burst of changes to settle")
+    watch.add_argument("--poll", action="store_true", help="Poll for changes instead of using inotify")
+    watch.set_defaults(func=Watch)
+
+    workspace = commands.add_parser("workspace", help="Build many projects in parallel")
+    workspace.add_argument("projects", nargs="+", help="Project .json files, or folders containing them")
+    workspace.add_argument("--out", help="Export path for every mod, defaults to each project's Mod Path")
+    workspace.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count")
+    workspace.add_argument("--pack", action="store_true", help="Also write each <Mod Name>.pak")
+    workspace.set_defaults(func=BuildWorkspace)
+
+    edit = commands.add_parser("edit", help="Set fields on every spell matching some conditions")
+    edit.add_argument("project", help="Project .json saved from the GUI")
+    edit.add_argument("--where", action="append", metavar="FIELD=VALUE", help="Only spells with this value, repeat to combine")
+    edit.add_argument("--set", action="append", metavar="FIELD=VALUE", required=True, help="A value to set, repeat for more fields. name.<Language>=... sets a translation")
+    edit.add_argument("--out", help="Save the edited project here instead of over the original")
+    edit.set_defaults(func=Edit)
+
+    sheet = commands.add_parser("import", help="Import spells from a CSV/TSV sheet and generate the mod")
+    sheet.add_argument("sheet", help="A .csv or .tsv with a header row, e.g. ID, Display Name, Spell Type, Level, Damage Type, Spell Lists")
+    sheet.add_argument("--mod", required=True, help="The mod name")
+    sheet.add_argument("--out", help="Export the mod files here")
+    sheet.add_argument("--project", help="Also save the imported spells as a project .json")
+    sheet.add_argument("--map", action="append", metavar="HEADER=FIELD", help="Read a column into a spell field, e.g. \"Dmg=damageType\"")
+    sheet.add_argument("--pack", action="store_true", help="Also write <Mod Name>.pak")
+    sheet.add_argument("--show", type=int, default=50, help="How many row problems to print")
+    sheet.set_defaults(func=Import)
+
+    serve = commands.add_parser("serve", help="Generate mods for other tools over local HTTP JSON-RPC")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on, only this machine by default")
+    serve.add_argument("--port", type=int, default=GenerationServer.DEFAULT_PORT, help="Port to listen on")
+    serve.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count up to 8")
+    serve.add_argument("--queue", type=int, help="Requests that may wait for a worker before the server answers 503, defaults to 4 per worker")
+    serve.add_argument("--root", help="The only folder projects and icons are read from and mods exported into, defaults to the working directory")
+    serve.add_argument("--allow-origin", action="append", metavar="URL", help="A web page origin allowed to call the server, e.g. http://localhost:3000")
+    serve.set_defaults(func=Serve)
+
+    args = parser.parse_args()
+
+    BG3Database.LoadData()
+    args.func(args)
+
+if __name__ == "__main__":
+    Main()
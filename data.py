@@ -1,13 +1,24 @@
 import json
 
+from utils import utils
+from indexes import SearchIndex
+from enums import Enumeration, KeyedEnumeration
+
 # A static database of all the imported DATA json files
 class BG3Database:
     _datafiles = {}
     _data = {}
     _defaults = {}
+    _indexes = {}
+    _enumerations = {}
+
+    # Collections of names per spell type
+    KEYED_COLLECTIONS = {"SpellAnimation", "Trajectories"}
 
     @staticmethod
     def LoadData():
+        BG3Database._indexes = {}
+
         with open("data/_database.json", "r") as json_file:
             BG3Database._datafiles = json.load(json_file)
 
@@ -18,13 +29,56 @@ class BG3Database:
             if v:
               with open(f"data/{v}.json", "r") as json_file:
                   BG3Database._data[k] = json.load(json_file)
+
+        # Enumerations outlive a reload, so codes already stored on spells stay valid
+        for (k, v) in BG3Database._enumerations.items():
+            if isinstance(v, KeyedEnumeration):
+                v.compile(BG3Database.Get(k, {}))
+            else:
+                v.extend(BG3Database.Get(k, []))
     
+    @staticmethod
+    def IsLoaded() -> bool:
+        return bool(BG3Database._data)
+
     @staticmethod
     def Get(value, default=None):
         if value in BG3Database._data:
             return BG3Database._data[value]
         return default
     
+    # A search index over the names in a collection, built once and cached
+    # Keyed collections (like SpellAnimation) are indexed per key
+    @staticmethod
+    def GetIndex(value, key=None) -> SearchIndex:
+        if (value, key) not in BG3Database._indexes:
+            collection = BG3Database.Get(value)
+            if key is not None:
+                collection = utils.GetValueFromKey(collection, key)
+            BG3Database._indexes[(value, key)] = SearchIndex(utils.GetKeys(collection, []) if type(collection) == dict else collection or [])
+        return BG3Database._indexes[(value, key)]
+
+    # A collection compiled to interned names with integer codes, built once
+    # Keyed collections return the enumeration of their names, see GetKeyedEnumeration for their values
+    @staticmethod
+    def GetEnumeration(value) -> Enumeration:
+        enumeration = BG3Database._Enumeration(value)
+        return enumeration.names if isinstance(enumeration, KeyedEnumeration) else enumeration
+
+    # A keyed collection compiled to one value array per spell type
+    @staticmethod
+    def GetKeyedEnumeration(value) -> KeyedEnumeration:
+        return BG3Database._Enumeration(value)
+
+    @staticmethod
+    def _Enumeration(value) -> Enumeration | KeyedEnumeration:
+        if value not in BG3Database._enumerations:
+            if value in BG3Database.KEYED_COLLECTIONS:
+                BG3Database._enumerations[value] = KeyedEnumeration(value, keys=BG3Database.GetEnumeration("SpellType"), collection=BG3Database.Get(value, {}))
+            else:
+                BG3Database._enumerations[value] = Enumeration(value, BG3Database.Get(value, []))
+        return BG3Database._enumerations[value]
+
     @staticmethod
     def GetDefault(value, default=None):
         if value in BG3Database._defaults:
@@ -0,0 +1,160 @@
+from typing import BinaryIO
+
+import io
+import struct
+from PIL import Image
+
+# The DirectDraw Surface container used for every texture the game loads
+class DDS:
+    MAGIC: bytes = b"DDS "
+    HEADER_FORMAT: str = "<4s7I44s8I4I4x"
+    HEADER_SIZE: int = 128
+
+    DDSD_CAPS: int = 0x1
+    DDSD_HEIGHT: int = 0x2
+    DDSD_WIDTH: int = 0x4
+    DDSD_PITCH: int = 0x8
+    DDSD_PIXELFORMAT: int = 0x1000
+    DDSD_MIPMAPCOUNT: int = 0x20000
+    DDSD_LINEARSIZE: int = 0x80000
+
+    DDPF_ALPHAPIXELS: int = 0x1
+    DDPF_FOURCC: int = 0x4
+    DDPF_RGB: int = 0x40
+
+    DDSCAPS_COMPLEX: int = 0x8
+    DDSCAPS_TEXTURE: int = 0x1000
+    DDSCAPS_MIPMAP: int = 0x400000
+
+    # Bytes per 4x4 block for the block compressed formats
+    BLOCK_SIZES = {"DXT1": 8, "DXT5": 16}
+
+    # Common DXGI formats found in DX10 extended headers
+    DXGI_FORMATS = {
+        28: "R8G8B8A8_UNORM", 29: "R8G8B8A8_UNORM_SRGB",
+        71: "BC1_UNORM", 72: "BC1_UNORM_SRGB",
+        74: "BC2_UNORM", 75: "BC2_UNORM_SRGB",
+        77: "BC3_UNORM", 78: "BC3_UNORM_SRGB",
+        80: "BC4_UNORM", 83: "BC5_UNORM",
+        87: "B8G8R8A8_UNORM", 91: "B8G8R8A8_UNORM_SRGB",
+        98: "BC7_UNORM", 99: "BC7_UNORM_SRGB",
+    }
+
+    # The size in bytes of one mip level
+    @staticmethod
+    def LevelSize(fourCC: str, width: int, height: int) -> int:
+        if fourCC in DDS.BLOCK_SIZES:
+            return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * DDS.BLOCK_SIZES[fourCC]
+        return width * height * 4
+
+    # A 128 byte header for a block compressed ("DXT1"/"DXT5") or, without a fourCC, a 32 bit RGBA texture
+    # bgra=True describes 32 bit BGRA pixels instead, the layout PIL writes
+    @staticmethod
+    def Header(width: int, height: int, fourCC: str = None, mipCount: int = 1, bgra: bool = False) -> bytes:
+        flags = DDS.DDSD_CAPS | DDS.DDSD_HEIGHT | DDS.DDSD_WIDTH | DDS.DDSD_PIXELFORMAT
+        caps = DDS.DDSCAPS_TEXTURE
+        if mipCount > 1:
+            flags |= DDS.DDSD_MIPMAPCOUNT
+            caps |= DDS.DDSCAPS_COMPLEX | DDS.DDSCAPS_MIPMAP
+
+        if fourCC:
+            flags |= DDS.DDSD_LINEARSIZE
+            pitch = DDS.LevelSize(fourCC, width, height)
+            pixelFormat = (32, DDS.DDPF_FOURCC, int.from_bytes(fourCC.encode("ascii"), "little"), 0, 0, 0, 0, 0)
+        else:
+            flags |= DDS.DDSD_PITCH
+            pitch = width * 4
+            (red, blue) = (0x00FF0000, 0x000000FF) if bgra else (0x000000FF, 0x00FF0000)
+            pixelFormat = (32, DDS.DDPF_RGB | DDS.DDPF_ALPHAPIXELS, 0, 32, red, 0x0000FF00, blue, 0xFF000000)
+
+        return struct.pack(DDS.HEADER_FORMAT, DDS.MAGIC, 124, flags, height, width, pitch, 0, mipCount, b"\0" * 44, *pixelFormat, caps, 0, 0, 0)
+
+    # Reads only the header (and DX10 extension) of a .dds file, without decoding any pixels
+    @staticmethod
+    def ReadInfo(path: str) -> "DDSInfo | None":
+        with open(path, "rb") as file:
+            return DDS.StreamInfo(file)
+
+    # The same from an open binary stream, e.g. a file already read into memory
+    @staticmethod
+    def StreamInfo(file: BinaryIO) -> "DDSInfo | None":
+        header = file.read(DDS.HEADER_SIZE)
+        if len(header) < DDS.HEADER_SIZE:
+            return None
+
+        fields = struct.unpack(DDS.HEADER_FORMAT, header)
+        if fields[0] != DDS.MAGIC or fields[1] != 124:
+            return None
+
+        (height, width, mipCount) = (fields[3], fields[4], fields[7])
+        (pixelFlags, fourCC, bitCount) = (fields[10], fields[11], fields[12])
+
+        if pixelFlags & DDS.DDPF_FOURCC:
+            format = fourCC.to_bytes(4, "little").decode("ascii", errors="replace")
+            if format == "DX10":
+                extension = file.read(20)
+                if len(extension) < 20:
+                    return None
+                dxgiFormat = struct.unpack_from("<I", extension)[0]
+                format = DDS.DXGI_FORMATS.get(dxgiFormat, f"DXGI_{dxgiFormat}")
+        else:
+            format = f"RGB{'A' if pixelFlags & DDS.DDPF_ALPHAPIXELS else ''}{bitCount}"
+
+        return DDSInfo(width, height, format, max(1, mipCount))
+
+    # Bytes per 4x4 block, or 0 for uncompressed formats
+    @staticmethod
+    def BlockSize(format: str) -> int:
+        if format in DDS.BLOCK_SIZES:
+            return DDS.BLOCK_SIZES[format]
+        if format.startswith(("BC1", "BC4")):
+            return 8
+        if format.startswith(("BC2", "BC3", "BC5", "BC7", "DXT")):
+            return 16
+        return 0
+
+    # Decodes rows y to y+height of the top mip level, reading only the bytes of those rows
+    # y and height must be multiples of 4 for block compressed files
+    @staticmethod
+    def ReadBand(path: str, y: int, height: int) -> Image.Image:
+        info = DDS.ReadInfo(path)
+        if not info:
+            raise ValueError(f"'{path}' is not a DDS file")
+
+        with open(path, "rb") as file:
+            header = bytearray(file.read(DDS.HEADER_SIZE))
+            extension = file.read(20) if header[84:88] == b"DX10" else b""
+            dataOffset = file.tell()
+
+            blockSize = DDS.BlockSize(info.format)
+            if blockSize:
+                rowBytes = max(1, (info.width + 3) // 4) * blockSize
+                (offset, size) = (y // 4 * rowBytes, (height + 3) // 4 * rowBytes)
+            else:
+                rowBytes = info.width * struct.unpack_from("<I", header, 88)[0] // 8
+                (offset, size) = (y * rowBytes, height * rowBytes)
+
+            file.seek(dataOffset + offset)
+            data = file.read(size)
+
+        # The same header, for a single level image of just this band
+        struct.pack_into("<I", header, 12, height)
+        struct.pack_into("<I", header, 28, 1)
+        image = Image.open(io.BytesIO(bytes(header) + extension + data))
+        image.load()
+        return image
+
+# The size, pixel format and mip count of a .dds file
+class DDSInfo:
+    def __init__(self, width: int, height: int, format: str, mipCount: int) -> None:
+        self.width: int = width
+        self.height: int = height
+        self.format: str = format
+        self.mipCount: int = mipCount
+
+    @property
+    def size(self) -> tuple[int,int]:
+        return (self.width, self.height)
+
+    def __str__(self) -> str:
+        return f"{self.width}x{self.height} {self.format} ({self.mipCount} mips)"
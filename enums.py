@@ -0,0 +1,101 @@
+from typing import List, Dict
+
+import sys
+import threading
+
+# A database list compiled to interned names with small integer codes
+# Names that aren't in the database are appended, so custom values still round trip
+# Codes never change once given out, reloading the database only appends
+class Enumeration:
+    NONE: int = -1
+
+    def __init__(self, name: str, names: List[str] = None) -> None:
+        self.name: str = name
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.extend(names or [])
+
+    def extend(self, names: List[str]) -> None:
+        for name in names:
+            self.code(name)
+
+    # The code for a name, adding it if it's new. None has no code
+    def code(self, name: str | None) -> int:
+        if name is None:
+            return Enumeration.NONE
+
+        code = self.codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(name)
+                if code is None:
+                    code = len(self.names)
+                    self.names.append(sys.intern(str(name)))
+                    self.codes[self.names[code]] = code
+
+        return code
+
+    # The shared copy of a name
+    def intern(self, name: str | None) -> str | None:
+        return self.names[self.code(name)] if name is not None else None
+
+    # The shared copy of a name that is already known, any other name as it is, without adding it
+    def shared(self, name: str | None) -> str | None:
+        code = self.codes.get(name)
+        return self.names[code] if code is not None else name
+
+    # A separate enumeration starting with the same names and codes, that new names are added to instead
+    def copy(self) -> "Enumeration":
+        return Enumeration(self.name, self.names)
+
+    def __getitem__(self, code: int) -> str | None:
+        return self.names[code] if code != Enumeration.NONE else None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.codes
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+# A keyed database collection (e.g. SpellAnimation per SpellType) compiled to one value array per key
+# values[keyCode][nameCode] is the game value for that name, or None when the key doesn't have it
+class KeyedEnumeration:
+    def __init__(self, name: str, keys: Enumeration, collection: dict = None) -> None:
+        self.name: str = name
+        self.keys: Enumeration = keys
+        self.names: Enumeration = Enumeration(name)
+        self.values: List[List[str | None]] = []
+
+        self.compile(collection or {})
+
+    def compile(self, collection: dict) -> None:
+        for (key, names) in collection.items():
+            self.keys.code(key)
+            self.names.extend(list(names.keys()) if type(names) == dict else names)
+
+        values = [[None] * len(self.names) for _ in range(len(self.keys))]
+        for (key, names) in collection.items():
+            if type(names) == dict:
+                row = values[self.keys.code(key)]
+                for (name, value) in names.items():
+                    row[self.names.code(name)] = sys.intern(value) if type(value) == str else value
+
+        self.values = values
+
+    # The game value for a name under a key, without adding either to the enumerations
+    def get(self, key: str, name: str) -> str | None:
+        keyCode = self.keys.codes.get(key)
+        nameCode = self.names.codes.get(name)
+        if keyCode is None or nameCode is None:
+            return None
+        return self.lookup(keyCode, nameCode)
+
+    # The game value for a name under a key, using the codes of both
+    def lookup(self, keyCode: int, nameCode: int) -> str | None:
+        if keyCode < 0 or nameCode < 0 or keyCode >= len(self.values):
+            return None
+
+        row = self.values[keyCode]
+        return row[nameCode] if nameCode < len(row) else None
@@ -0,0 +1,217 @@
+from typing import List, Dict, Set, Iterator
+
+import os
+import hashlib
+
+import models
+import writers
+import sinks
+import validators
+import icons
+import atlas
+from project import Project
+from cache import RenderCache
+from utils import utils
+
+# Builds every writer for a mod from its spells, then exports them to disc and/or packs them into a .pak
+class ModGenerator:
+    ATLAS_TEMPLATE = "templates/atlas_256.dds"
+    ATLAS_BASE_PATH = os.path.join("Assets", "Textures", "Icons", "Icons_" + "{0}" + ".dds")
+    ATLAS_PATH = os.path.join("Public", "{0}", ATLAS_BASE_PATH)
+    CONTROLLER_ICON_PATH = os.path.join("Public", "Game", "GUI", "Assets", "ControllerUIIcons", "skills_png", "{0}" + ".DDS")
+    TOOLTIP_ICON_PATH = os.path.join("Public", "Game", "GUI", "Assets", "Tooltips", "Icons", "{0}" + ".DDS")
+
+    STATS_PATH = os.path.join("Public", "{0}", "Stats", "Generated", "Data")
+    LOCALIZATION_PATH = "Localization"
+    GUI_PATH = os.path.join("Public", "{0}", "GUI")
+    MERGED_PATH = os.path.join("Public", "{0}", "Content", "UI", "[PAK]_UI")
+    LISTS_PATH = os.path.join("Public", "{0}", "Lists")
+    MODS_PATH = "Mods"
+
+    # The writers that only depend on icon file contents
+    ICON_WRITERS = {"AtlasFile", "ImageMover"}
+
+    # Pass a RenderCache to reuse the stats and localization of spells that haven't changed since the last build
+    # factorStats moves the stats spells share into base entries they inherit with `using`
+    # mergeStats updates the existing stats file instead of replacing it, keeping entries written by hand
+    def __init__(self, modName: str, spells: List[models.Spell], binary: bool = False, atlasFormat: str = None, cache: RenderCache = None, iconDeriver: icons.IconDeriver = None, factorStats: bool = False, mergeStats: bool = False) -> None:
+        self.modName: str = modName
+        self.spells: List[models.Spell] = spells
+
+        # Icons derived from source images, spell uuid -> field -> path
+        self.derivedIcons: Dict[str, Dict[str, str]] = {}
+        if any(spell.sourceIcon for spell in spells):
+            self.derivedIcons = (iconDeriver or icons.IconDeriver()).derive(spells)
+
+        self.spellTemplateFile = writers.SpellFile(fileName=f"{modName}_Spells", cache=cache, factor=factorStats, merge=mergeStats)
+        self.localizationFile = writers.LocalizationFile(fileName=modName, cache=cache)
+        self.spellListCombinerFile = writers.SpellListCombinerFile()
+
+        self.imageMover = writers.ImageMover()
+
+        self.atlasFile = writers.AtlasFile(uuid=utils.Generate_UUID(modName, "Atlas"), fileName=f"Icons_{modName}",atlasTemplate=self.ATLAS_TEMPLATE, iconSize=64, icons=[], compression=atlasFormat)
+        self.atlasTemplateFile = writers.AtlasTemplateFile(fileName=self.atlasFile.fileName, path=self.ATLAS_BASE_PATH.format(modName), atlas=self.atlasFile, icons=[], binary=binary)
+        self.mergedTemplateFile = writers.MergedFile(uuid=self.atlasFile.uuid, name=self.atlasFile.fileName, sourceFile=self.ATLAS_PATH.format(modName), template=f"Icons_{modName}", binary=binary)
+
+        # Set by applyLayout, the atlas is then patched instead of rebuilt where possible
+        self.atlasLayout: atlas.AtlasLayout = None
+
+        for spell in spells:
+            spell.setStableUUIDs(modName)
+            controllerIcon = self.iconPath(spell, "ControllerIcon")
+            tooltipIcon = self.iconPath(spell, "TooltipIcon")
+
+            self.spellTemplateFile.addSpell(spell)
+
+            self.localizationFile.addElement(spell.name)
+            self.localizationFile.addElement(spell.description)
+
+            self.imageMover.addImage(models.PathVector(inPath=controllerIcon, outPath=self.CONTROLLER_ICON_PATH.format(spell.id)))
+            self.imageMover.addImage(models.PathVector(inPath=tooltipIcon, outPath=self.TOOLTIP_ICON_PATH.format(spell.id)))
+
+            self.atlasFile.addIcon(controllerIcon)
+            self.atlasTemplateFile.addIcon(spell.id)
+
+            self.spellListCombinerFile.addElement(name=f"{spell.spellType}_{spell.id}", listUUIDs=spell.lists)
+
+    # The icon a spell uses for a field, its own or the one derived from its source image
+    def iconPath(self, spell: models.Spell, field: str) -> str | None:
+        path = spell.controllerIcon if field == "ControllerIcon" else spell.tooltipIcon
+        return path or self.derivedIcons.get(spell.uuid, {}).get(field)
+
+    # Places each spell's icon in the cell the layout remembers for it instead of in spell order
+    # New spells take the lowest free cells and removed spells leave theirs empty, so the UVs of the others never move
+    def applyLayout(self, layout: atlas.AtlasLayout) -> None:
+        (width, height) = self.atlasFile.size
+        (iconWidth, iconHeight) = self.atlasFile.iconSize
+        cells = layout.assign([spell.id for spell in self.spells], (width // iconWidth) * (height // iconHeight))
+
+        size = max((cell + 1 for cell in cells if cell is not None), default=0)
+        self.atlasFile.icons = [None] * size
+        self.atlasTemplateFile.icons = [""] * size
+        for (spell, cell) in zip(self.spells, cells):
+            if cell is not None and not self.atlasTemplateFile.icons[cell]:
+                self.atlasFile.icons[cell] = self.iconPath(spell, "ControllerIcon")
+                self.atlasTemplateFile.icons[cell] = spell.id
+
+        self.atlasLayout = layout
+
+    @staticmethod
+    def FromProject(project: Project, cache: RenderCache = None) -> "ModGenerator":
+        return ModGenerator(modName=project.modName, spells=project.spells, binary=project.options.get("binary", False), atlasFormat=project.options.get("atlasFormat"), cache=cache, factorStats=project.options.get("factorStats", False), mergeStats=project.options.get("mergeStats", False))
+
+    # Reads the header of every icon before the atlas or image mover touch them
+    def validateIcons(self) -> Dict[str, Dict[str, validators.ValidationResult]]:
+        return validators.ValidateIcons(self.spells)
+
+    # Writes the loose file tree to <modPath>/<modName>
+    # Limit to some writers by passing their class names, e.g. ICON_WRITERS
+    # The tree is staged and swapped in once complete, pass staged=False to write in place
+    # The atlas cell layout is kept in <modPath>/.<modName>.atlas.json, so later exports only redraw the cells that changed
+    def export(self, modPath: str, writers: Set[str] = None, staged: bool = True, fsync: bool = True) -> None:
+        root = os.path.join(modPath, self.modName)
+        layoutPath = os.path.join(modPath, f".{self.modName}.atlas.json")
+        self.applyLayout(atlas.AtlasLayout.Load(layoutPath))
+
+        sink = sinks.StagedDirectorySink(root, fsync=fsync) if staged else sinks.DirectorySink(root)
+        self.write(sink, writers=writers)
+        self.atlasLayout.save(layoutPath)
+
+    # Writes every generated file into a sink, then closes it
+    def write(self, sink: sinks.Sink, writers: Set[str] = None) -> None:
+        with sink:
+            for (path, data) in self.outputs(writers=writers, read=sink.read):
+                if isinstance(data, bytes):
+                    sink.write(path, data)
+                elif isinstance(data, sinks.FileSource):
+                    sink.copy(path, data)
+                else:
+                    sink.writeChunks(path, data)
+            sink.addDirectory(self.MODS_PATH)
+
+    # Every generated file as (path relative to the mod root, contents), without touching the disc
+    # Files are built one at a time as they are iterated, so only the one being written is held in memory
+    # Tiled atlases are an iterator of chunks, built as the sink consumes them, and icons are a FileSource to copy
+    # read(path) returns a file's current contents, so the spell lists and stats can be merged into it
+    def outputs(self, writers: Set[str] = None, read = None) -> Iterator[tuple[str, bytes | Iterator[bytes] | sinks.FileSource]]:
+        modName = self.modName
+
+        def selected(writer) -> bool:
+            return writers is None or type(writer).__name__ in writers
+
+        statsPath = os.path.join(self.STATS_PATH.format(modName), self.spellTemplateFile.fileName + self.spellTemplateFile.fileExtension)
+
+        # The entries the last build generated, read before the stats file is replaced, so spells renamed or removed since
+        # also leave the spell lists. A merged stats file keeps such entries, and then they stay on their lists too
+        previous = set()
+        if read and selected(self.spellListCombinerFile) and not self.spellTemplateFile.merge:
+            existing = read(statsPath)
+            previous = {name for (name, _, _) in self.spellTemplateFile.Index(existing)} if existing else set()
+
+        if selected(self.spellTemplateFile):
+            existing = read(statsPath) if read and self.spellTemplateFile.merge else None
+            yield (statsPath, self.spellTemplateFile.serialize(existing))
+        if selected(self.localizationFile):
+            for language in self.localizationFile.languages():
+                yield (os.path.join(self.LOCALIZATION_PATH, language, self.localizationFile.fileName + self.localizationFile.fileExtension), self.localizationFile.serialize(language))
+        if selected(self.imageMover):
+            for (outPath, inPath) in self.imageMover.files():
+                yield (outPath, sinks.FileSource(inPath))
+        if selected(self.atlasTemplateFile):
+            yield (os.path.join(self.GUI_PATH.format(modName), self.atlasTemplateFile.fileName + self.atlasTemplateFile.fileExtension), self.atlasTemplateFile.serialize())
+        if selected(self.mergedTemplateFile):
+            yield (os.path.join(self.MERGED_PATH.format(modName), self.mergedTemplateFile.fileName + self.mergedTemplateFile.fileExtension), self.mergedTemplateFile.serialize())
+        if selected(self.spellListCombinerFile):
+            path = os.path.join(self.LISTS_PATH.format(modName), self.spellListCombinerFile.fileName + self.spellListCombinerFile.fileExtension)
+            existing = self.spellListCombinerFile.parse(read(path)) if read else None
+            yield (path, self.spellListCombinerFile.serialize(existing, previous))
+        if selected(self.atlasFile):
+            yield (self.ATLAS_PATH.format(modName), self.atlasData(read))
+
+    # The atlas file, patched from the current one when the layout says only a few cells changed
+    def atlasData(self, read = None) -> bytes | Iterator[bytes]:
+        layout = self.atlasLayout
+        if layout is None:
+            return self.atlasFile.stream() if self.atlasFile.tiled else self.atlasFile.serialize()
+
+        patcher = atlas.AtlasPatcher(self.atlasFile)
+        source = patcher.source()
+        signatures = patcher.signatures()
+
+        if read and layout.source == source and patcher.patchable():
+            cells = patcher.changedCells(layout)
+            existing = read(self.ATLAS_PATH.format(self.modName)) if len(cells) <= patcher.columns * patcher.rows // 2 else None
+            data = patcher.patch(existing, cells, layout) if existing and atlas.Hash(existing) == layout.hash else None
+            if data is not None:
+                (layout.signatures, layout.hash) = (signatures, atlas.Hash(data))
+                return data
+
+        # A full rebuild, recording what it was built from as it is written
+        (layout.source, layout.signatures, layout.hash) = (source, signatures, None)
+        layout.tail = patcher.buildTail()
+        if not self.atlasFile.tiled:
+            data = self.atlasFile.serialize()
+            layout.hash = atlas.Hash(data)
+            return data
+        return self._hashed(self.atlasFile.stream(), layout)
+
+    # Passes the chunks through, storing their hash in the layout once the last one is consumed
+    def _hashed(self, chunks: Iterator[bytes], layout: atlas.AtlasLayout) -> Iterator[bytes]:
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+        layout.hash = digest.hexdigest()
+
+    # Writes <modPath>/<modName>.pak straight from the in-memory outputs
+    def pack(self, modPath: str, compression: str = "zlib", workers: int = None) -> None:
+        self.write(sinks.PakSink(modPath, fileName=self.modName, compression=compression, workers=workers))
+
+    # Writes <modPath>/<modName>.zip (or .tar/.tar.gz) in one sequential pass, with the files under <modName>/
+    def archive(self, modPath: str, format: str = "zip") -> str:
+        if modPath and not os.path.exists(modPath):
+            os.makedirs(modPath)
+
+        path = os.path.join(modPath, self.modName + sinks.ARCHIVE_FORMATS[format])
+        self.write(sinks.ArchiveSink(path, format, root=self.modName))
+        return path
@@ -0,0 +1,171 @@
+from typing import List, Callable
+
+import sys
+from collections import deque
+
+import models
+
+# One reversible change to a project, holding only what changed
+# "field": key of spell uuid went from before to after
+# "move": spell uuid went from position before to after in the spell order
+# "add" / "remove": spell uuid was inserted at / taken from position key, the spell object itself is kept
+class Change:
+    __slots__ = ("kind", "uuid", "key", "before", "after", "size")
+
+    # What a spell object costs the budget, it is shared with the project rather than copied
+    SPELL_SIZE: int = 2048
+
+    def __init__(self, kind: str, uuid: str, key: any = None, before: any = None, after: any = None) -> None:
+        self.kind: str = kind
+        self.uuid: str = uuid
+        self.key: any = key
+        self.before: any = before
+        self.after: any = after
+        self.size: int = 64 + Change.SizeOf(before) + Change.SizeOf(after)
+
+    # A rough size in bytes of a recorded value
+    @staticmethod
+    def SizeOf(value: any) -> int:
+        if isinstance(value, models.Spell):
+            return Change.SPELL_SIZE
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(Change.SizeOf(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(Change.SizeOf(v) for v in value)
+        return sys.getsizeof(value) if value is not None else 0
+
+    # The field changes between two toDict()s of the same spell
+    @staticmethod
+    def Diff(uuid: str, before: dict, after: dict) -> List["Change"]:
+        return [Change("field", uuid, key, before.get(key), value) for (key, value) in after.items() if before.get(key) != value]
+
+    # Sets a field recorded by Diff on a spell
+    @staticmethod
+    def Set(spell: models.Spell, key: str, value: any) -> None:
+        if key in ("name", "description"):
+            setattr(spell, key, models.Localization.fromDict(value))
+        elif key in ("lists", "depends"):
+            setattr(spell, key, list(value))
+        else:
+            setattr(spell, key, value)
+
+# The changes of one user action, undone and redone together
+class Edit:
+    def __init__(self, label: str, changes: List[Change]) -> None:
+        self.label: str = label
+        self.changes: List[Change] = changes
+        self.size: int = sum(change.size for change in changes)
+
+    def __str__(self) -> str:
+        return self.label
+
+# Undo and redo stacks of edits
+# Recording an edit costs only its own changes, never a copy of the project, and the oldest edits are
+# dropped once the recorded changes exceed the memory budget
+class History:
+    BUDGET: int = 8 * 1024 * 1024
+
+    def __init__(self, budget: int = None) -> None:
+        self.budget: int = budget or History.BUDGET
+        self.undoStack: deque[Edit] = deque()
+        self.redoStack: List[Edit] = []
+        self.size: int = 0
+
+        # Set while an edit is being undone or redone, so the changes it causes aren't recorded again
+        self.applying: bool = False
+
+    def record(self, edit: Edit) -> None:
+        if self.applying or not edit.changes:
+            return
+
+        self.undoStack.append(edit)
+        self.size += edit.size
+        for dropped in self.redoStack:
+            self.size -= dropped.size
+        self.redoStack.clear()
+
+        # The newest edit is always kept, even on its own over budget
+        while self.size > self.budget and len(self.undoStack) > 1:
+            self.size -= self.undoStack.popleft().size
+
+    @property
+    def canUndo(self) -> bool:
+        return bool(self.undoStack)
+
+    @property
+    def canRedo(self) -> bool:
+        return bool(self.redoStack)
+
+    # Reverts the newest edit through apply(change, undo=True), last change first
+    def undo(self, apply: Callable[[Change, bool], None]) -> Edit | None:
+        if not self.undoStack:
+            return None
+
+        edit = self.undoStack.pop()
+        self._apply(apply, reversed(edit.changes), True)
+        self.redoStack.append(edit)
+        return edit
+
+    # Reapplies the newest undone edit through apply(change, undo=False)
+    def redo(self, apply: Callable[[Change, bool], None]) -> Edit | None:
+        if not self.redoStack:
+            return None
+
+        edit = self.redoStack.pop()
+        self._apply(apply, edit.changes, False)
+        self.undoStack.append(edit)
+        return edit
+
+    def _apply(self, apply: Callable[[Change, bool], None], changes, undo: bool) -> None:
+        self.applying = True
+        try:
+            for change in changes:
+                apply(change, undo)
+        finally:
+            self.applying = False
+
+    def clear(self) -> None:
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.size = 0
+
+if __name__ == "__main__":
+    import copy
+    import time
+    import tracemalloc
+    from data import BG3Database
+
+    BG3Database.LoadData()
+    spells = []
+    for i in range(10000):
+        spell = models.Spell(uuid=str(i))
+        (spell.id, spell.spellType, spell.level, spell.damageType) = (f"Spell_{i}", "Projectile", "1", "Fire")
+        spells.append(spell)
+    edits = 1000
+
+    # What a snapshot per edit would cost
+    start = time.perf_counter()
+    copy.deepcopy(spells)
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    snapshot = copy.deepcopy(spells[:1000])
+    print(f"Deep copy:  {elapsed:.0f} ms/edit, {tracemalloc.get_traced_memory()[0] * len(spells) / 1000 / 1024:.0f} KB/edit")
+    del snapshot
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    history = History()
+    start = time.perf_counter()
+    for i in range(edits):
+        spell = spells[i % len(spells)]
+        before = spell.toDict()
+        (spell.level, spell.damageType) = ("3", "Cold")
+        history.record(Edit("Edit spell", Change.Diff(spell.uuid, before, spell.toDict())))
+        history.record(Edit("Move spell", [Change("move", spell.uuid, None, i, i + 1)]))
+    elapsed = (time.perf_counter() - start) * 1000 / edits / 2
+    print(f"History:    {elapsed * 1000:.0f} us/edit, {tracemalloc.get_traced_memory()[0] / edits / 2 / 1024:.1f} KB/edit, {history.size / 1024:.0f} KB counted")
+
+    start = time.perf_counter()
+    while history.undo(lambda change, undo: change.kind == "field" and Change.Set(spells[int(change.uuid)], change.key, change.before if undo else change.after)):
+        pass
+    print(f"Undo all:   {(time.perf_counter() - start) * 1000:.0f} ms, levels restored: {all(s.level == '1' for s in spells)}")
@@ -0,0 +1,103 @@
+from typing import List, Dict
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+import models
+import validators
+
+# Resamples one source image to every size, writing each through a temporary file so readers never see half an icon
+# Runs in a worker process
+def _DeriveIcons(sourcePath: str, targets: List[tuple[int, str]]) -> None:
+    with Image.open(sourcePath) as image:
+        image.load()
+        source = image.convert("RGBA")
+
+    # Icons are square, so crop the centre of anything that isn't
+    (w, h) = source.size
+    if w != h:
+        side = min(w, h)
+        left = (w - side) // 2
+        top = (h - side) // 2
+        source = source.crop((left, top, left + side, top + side))
+
+    for (size, path) in targets:
+        temporary = f"{path}.{os.getpid()}.tmp"
+        source.resize((size, size), Image.Resampling.LANCZOS).save(temporary, format="DDS")
+        os.replace(temporary, path)
+
+# Derives the controller and tooltip icons (and so the atlas tile) of spells from one high resolution source image
+# Derived icons are cached by a hash of the source, so unchanged sources are never resampled again
+class IconDeriver:
+    # Bump when the resampling changes, so cached icons are rebuilt
+    VERSION: int = 1
+    CACHE_PATH: str = os.path.join("cache", "icons")
+
+    def __init__(self, cachePath: str = None, workers: int = None) -> None:
+        self.cachePath: str = cachePath or IconDeriver.CACHE_PATH
+        self.workers: int = workers
+
+        # Source hashes by path and modification time, so sources are only read once per process
+        self._hashes: Dict[tuple, str] = {}
+
+    def sourceHash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if key not in self._hashes:
+            digest = hashlib.sha256(f"{IconDeriver.VERSION}:".encode())
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._hashes[key] = digest.hexdigest()
+
+        return self._hashes[key]
+
+    # Where the icon of a field derived from a source with this hash is cached
+    def iconPath(self, sourceHash: str, field: str) -> str:
+        return os.path.join(self.cachePath, sourceHash[:2], f"{sourceHash}_{validators.ICON_SIZES[field]}.dds")
+
+    # Derives the missing icons of every spell with a source image, returning spell uuid -> field -> icon path
+    # Only fields without an explicitly set icon are derived
+    def derive(self, spells: List[models.Spell]) -> Dict[str, Dict[str, str]]:
+        icons = {}
+        work: Dict[str, tuple[str, Dict[str, str]]] = {}
+
+        for spell in spells:
+            if not spell.sourceIcon or not os.path.exists(spell.sourceIcon):
+                continue
+
+            sourceHash = self.sourceHash(spell.sourceIcon)
+            for (field, path) in (("ControllerIcon", spell.controllerIcon), ("TooltipIcon", spell.tooltipIcon)):
+                if path:
+                    continue
+
+                iconPath = self.iconPath(sourceHash, field)
+                icons.setdefault(spell.uuid, {})[field] = iconPath
+                if not os.path.exists(iconPath):
+                    work.setdefault(sourceHash, (spell.sourceIcon, {}))[1][field] = iconPath
+
+        if work:
+            for (_, targets) in work.values():
+                for path in targets.values():
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Each source is decoded once, in whichever worker picks it up
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [(executor.submit(_DeriveIcons, source, [(validators.ICON_SIZES[f], p) for (f, p) in targets.items()]), targets) for (source, targets) in work.values()]
+
+                # A source that can't be decoded leaves its spells without derived icons, the validator reports it
+                failed = set()
+                for (f, targets) in futures:
+                    try:
+                        f.result()
+                    except (OSError, ValueError):
+                        failed |= set(targets.values())
+
+            for fields in icons.values():
+                for (field, path) in list(fields.items()):
+                    if path in failed:
+                        fields.pop(field)
+
+        return icons
@@ -0,0 +1,297 @@
+from typing import List, Dict, Iterator, TextIO
+
+import os
+import re
+import csv
+
+import models
+import validators
+import data
+from data import BG3Database
+from utils import utils
+
+# A problem with one row of a sheet, numbered the way a spreadsheet shows them (the header is row 1)
+class RowError:
+    def __init__(self, row: int, result: validators.ValidationResult) -> None:
+        self.row: int = row
+        self.result: validators.ValidationResult = result
+
+    @property
+    def severity(self) -> str:
+        return self.result.severity
+
+    def __str__(self) -> str:
+        return f"Row {self.row}: {self.result}"
+
+# Reads spells from a CSV or TSV sheet a batch of rows at a time, so only one batch is held before it is handed on
+# Columns are matched to spell fields by header, database values and spell list names are resolved through lookup tables
+# Rows with errors are skipped and reported, rows with only warnings are imported
+class SpellImporter:
+    BATCH_SIZE: int = 1000
+    LIST_SEPARATOR: str = ";"
+
+    # Only this many problems are kept, the rest are only counted
+    MAX_ISSUES: int = 1000
+
+    # Header -> spell field, headers are compared without case, spaces or punctuation
+    # Both the project's field names and the game's stat names are understood
+    # A localized field followed by a language, e.g. "Display Name.French", reads that language's text
+    COLUMNS: Dict[str, str] = {
+        "uuid": "uuid",
+        "id": "id", "spellid": "id", "entry": "id",
+        "name": "name", "displayname": "name",
+        "description": "description",
+        "spelltype": "spellType", "type": "spellType",
+        "spellanimation": "spellAnimation", "animation": "spellAnimation",
+        "trajectory": "trajectory", "trajectories": "trajectory",
+        "level": "level",
+        "school": "school", "spellschool": "school",
+        "targetfloor": "targetFloor",
+        "targetradius": "targetRadius", "range": "targetRadius",
+        "targetcount": "targetCount", "amountoftargets": "targetCount",
+        "projectilecount": "projectileCount",
+        "rolltype": "rollType", "spellroll": "rollType",
+        "attacktype": "attackType",
+        "savetype": "saveType", "saveability": "saveType",
+        "savedc": "saveDC",
+        "previewcursor": "previewCursor",
+        "damagetype": "damageType",
+        "verbalintent": "verbalIntent",
+        "lists": "lists", "spelllists": "lists",
+        "controllericon": "controllerIcon", "icon": "controllerIcon",
+        "tooltipicon": "tooltipIcon",
+        "sourceicon": "sourceIcon",
+    }
+
+    # Fields with a fixed list of values, which are matched without case
+    CHOICES: Dict[str, str] = {
+        "spellType": "SpellType", "level": "Level", "school": "SpellSchool", "targetFloor": "TargetFloor",
+        "previewCursor": "PreviewCursor", "damageType": "DamageType", "verbalIntent": "VerbalIntent",
+    }
+    KEYED_CHOICES: Dict[str, str] = {"spellAnimation": "SpellAnimation", "trajectory": "Trajectories"}
+
+    # Pass mapping to add or override header -> field matches, e.g. {"Dmg Type": "damageType"}
+    def __init__(self, mapping: Dict[str, str] = None, batchSize: int = None) -> None:
+        self.columns: Dict[str, str] = dict(SpellImporter.COLUMNS)
+        for (header, field) in (mapping or {}).items():
+            self.columns[SpellImporter.Fold(header)] = field
+        self.batchSize: int = batchSize or SpellImporter.BATCH_SIZE
+
+        self.issues: List[RowError] = []
+        self.errors: int = 0
+        self.warnings: int = 0
+        self.rows: int = 0
+        self.imported: int = 0
+
+        # Folded name -> value for every lookup, built once
+        self._choices: Dict[str, Dict[str, str]] = {}
+        for field in list(SpellImporter.CHOICES) + ["rollType", "attackType", "saveType"]:
+            self._choices[field] = {SpellImporter.Fold(v): v for v in SpellImporter.Choices(field)}
+        self._keyedChoices: Dict[tuple[str, str], Dict[str, str]] = {}
+
+        # The value the spell editor starts each field at
+        self._defaults: Dict[str, str] = {field: utils.GetFirstIn(list(choices.values()), "") for (field, choices) in self._choices.items()}
+
+        self._lists: Dict[str, str] = {SpellImporter.Fold(name): uuid for (name, uuid) in data.spellLists.items()}
+        self._listUUIDs: set = set(data.spellLists.values())
+
+        # Spell id -> the row it was imported from, for duplicates anywhere in the sheet
+        # Only accepted rows are recorded, so a rejected row doesn't block a later row with the same id
+        self._ids: Dict[str, int] = {}
+
+    # The values a field can take, for any spell type when the values depend on it. Empty for free text fields
+    @staticmethod
+    def Choices(field: str) -> List[str]:
+        if field in SpellImporter.CHOICES:
+            return list(BG3Database.Get(SpellImporter.CHOICES[field], []) or [])
+        if field in SpellImporter.KEYED_CHOICES:
+            names = {}
+            for values in (BG3Database.Get(SpellImporter.KEYED_CHOICES[field], {}) or {}).values():
+                names.update(dict.fromkeys(values))
+            return list(names)
+        return {"rollType": data.spellRollTypes, "attackType": data.attackTypes, "saveType": data.abilityScores}.get(field, [])
+
+    @staticmethod
+    def Fold(value: str) -> str:
+        return re.sub(r"[^a-z0-9]", "", value.lower())
+
+    # The spell field a header is read into, "field.Language" for a translation, or None
+    def _column(self, header: str) -> str | None:
+        field = self.columns.get(SpellImporter.Fold(header))
+        (name, _, language) = header.rpartition(".")
+        if field is None and name and language.strip():
+            field = self.columns.get(SpellImporter.Fold(name))
+            return f"{field}.{language.strip()}" if field in models.Spell.LOCALIZED_FIELDS else None
+        return field
+
+    def _report(self, row: int, field: str, severity: str, message: str) -> None:
+        self._add(RowError(row, validators.ValidationResult(field, severity, message)))
+
+    def _add(self, error: RowError) -> None:
+        if error.severity == validators.ValidationResult.ERROR:
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if len(self.issues) < self.MAX_ISSUES:
+            self.issues.append(error)
+
+    # Every valid spell in a sheet, in batches of up to batchSize spells
+    # Relative icon paths are resolved against the sheet's folder
+    def read(self, path: str) -> Iterator[List[models.Spell]]:
+        root = os.path.dirname(os.path.abspath(path))
+        with open(path, "r", encoding="utf-8-sig", newline="") as file:
+            delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else None
+            yield from self.readFile(file, delimiter=delimiter, root=root)
+
+    # The same from an open text file, the delimiter is guessed from the header when not given
+    def readFile(self, file: TextIO, delimiter: str = None, root: str = None) -> Iterator[List[models.Spell]]:
+        header = file.readline()
+        if delimiter is None:
+            delimiter = max(("\t", ",", ";"), key=header.count)
+
+        headers = next(csv.reader([header], delimiter=delimiter), [])
+        fields = [self._column(h) for h in headers]
+        if "id" not in fields:
+            raise ValueError("The sheet has no spell id column")
+        for (h, field) in zip(headers, fields):
+            if field is None:
+                self._report(1, h, validators.ValidationResult.WARNING, "Unknown column is ignored")
+
+        batch: List[tuple[int, models.Spell]] = []
+        for (i, values) in enumerate(csv.reader(file, delimiter=delimiter), 2):
+            if not any(v.strip() for v in values):
+                continue
+
+            self.rows += 1
+            row = {field: value.strip() for (field, value) in zip(fields, values) if field}
+            spell = self._spell(i, row, root)
+            if spell:
+                batch.append((i, spell))
+
+            if len(batch) >= self.batchSize:
+                yield self._validate(batch)
+                batch = []
+
+        if batch:
+            yield self._validate(batch)
+
+    def _choice(self, i: int, field: str, value: str, choices: Dict[str, str]) -> str:
+        match = choices.get(SpellImporter.Fold(value))
+        if match is None and choices:
+            self._report(i, field, validators.ValidationResult.WARNING, f"Unknown value '{value}' is kept as it is")
+        return match if match is not None else value
+
+    # A spell from one row, filling unset fields with the defaults the spell editor shows, or None if the row is unusable
+    def _spell(self, i: int, row: Dict[str, str], root: str) -> models.Spell | None:
+        id = row.get("id")
+        if not id:
+            self._report(i, "ID", validators.ValidationResult.ERROR, "Spell ID is empty")
+            return None
+
+        # Uuids are derived from ids, so a repeated id can't even be validated
+        if id in self._ids:
+            self._report(i, "ID", validators.ValidationResult.ERROR, f"'{id}' is already used on row {self._ids[id]}")
+            return None
+
+        spell = models.Spell(uuid=row.get("uuid") or utils.Generate_UUID("Spell", id))
+        spell.id = id
+        spell.setName(row.get("name") or BG3Database.GetDefault("DisplayName", ""))
+        spell.setDescription(row.get("description") or BG3Database.GetDefault("Description", ""))
+        for (field, value) in row.items():
+            (field, _, language) = field.partition(".")
+            if language and value:
+                spell.setText(field, value, language)
+
+        for (field, choices) in self._choices.items():
+            value = row.get(field)
+            setattr(spell, field, self._choice(i, field, value, choices) if value else self._defaults[field])
+
+        for (field, collection) in SpellImporter.KEYED_CHOICES.items():
+            key = (collection, spell.spellType)
+            if key not in self._keyedChoices:
+                names = utils.GetValueFromKey(BG3Database.Get(collection, {}), spell.spellType, {}) or {}
+                self._keyedChoices[key] = {SpellImporter.Fold(n): n for n in names}
+                self._defaults[key] = utils.GetFirstIn(list(names), "")
+            value = row.get(field)
+            setattr(spell, field, self._choice(i, field, value, self._keyedChoices[key]) if value else self._defaults[key])
+
+        spell.targetRadius = row.get("targetRadius") or BG3Database.GetDefault("TargetRadius", "")
+        spell.targetCount = row.get("targetCount") or BG3Database.GetDefault("AmountOfTargets", "")
+        spell.projectileCount = row.get("projectileCount") or BG3Database.GetDefault("ProjectileCount", "")
+        spell.saveDC = row.get("saveDC") or utils.GetFirstIn(data.spellSaveDCs, "")
+
+        for field in ("controllerIcon", "tooltipIcon", "sourceIcon"):
+            path = row.get(field) or None
+            if path and root and not os.path.isabs(path):
+                path = os.path.join(root, path)
+            setattr(spell, field, path)
+
+        # Lists by name or uuid
+        for name in (row.get("lists") or "").split(self.LIST_SEPARATOR):
+            name = name.strip()
+            if not name:
+                continue
+            uuid = name if name in self._listUUIDs else self._lists.get(SpellImporter.Fold(name))
+            if uuid is None:
+                self._report(i, "SpellLists", validators.ValidationResult.ERROR, f"Unknown spell list '{name}'")
+                return None
+            if uuid not in spell.lists:
+                spell.lists.append(uuid)
+
+        spell.calcMetaValues()
+        return spell
+
+    # Runs the spell validator's rules over a batch, checking icon headers in parallel, and drops the rows with errors
+    def _validate(self, batch: List[tuple[int, models.Spell]]) -> List[models.Spell]:
+        validator = validators.SpellValidator()
+        for field in ("ControllerIcon", "TooltipIcon", "SourceIcon"):
+            validator.rules.pop(field)
+
+        for (_, spell) in batch:
+            validator.addSpell(spell)
+        icons = validators.ValidateIcons([spell for (_, spell) in batch])
+
+        spells = []
+        for (i, spell) in batch:
+            results = list(validator.results.get(spell.uuid, {}).values()) + list(icons.get(spell.uuid, {}).values())
+
+            # Rows of the same batch aren't checked against each other until now
+            if spell.id in self._ids:
+                results.append(validators.ValidationResult("ID", validators.ValidationResult.ERROR, f"'{spell.id}' is already used on row {self._ids[spell.id]}"))
+
+            for result in results:
+                self._add(RowError(i, result))
+            if not any(r.severity == validators.ValidationResult.ERROR for r in results):
+                self._ids[spell.id] = i
+                spells.append(spell)
+
+        self.imported += len(spells)
+        return spells
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    import resource
+
+    BG3Database.LoadData()
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lists = list(data.spellLists.keys())
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["ID", "Display Name", "Spell Type", "Level", "School", "Damage Type", "Spell Lists"])
+        for i in range(rows):
+            writer.writerow([f"Sheet_Spell_{i}", f"Spell {i}", "projectile", str(i % 7), "evocation", "fire", lists[i % len(lists)]])
+        path = file.name
+
+    try:
+        importer = SpellImporter()
+        start = time.perf_counter()
+        count = sum(len(batch) for batch in importer.read(path))
+        elapsed = time.perf_counter() - start
+
+        print(f"Imported {count}/{importer.rows} rows in {elapsed:.2f} s ({importer.rows / elapsed:.0f} rows/s), {importer.errors} errors, {importer.warnings} warnings")
+        print(f"Peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    finally:
+        os.remove(path)
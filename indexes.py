@@ -0,0 +1,68 @@
+from typing import List, Dict, Set
+
+import bisect
+
+# A precomputed index over a list of names for fast type-ahead filtering
+# Prefix matches come from a sorted key list, substring matches from an n-gram inverted index
+class SearchIndex:
+    GRAM_SIZE: int = 3
+
+    def __init__(self, values: List[str]) -> None:
+        self.values: List[str] = list(values)
+
+        folded = [v.lower() for v in self.values]
+        self._folded: List[str] = folded
+        self._sorted: List[tuple[str, int]] = sorted((v, i) for (i, v) in enumerate(folded))
+        self._sortedKeys: List[str] = [k for (k, _) in self._sorted]
+
+        # Every gram up to GRAM_SIZE long, so short queries are a single lookup
+        self._grams: Dict[str, Set[int]] = {}
+        for (i, v) in enumerate(folded):
+            for n in range(1, self.GRAM_SIZE + 1):
+                for j in range(len(v) - n + 1):
+                    self._grams.setdefault(v[j:j+n], set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    # Values starting with the text, in their original order
+    def prefix(self, text: str, limit: int = None) -> List[str]:
+        text = text.lower()
+        start = bisect.bisect_left(self._sortedKeys, text)
+        end = bisect.bisect_right(self._sortedKeys, text + "\uffff", lo=start)
+
+        matches = sorted(i for (_, i) in self._sorted[start:end])
+        return [self.values[i] for i in matches[:limit]]
+
+    # Values containing the text anywhere, in their original order
+    def contains(self, text: str, limit: int = None) -> List[str]:
+        text = text.lower()
+        if not text:
+            return self.values[:limit]
+
+        n = min(len(text), self.GRAM_SIZE)
+        candidates = None
+        for j in range(len(text) - n + 1):
+            postings = self._grams.get(text[j:j+n])
+            if not postings:
+                return []
+            candidates = set(postings) if candidates is None else candidates & postings
+
+        matches = sorted(i for i in candidates if text in self._folded[i])
+        return [self.values[i] for i in matches[:limit]]
+
+    # Prefix matches first, followed by the remaining substring matches
+    def search(self, text: str, limit: int = None) -> List[str]:
+        if not text:
+            return self.values[:limit]
+
+        results = self.prefix(text, limit)
+        if limit is None or len(results) < limit:
+            seen = set(results)
+            for v in self.contains(text):
+                if v not in seen:
+                    results.append(v)
+                    if limit is not None and len(results) >= limit:
+                        break
+
+        return results
@@ -0,0 +1,288 @@
+from typing import List, Dict
+
+import xml.etree.ElementTree as ET
+import struct
+import zlib
+
+# Converts LSX documents (as written by the resource writers) to and from binary LSF, version 6
+# Regions are stored as top level nodes named after the region id
+class LSF:
+    SIGNATURE: bytes = b"LSOF"
+    VERSION: int = 6
+    HEADER_FORMAT: str = "<4sIQ"
+    METADATA_FORMAT: str = "<IIQIIIIIIBBHI"
+    NODE_FORMAT: str = "<Iiii"
+    ATTRIBUTE_FORMAT: str = "<IIiI"
+    HASH_BUCKETS: int = 0x200
+
+    COMPRESSION_NONE: int = 0x00
+    COMPRESSION_ZLIB: int = 0x21
+
+    # LSX type name -> (type id, struct format) for fixed size values, None for strings
+    TYPES: Dict[str, tuple[int, str | None]] = {
+        "uint8":       (1,  "<B"),
+        "int16":       (2,  "<h"),
+        "uint16":      (3,  "<H"),
+        "int32":       (4,  "<i"),
+        "uint32":      (5,  "<I"),
+        "float":       (6,  "<f"),
+        "double":      (7,  "<d"),
+        "bool":        (19, "<?"),
+        "string":      (20, None),
+        "path":        (21, None),
+        "FixedString": (22, None),
+        "LSString":    (23, None),
+        "uint64":      (24, "<Q"),
+        "old_int64":   (26, "<q"),
+        "int8":        (27, "<b"),
+        "WString":     (29, None),
+        "LSWString":   (30, None),
+        "int64":       (32, "<q"),
+    }
+    TYPE_NAMES: Dict[int, str] = {v[0] : k for (k, v) in TYPES.items()}
+
+    # Packs the major.minor.revision.build of the <version> element the way LSF stores it
+    @staticmethod
+    def PackVersion(major: int, minor: int, revision: int, build: int) -> int:
+        return ((major & 0x7F) << 55) | ((minor & 0xFF) << 47) | ((revision & 0xFFFF) << 31) | (build & 0x7FFFFFFF)
+
+    @staticmethod
+    def UnpackVersion(version: int) -> tuple[int, int, int, int]:
+        return ((version >> 55) & 0x7F, (version >> 47) & 0xFF, (version >> 31) & 0xFFFF, version & 0x7FFFFFFF)
+
+# Writes an LSX ElementTree document as LSF bytes
+class LSFWriter:
+    def __init__(self, compress: bool = True) -> None:
+        self.compress: bool = compress
+
+    def write(self, root: ET.Element) -> bytes:
+        self._buckets: List[List[str]] = [[] for _ in range(LSF.HASH_BUCKETS)]
+        self._names: Dict[str, int] = {}
+        self._nodes: List[list] = []
+        self._attributes: List[list] = []
+        self._values: bytearray = bytearray()
+
+        for region in root.findall("region"):
+            for node in region.findall("node"):
+                self._addNode(node, region.get("id"), -1)
+
+        nodes = b"".join(struct.pack(LSF.NODE_FORMAT, *n) for n in self._nodes)
+        attributes = b"".join(struct.pack(LSF.ATTRIBUTE_FORMAT, *a) for a in self._attributes)
+        sections = [self._stringTable(), nodes, attributes, bytes(self._values)]
+
+        flags = LSF.COMPRESSION_ZLIB if self.compress else LSF.COMPRESSION_NONE
+        sizes = []
+        for (i, section) in enumerate(sections):
+            if self.compress:
+                sections[i] = zlib.compress(section)
+                sizes.append((len(section), len(sections[i])))
+            else:
+                sizes.append((len(section), 0))
+
+        version = root.find("version")
+        engineVersion = LSF.PackVersion(*[int(version.get(k, 0)) for k in ("major", "minor", "revision", "build")]) if version is not None else 0
+
+        header = struct.pack(LSF.HEADER_FORMAT, LSF.SIGNATURE, LSF.VERSION, engineVersion)
+        metadata = struct.pack(LSF.METADATA_FORMAT,
+                               sizes[0][0], sizes[0][1], 0,
+                               sizes[1][0], sizes[1][1],
+                               sizes[2][0], sizes[2][1],
+                               sizes[3][0], sizes[3][1],
+                               flags, 0, 0, 1)
+
+        return header + metadata + b"".join(sections)
+
+    # Node names are shared through the string table, referenced as (bucket << 16) | index
+    def _name(self, name: str) -> int:
+        if name not in self._names:
+            bucket = zlib.crc32(name.encode("utf-8")) % LSF.HASH_BUCKETS
+            self._names[name] = (bucket << 16) | len(self._buckets[bucket])
+            self._buckets[bucket].append(name)
+        return self._names[name]
+
+    def _stringTable(self) -> bytes:
+        table = bytearray(struct.pack("<I", LSF.HASH_BUCKETS))
+        for bucket in self._buckets:
+            table += struct.pack("<H", len(bucket))
+            for name in bucket:
+                data = name.encode("utf-8")
+                table += struct.pack("<H", len(data)) + data
+        return bytes(table)
+
+    def _addNode(self, node: ET.Element, name: str, parent: int) -> int:
+        index = len(self._nodes)
+        entry = [self._name(name), parent, -1, -1]
+        self._nodes.append(entry)
+
+        previous = None
+        for attribute in node.findall("attribute"):
+            attributeIndex = self._addAttribute(attribute)
+            if previous is None:
+                entry[3] = attributeIndex
+            else:
+                self._attributes[previous][2] = attributeIndex
+            previous = attributeIndex
+
+        children = node.find("children")
+        if children is not None:
+            previous = None
+            for child in children.findall("node"):
+                childIndex = self._addNode(child, child.get("id"), index)
+                if previous is not None:
+                    self._nodes[previous][2] = childIndex
+                previous = childIndex
+
+        return index
+
+    def _addAttribute(self, attribute: ET.Element) -> int:
+        dataType = attribute.get("type")
+        if dataType not in LSF.TYPES:
+            raise ValueError(f"Unsupported LSF attribute type '{dataType}'")
+
+        (typeID, fmt) = LSF.TYPES[dataType]
+        value = attribute.get("value", "")
+        if fmt is None:
+            data = value.encode("utf-8") + b"\0"
+        elif dataType == "bool":
+            data = struct.pack(fmt, value == "True")
+        elif dataType in ("float", "double"):
+            data = struct.pack(fmt, float(value))
+        else:
+            data = struct.pack(fmt, int(value))
+
+        offset = len(self._values)
+        self._values += data
+        self._attributes.append([self._name(attribute.get("id")), typeID | (len(data) << 6), -1, offset])
+
+        return len(self._attributes) - 1
+
+# Reads LSF bytes back into an LSX ElementTree document
+class LSFReader:
+    def read(self, data: bytes) -> ET.Element:
+        (signature, version, engineVersion) = struct.unpack_from(LSF.HEADER_FORMAT, data, 0)
+        if signature != LSF.SIGNATURE or version != LSF.VERSION:
+            raise ValueError("Not an LSF version 6 file")
+
+        offset = struct.calcsize(LSF.HEADER_FORMAT)
+        metadata = struct.unpack_from(LSF.METADATA_FORMAT, data, offset)
+        offset += struct.calcsize(LSF.METADATA_FORMAT)
+
+        sizes = [(metadata[0], metadata[1]), (metadata[3], metadata[4]), (metadata[5], metadata[6]), (metadata[7], metadata[8])]
+        sections = []
+        for (uncompressed, onDisk) in sizes:
+            if onDisk:
+                sections.append(zlib.decompress(data[offset:offset+onDisk]))
+                offset += onDisk
+            else:
+                sections.append(data[offset:offset+uncompressed])
+                offset += uncompressed
+
+        names = self._readStrings(sections[0])
+        nodes = list(struct.iter_unpack(LSF.NODE_FORMAT, sections[1]))
+        attributes = list(struct.iter_unpack(LSF.ATTRIBUTE_FORMAT, sections[2]))
+        values = sections[3]
+
+        root = ET.Element("save")
+        (major, minor, revision, build) = LSF.UnpackVersion(engineVersion)
+        ET.SubElement(root, "version", attrib={"major":str(major),"minor":str(minor),"revision":str(revision),"build":str(build)})
+
+        elements = []
+        for (nameIndex, parent, _, firstAttribute) in nodes:
+            name = names[nameIndex]
+            if parent == -1:
+                region = ET.SubElement(root, "region", attrib={"id":name})
+                element = ET.SubElement(region, "node", attrib={"id":name})
+            else:
+                parentElement = elements[parent]
+                children = parentElement.find("children")
+                if children is None:
+                    children = ET.SubElement(parentElement, "children")
+                element = ET.SubElement(children, "node", attrib={"id":name})
+            elements.append(element)
+
+            # Attributes come before children, so insert in front of any <children>
+            index = firstAttribute
+            position = 0
+            while index != -1:
+                (attributeName, typeAndLength, index, valueOffset) = attributes[index]
+                element.insert(position, self._readAttribute(names[attributeName], typeAndLength, values, valueOffset))
+                position += 1
+
+        return root
+
+    def _readStrings(self, data: bytes) -> Dict[int, str]:
+        names = {}
+        (count,) = struct.unpack_from("<I", data, 0)
+        offset = 4
+        for bucket in range(count):
+            (entries,) = struct.unpack_from("<H", data, offset)
+            offset += 2
+            for i in range(entries):
+                (length,) = struct.unpack_from("<H", data, offset)
+                offset += 2
+                names[(bucket << 16) | i] = data[offset:offset+length].decode("utf-8")
+                offset += length
+        return names
+
+    def _readAttribute(self, name: str, typeAndLength: int, values: bytes, offset: int) -> ET.Element:
+        typeID = typeAndLength & 0x3F
+        length = typeAndLength >> 6
+        dataType = LSF.TYPE_NAMES[typeID]
+        fmt = LSF.TYPES[dataType][1]
+
+        raw = values[offset:offset+length]
+        if fmt is None:
+            value = raw.rstrip(b"\0").decode("utf-8")
+        elif dataType == "bool":
+            value = "True" if struct.unpack(fmt, raw)[0] else "False"
+        elif dataType == "float":
+            value = self._shortestFloat(struct.unpack(fmt, raw)[0])
+        else:
+            value = str(struct.unpack(fmt, raw)[0])
+
+        return ET.Element("attribute", attrib={"id":name, "type":dataType, "value":value})
+
+    # The shortest text that still packs to the same 32 bit float
+    def _shortestFloat(self, value: float) -> str:
+        packed = struct.pack("<f", value)
+        for precision in range(1, 10):
+            text = repr(float(f"{value:.{precision}g}"))
+            if struct.pack("<f", float(text)) == packed:
+                return text
+        return repr(value)
+
+# Compares the LSF and ElementTree backends on an atlas UV list
+# Run with: python lsf.py [atlas size] [icon size]
+if __name__ == "__main__":
+    import sys
+    import time
+    import writers
+
+    atlasSize = int(sys.argv[1]) if len(sys.argv) > 1 else 8192
+    iconSize = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    atlas = writers.AtlasFile(uuid="benchmark", fileName="Icons_Benchmark", atlasTemplate="", iconSize=iconSize, icons=[])
+    atlas.size = (atlasSize, atlasSize)
+    template = writers.AtlasTemplateFile(fileName=atlas.fileName, path="Icons_Benchmark.dds", atlas=atlas, icons=[f"Spell_{i}" for i in range((atlasSize // iconSize) ** 2)])
+
+    start = time.perf_counter()
+    lsx = template.serialize()
+    lsxTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary = LSFWriter().write(template.dump())
+    lsfTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncompressed = LSFWriter(compress=False).write(template.dump())
+    rawTime = time.perf_counter() - start
+
+    document = template.dump()
+
+    print(f"{len(template.icons)} icons")
+    print(f"LSX            {len(lsx):>12,} bytes {lsxTime*1000:>10.1f} ms")
+    print(f"LSF            {len(uncompressed):>12,} bytes {rawTime*1000:>10.1f} ms")
+    print(f"LSF (zlib)     {len(binary):>12,} bytes {lsfTime*1000:>10.1f} ms")
+
+    roundTrip = LSFReader().read(binary)
+    print("Round trip", "OK" if len(roundTrip.findall(".//attribute")) == len(document.findall(".//attribute")) else "FAILED")
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Dict
 
 import xml.etree.ElementTree as ET
 
@@ -6,25 +6,95 @@ from utils import utils
 from data import BG3Database
 
 # The Datastructure of a localizied string
+# Holds one value per language, all sharing the same content uuid
 class Localization:
+    DEFAULT_LANGUAGE: str = "English"
+
     def __init__(self, uuid: str, version: str, value: str) -> None:
         self.uuid: str = uuid
         self.version: str = version
-        self.value: str = value
+        self.values: Dict[str, str] = {Localization.DEFAULT_LANGUAGE: value}
+
+    @property
+    def value(self) -> str:
+        return self.values.get(Localization.DEFAULT_LANGUAGE)
+
+    @value.setter
+    def value(self, value: str) -> None:
+        self.values[Localization.DEFAULT_LANGUAGE] = value
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self.values.keys())
+
+    # Untranslated languages fall back to the default language
+    def getValue(self, language: str = None) -> str:
+        return self.values.get(language or Localization.DEFAULT_LANGUAGE, self.value)
+
+    def setValue(self, value: str, language: str = None) -> None:
+        self.values[language or Localization.DEFAULT_LANGUAGE] = value
 
     def __str__(self) -> str:
         return str(ET.tostring(self.toXML()))
     
-    def toXML(self) -> ET.Element:
+    def toXML(self, language: str = None) -> ET.Element:
         root = ET.Element("content")
-        root.text = self.value
+        root.text = self.getValue(language)
         root.set("contentuid", self.uuid)
         root.set("version", self.version)
 
         return root
 
+    # Everything toXML(language) is rendered from, a cheap render cache key
+    def renderKey(self, language: str = None) -> tuple:
+        return (self.uuid, self.version, self.getValue(language))
+
+    def toDict(self) -> dict:
+        return {"uuid": self.uuid, "version": self.version, "values": dict(self.values)}
+
+    @staticmethod
+    def fromDict(value: dict) -> "Localization":
+        localization = Localization(uuid=value["uuid"], version=value.get("version", "1"), value=None)
+        localization.values = dict(value.get("values", {}))
+        return localization
+
+# A spell field holding the names of one of BG3Database's enumerations
+# Setting a database name stores the enumeration's copy, so every spell shares one string per name. Custom names are
+# kept as plain strings and never added to the enumeration, which lives as long as the process
+# There is no __get__, so reads are plain attribute reads
+class EnumField:
+    def __init__(self, collection: str) -> None:
+        self.collection: str = collection
+        self.name: str = None
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __set__(self, instance, value: str | None) -> None:
+        instance.__dict__[self.name] = BG3Database.GetEnumeration(self.collection).shared(value)
+
 # The Datastrucure of a spell
 class Spell:    
+    # The plain string fields, in the order they are saved
+    FIELDS: List[str] = [
+        "id", "spellType", "spellAnimation", "trajectory", "level", "school", "targetFloor", "targetRadius",
+        "targetCount", "projectileCount", "spellRoll", "tooltipAttackSave", "rollType", "attackType",
+        "saveType", "saveDC", "previewCursor", "damageType", "verbalIntent", "controllerIcon", "tooltipIcon", "sourceIcon",
+    ]
+
+    # The fields holding a Localization, set per language with setText
+    LOCALIZED_FIELDS: List[str] = ["name", "description"]
+
+    # Fields with a fixed set of database values are stored as codes
+    spellType = EnumField("SpellType")
+    spellAnimation = EnumField("SpellAnimation")
+    trajectory = EnumField("Trajectories")
+    level = EnumField("Level")
+    school = EnumField("SpellSchool")
+    targetFloor = EnumField("TargetFloor")
+    damageType = EnumField("DamageType")
+    previewCursor = EnumField("PreviewCursor")
+
     def __init__(self, uuid: str) -> None:
         self.uuid: str = uuid
         self.id: str = None
@@ -54,59 +124,80 @@ class Spell:
         self.lists: List[str] = []
         self.controllerIcon: str = None
         self.tooltipIcon: str = None
+
+        # A high resolution image the controller and tooltip icons are derived from when they aren't set
+        self.sourceIcon: str = None
     
+    # The entry name the game knows the spell by
+    def entryName(self) -> str:
+        return f"{self.spellType}_{self.id}"
+
+    # Every field the stats entry is rendered from, a cheap render cache key
+    # The animation and trajectory are resolved, so database changes also miss
+    def statsKey(self) -> tuple:
+        return (self.id, self.spellType, self.level, self.school, self.targetFloor, self.targetRadius, self.spellRoll, self.damageType,
+                self.targetCount, self.projectileCount, self.name.uuid, self.description.uuid, self.tooltipAttackSave, self.previewCursor,
+                self.verbalIntent, self._NameToAnimation(), self._NameToTrajectory())
+
+    # Every data line of the spell's stats entry as (key, value), in the order they are written
+    def toStats(self) -> List[tuple[str, str]]:
+        return [
+            ("SpellType", f"{self.spellType}"),
+            ("SpellContainerID", ""),
+            ("ContainerSpells", ""),
+            ("Level", f"{self.level}"),
+            ("SpellSchool", f"{self.school}"),
+            ("SpellProperties", "GROUND:SurfaceChange(Ignite);GROUND:SurfaceChange(Melt)"),
+            ("TargetFloor", f"{self.targetFloor}"),
+            ("TargetRadius", f"{self.targetRadius}"),
+            ("SpellRoll", f"{self.spellRoll}"),
+            ("SpellSuccess", f"IF(not CharacterLevelGreaterThan(16)):DealDamage(LevelMapValue(D10Cantrip),{self.damageType},Magical);IF(CharacterLevelGreaterThan(16)):DealDamage(4d10,{self.damageType},Magical)"),
+            ("TargetConditions", "not Self() and not Dead()"),
+            ("AmountOfTargets", f"{self.targetCount}"),
+            ("ProjectileCount", f"{self.projectileCount}"),
+            ("Trajectories", f"{self._NameToTrajectory()}"),
+            ("Icon", f"{self.id}"),
+            ("DisplayName", f"{self.name.uuid};1"),
+            ("Description", f"{self.description.uuid};1"),
+            ("TooltipDamageList", f"DealDamage(LevelMapValue(D10Cantrip),{self.damageType})"),
+            ("TooltipAttackSave", f"{self.tooltipAttackSave}"),
+            ("PrepareSound", "Spell_Prepare_Damage_Fire_Gen_L1to3"),
+            ("PrepareLoopSound", "Spell_Prepare_Damage_Fire_Gen_L1to3_Loop"),
+            ("CastSound", "Spell_Cast_Damage_Fire_FireBolt_L1to3"),
+            ("PreviewCursor", f"{self.previewCursor}"),
+            ("CastTextEvent", "Cast"),
+            ("CycleConditions", "Enemy() and not Dead()"),
+            ("UseCosts", "ActionPoint:1"),
+            ("SpellAnimation", f"{self._NameToAnimation()}"),
+            ("VerbalIntent", f"{self.verbalIntent}"),
+            ("SpellFlags", "HasVerbalComponent;HasSomaticComponent;IsSpell;HasHighGroundRangeExtension;RangeIgnoreVerticalThreshold;IsHarmful"),
+            ("HitAnimationType", "MagicalDamage_External"),
+            ("PrepareEffect", "c88e9cfa-df92-477a-ae75-cbfb932350b4"),
+            ("CastEffect", "e235ca47-1bf5-4587-9475-cf191b6005f9"),
+            ("DamageType", f"{self.damageType}"),
+        ]
+
     def __str__(self) -> str:
-        return (""
-        + "" + f'new entry "{self.spellType}_{self.id}"'
-        + "\n" + f'type "SpellData"'
-        + "\n" + f'data "SpellType" "{self.spellType}"'
-        + "\n" + f'using ""'
-        + "\n" + f'data "SpellContainerID" ""'
-        + "\n" + f'data "ContainerSpells" ""'
-        + "\n" + f'data "Level" "{self.level}"'
-        + "\n" + f'data "SpellSchool" "{self.school}"'
-        + "\n" + f'data "SpellProperties" "GROUND:SurfaceChange(Ignite);GROUND:SurfaceChange(Melt)"'
-        + "\n" + f'data "TargetFloor" "{self.targetFloor}"'
-        + "\n" + f'data "TargetRadius" "{self.targetRadius}"'
-        + "\n" + f'data "SpellRoll" "{self.spellRoll}"'
-        + "\n" + f'data "SpellSuccess" "IF(not CharacterLevelGreaterThan(16)):DealDamage(LevelMapValue(D10Cantrip),{self.damageType},Magical);IF(CharacterLevelGreaterThan(16)):DealDamage(4d10,{self.damageType},Magical)"'
-        + "\n" + f'data "TargetConditions" "not Self() and not Dead()"'
-        + "\n" + f'data "AmountOfTargets" "{self.targetCount}"'
-        + "\n" + f'data "ProjectileCount" "{self.projectileCount}"'
-        + "\n" + f'data "Trajectories" "{self._NameToTrajectory()}"'
-        + "\n" + f'data "Icon" "{self.id}"'
-        + "\n" + f'data "DisplayName" "{self.name.uuid};1"'
-        + "\n" + f'data "Description" "{self.description.uuid};1"'
-        + "\n" + f'data "TooltipDamageList" "DealDamage(LevelMapValue(D10Cantrip),{self.damageType})"'
-        + "\n" + f'data "TooltipAttackSave" "{self.tooltipAttackSave}"'
-        + "\n" + f'data "PrepareSound" "Spell_Prepare_Damage_Fire_Gen_L1to3"'
-        + "\n" + f'data "PrepareLoopSound" "Spell_Prepare_Damage_Fire_Gen_L1to3_Loop"'
-        + "\n" + f'data "CastSound" "Spell_Cast_Damage_Fire_FireBolt_L1to3"'
-        + "\n" + f'data "PreviewCursor" "{self.previewCursor}"'
-        + "\n" + f'data "CastTextEvent" "Cast"'
-        + "\n" + f'data "CycleConditions" "Enemy() and not Dead()"'
-        + "\n" + f'data "UseCosts" "ActionPoint:1"'
-        + "\n" + f'data "SpellAnimation" "{self._NameToAnimation()}"'
-        + "\n" + f'data "VerbalIntent" "{self.verbalIntent}"'
-        + "\n" + f'data "SpellFlags" "HasVerbalComponent;HasSomaticComponent;IsSpell;HasHighGroundRangeExtension;RangeIgnoreVerticalThreshold;IsHarmful"'
-        + "\n" + f'data "HitAnimationType" "MagicalDamage_External"'
-        + "\n" + f'data "PrepareEffect" "c88e9cfa-df92-477a-ae75-cbfb932350b4"'
-        + "\n" + f'data "CastEffect" "e235ca47-1bf5-4587-9475-cf191b6005f9"'
-        + "\n" + f'data "DamageType" "{self.damageType}"'
-        )
+        stats = self.toStats()
+        lines = [f'new entry "{self.entryName()}"', f'type "SpellData"', f'data "{stats[0][0]}" "{stats[0][1]}"', f'using ""']
+        lines += [f'data "{k}" "{v}"' for (k, v) in stats[1:]]
+        return "\n".join(lines)
 
     def _NameToAnimation(self) -> str:
-        return self._NameToKeyedValue(name=self.spellAnimation, key=self.spellType, collection=BG3Database.Get("SpellAnimation"))
+        return self._NameToKeyedValue(name=self.spellAnimation, key=self.spellType, collection="SpellAnimation")
     
     def _NameToTrajectory(self) -> str:
-        return self._NameToKeyedValue(name=self.trajectory, key=self.spellType, collection=BG3Database.Get("Trajectories"))
+        return self._NameToKeyedValue(name=self.trajectory, key=self.spellType, collection="Trajectories")
     
-    def _NameToKeyedValue(self, name: str, key: str, collection: dict) -> str:
-        if key and name:
-            if key in collection:
-                if name in collection[key]:
-                    return collection[key][name]
-        return name or ""
+    # An array lookup by spell type and name code, custom names are written as they are
+    def _NameToKeyedValue(self, name: str, key: str, collection: str) -> str:
+        value = BG3Database.GetKeyedEnumeration(collection).get(key, name)
+        return value if value is not None else (name or "")
+
+    # Derives the localization handles from the mod name and spell id, so regenerating gives identical files
+    def setStableUUIDs(self, modName: str) -> None:
+        self.name.uuid = utils.Generate_UUID(modName, self.id, "DisplayName")
+        self.description.uuid = utils.Generate_UUID(modName, self.id, "Description")
 
     def setName(self, value: str) -> None:
         self.name.value = value
@@ -117,6 +208,40 @@ class Spell:
     def setDescription(self, value: str) -> None:
         self.description.value = value
 
+    # Sets a localized field in one language, the default language when none is given. Returns whether it changed
+    def setText(self, field: str, value: str, language: str = None) -> bool:
+        if field not in Spell.LOCALIZED_FIELDS:
+            raise KeyError(f"Unknown localized field '{field}'")
+
+        localization = getattr(self, field)
+        if localization.values.get(language or Localization.DEFAULT_LANGUAGE) == value:
+            return False
+        localization.setValue(value, language)
+        return True
+
+    def toDict(self) -> dict:
+        value = {"uuid": self.uuid, "name": self.name.toDict(), "description": self.description.toDict()}
+        for field in Spell.FIELDS:
+            value[field] = getattr(self, field)
+        value["depends"] = list(self.depends)
+        value["lists"] = list(self.lists)
+
+        return value
+
+    @staticmethod
+    def fromDict(value: dict) -> "Spell":
+        spell = Spell(uuid=value["uuid"])
+        if "name" in value:
+            spell.name = Localization.fromDict(value["name"])
+        if "description" in value:
+            spell.description = Localization.fromDict(value["description"])
+        for field in Spell.FIELDS:
+            setattr(spell, field, value.get(field))
+        spell.depends = list(value.get("depends", []))
+        spell.lists = list(value.get("lists", []))
+
+        return spell
+
     def calcMetaValues(self) -> None:
         if self.rollType == "Attack":
             self.spellRoll = f"Attack(AttackType.{self.attackType})"
@@ -0,0 +1,94 @@
+from typing import List
+
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# LZ4 is optional, zlib is used for entries when it isn't installed
+try:
+    import lz4.block as lz4block
+except ImportError:
+    lz4block = None
+
+# Encodes data as a single literal-only LZ4 block
+# Valid input for any LZ4 block decoder, used for the file list when the lz4 package isn't installed
+def LZ4_Store_Block(data: bytes) -> bytes:
+    length = len(data)
+    if length < 15:
+        return bytes([length << 4]) + data
+
+    extra = length - 15
+    return bytes([0xF0]) + b"\xFF" * (extra // 255) + bytes([extra % 255]) + data
+
+# Writes an LSPK (v18, Baldur's Gate 3) .pak from in-memory files
+class PakFile:
+    fileExtension: str = ".pak"
+
+    SIGNATURE: bytes = b"LSPK"
+    VERSION: int = 18
+    HEADER_FORMAT: str = "<IQIBB16sH"
+    ENTRY_FORMAT: str = "<256sIHBBII"
+
+    COMPRESSION_NONE: int = 0x00
+    COMPRESSION_ZLIB: int = 0x01
+    COMPRESSION_LZ4: int = 0x02
+    LEVEL_DEFAULT: int = 0x20
+
+    def __init__(self, fileName: str, compression: str = "zlib", priority: int = 0) -> None:
+        self.fileName: str = fileName
+        self.compression: str = compression
+        self.priority: int = priority
+        self.files: List[tuple[str, bytes]] = []
+
+    # Paths are stored relative to the mod root with forward slashes
+    def addFile(self, path: str, data: bytes) -> None:
+        self.files.append((path.replace(os.sep, "/"), data))
+
+    def compress(self, data: bytes) -> tuple[bytes, int]:
+        if self.compression == "lz4" and lz4block:
+            packed = lz4block.compress(data, store_size=False)
+            method = PakFile.COMPRESSION_LZ4
+        elif self.compression in ("zlib", "lz4"):
+            packed = zlib.compress(data)
+            method = PakFile.COMPRESSION_ZLIB
+        else:
+            return (data, PakFile.COMPRESSION_NONE)
+
+        # Not worth storing compressed
+        if len(packed) >= len(data):
+            return (data, PakFile.COMPRESSION_NONE)
+
+        return (packed, method | PakFile.LEVEL_DEFAULT)
+
+    def export(self, path: str, workers: int = None) -> None:
+        # Create the directory if it doesn't exist
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+
+        # Compression releases the GIL, so entries are compressed in parallel
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            packed = list(executor.map(self.compress, [d for (_, d) in self.files]))
+
+        with open(os.path.join(path, self.fileName + self.fileExtension), "wb") as file:
+            file.write(PakFile.SIGNATURE)
+            file.write(b"\0" * struct.calcsize(PakFile.HEADER_FORMAT))
+
+            entries = b""
+            for ((name, data), (content, flags)) in zip(self.files, packed):
+                offset = file.tell()
+                file.write(content)
+
+                uncompressedSize = len(data) if flags else 0
+                entries += struct.pack(PakFile.ENTRY_FORMAT, name.encode("utf-8"), offset & 0xFFFFFFFF, offset >> 32, 0, flags, len(content), uncompressedSize)
+
+            # The file list is always LZ4 compressed
+            fileList = lz4block.compress(entries, store_size=False) if lz4block else LZ4_Store_Block(entries)
+
+            fileListOffset = file.tell()
+            file.write(struct.pack("<II", len(self.files), len(fileList)))
+            file.write(fileList)
+            fileListSize = file.tell() - fileListOffset
+
+            file.seek(len(PakFile.SIGNATURE))
+            file.write(struct.pack(PakFile.HEADER_FORMAT, PakFile.VERSION, fileListOffset, fileListSize, 0, self.priority, b"\0" * 16, 1))
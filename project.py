@@ -0,0 +1,98 @@
+from typing import List, Dict, Iterable
+
+import os
+import json
+
+import models
+
+# A saved mod: its name, export path, generation options and spells in export order
+class Project:
+    fileExtension: str = ".json"
+
+    def __init__(self, modName: str = "Default_Mod_Name", modPath: str = "Default_Mod_Path", spells: List[models.Spell] = None) -> None:
+        self.modName: str = modName
+        self.modPath: str = modPath
+        self.spells: List[models.Spell] = spells or []
+        self.options: Dict[str, any] = {"writeFiles": True, "pack": False, "binary": False, "atlasFormat": None, "archive": None, "factorStats": False, "mergeStats": False}
+
+        # Where the project was loaded from, relative icon paths are resolved against it
+        self.path: str = None
+
+    def toDict(self) -> dict:
+        return {
+            "modName": self.modName,
+            "modPath": self.modPath,
+            "options": dict(self.options),
+            "spells": [s.toDict() for s in self.spells],
+        }
+
+    @staticmethod
+    def fromDict(value: dict) -> "Project":
+        project = Project(modName=value.get("modName", ""), modPath=value.get("modPath", ""))
+        project.options.update(value.get("options", {}))
+        project.spells = [models.Spell.fromDict(s) for s in value.get("spells", [])]
+
+        return project
+
+    @staticmethod
+    def Load(path: str) -> "Project":
+        with open(path, "r", encoding="utf-8") as json_file:
+            project = Project.fromDict(json.load(json_file))
+        project.path = path
+
+        root = os.path.dirname(os.path.abspath(path))
+        for spell in project.spells:
+            if spell.controllerIcon and not os.path.isabs(spell.controllerIcon):
+                spell.controllerIcon = os.path.join(root, spell.controllerIcon)
+            if spell.tooltipIcon and not os.path.isabs(spell.tooltipIcon):
+                spell.tooltipIcon = os.path.join(root, spell.tooltipIcon)
+            if spell.sourceIcon and not os.path.isabs(spell.sourceIcon):
+                spell.sourceIcon = os.path.join(root, spell.sourceIcon)
+
+        return project
+
+    # relative=True saves icon paths inside the project's folder relative to it, the way Load resolves them
+    # Pass batches to save spells as they come instead of self.spells, e.g. from SpellImporter.read, so they are never all in memory
+    # The file is the same as json.dump(toDict(), indent=4), written one spell at a time
+    def save(self, path: str, relative: bool = False, batches: Iterable[List[models.Spell]] = None) -> None:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        root = os.path.dirname(os.path.abspath(path)) if relative else None
+        header = json.dumps({"modName": self.modName, "modPath": self.modPath, "options": dict(self.options), "spells": []}, indent=4)
+
+        with open(path, "w", encoding="utf-8") as json_file:
+            json_file.write(header[:-len("]\n}")])
+            first = True
+            for batch in (batches if batches is not None else [self.spells]):
+                for spell in batch:
+                    value = Project._Relative(spell.toDict(), root) if root else spell.toDict()
+                    json_file.write(("\n" if first else ",\n") + "        " + json.dumps(value, indent=4).replace("\n", "\n        "))
+                    first = False
+            json_file.write("]\n}" if first else "\n    ]\n}")
+        self.path = path
+
+    # A saved spell with its icons under root made relative to it
+    # Icons on another drive than root (Windows) have no relative path and stay absolute
+    @staticmethod
+    def _Relative(spell: dict, root: str) -> dict:
+        for field in ("controllerIcon", "tooltipIcon", "sourceIcon"):
+            path = spell[field]
+            if not path or not os.path.isabs(path):
+                continue
+            if os.path.normcase(os.path.splitdrive(path)[0]) != os.path.normcase(os.path.splitdrive(root)[0]):
+                continue
+            if os.path.commonpath([root, path]) == root:
+                spell[field] = os.path.relpath(path, root)
+        return spell
+
+    # Every icon file the project's spells reference
+    def iconPaths(self) -> List[str]:
+        paths = []
+        for spell in self.spells:
+            for path in (spell.controllerIcon, spell.tooltipIcon, spell.sourceIcon):
+                if path and path not in paths:
+                    paths.append(path)
+
+        return paths
@@ -0,0 +1,446 @@
+from typing import List, Dict, Set, Callable
+
+import os
+import json
+import time
+import base64
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import generator
+import sinks
+from project import Project
+from cache import RenderCache
+from data import BG3Database
+
+# A JSON-RPC error, returned to the client instead of a result
+class RPCError(Exception):
+    PARSE_ERROR: int = -32700
+    INVALID_REQUEST: int = -32600
+    METHOD_NOT_FOUND: int = -32601
+    INVALID_PARAMS: int = -32602
+    GENERATION_FAILED: int = -32000
+    BUSY: int = -32001
+
+    # All arguments are passed on, so the error survives the trip back from a worker process
+    def __init__(self, code: int, message: str, data: any = None) -> None:
+        super().__init__(code, message, data)
+        self.code: int = code
+        self.message: str = message
+        self.data: any = data
+
+    def __str__(self) -> str:
+        return self.message
+
+    def toDict(self) -> dict:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+# An archive written to a temporary file, sent as the response body instead of JSON
+class ArchiveResult:
+    CONTENT_TYPES: Dict[str, str] = {"zip": "application/zip", "tar": "application/x-tar", "tar.gz": "application/gzip"}
+
+    def __init__(self, path: str, format: str, fileName: str) -> None:
+        self.path: str = path
+        self.contentType: str = ArchiveResult.CONTENT_TYPES[format]
+        self.fileName: str = fileName
+
+# Each worker process keeps the spells it rendered in memory, so a project generated again only re-renders what changed
+# Forked workers already have the database from the server process
+_cache: RenderCache = None
+
+# The only folder requests may read projects and icons from or export into
+_root: str = None
+
+def _InitWorker(root: str = None) -> None:
+    global _cache, _root
+    if not BG3Database.IsLoaded():
+        BG3Database.LoadData()
+    _cache = RenderCache()
+    _root = os.path.realpath(root or os.getcwd())
+
+# A path a request passed, relative to the root, refused when it leads outside it
+def _Confine(path: str, field: str) -> str:
+    if not isinstance(path, str) or not path:
+        raise RPCError(RPCError.INVALID_PARAMS, f"{field} must be a path")
+
+    resolved = os.path.realpath(os.path.join(_root, path))
+    if os.path.commonpath([_root, resolved]) != _root:
+        raise RPCError(RPCError.INVALID_PARAMS, f"{field} '{path}' is outside the server's root folder")
+    return resolved
+
+def _Project(params: dict) -> Project:
+    if isinstance(params.get("project"), dict):
+        project = Project.fromDict(params["project"])
+    elif isinstance(params.get("path"), str):
+        path = _Confine(params["path"], "path")
+        try:
+            project = Project.Load(path)
+        except (OSError, ValueError) as e:
+            raise RPCError(RPCError.INVALID_PARAMS, f"Can't load project '{params['path']}': {e}")
+    else:
+        raise RPCError(RPCError.INVALID_PARAMS, "Pass a project or the path of one")
+
+    # Icons are copied into the output, so they could otherwise read any file
+    for spell in project.spells:
+        for field in ("controllerIcon", "tooltipIcon", "sourceIcon"):
+            if getattr(spell, field):
+                setattr(spell, field, _Confine(getattr(spell, field), field))
+
+    return project
+
+# Runs in a worker process, failures come back as RPCErrors carrying the traceback
+def _Generate(params: dict) -> dict | ArchiveResult:
+    try:
+        project = _Project(params)
+        output = params.get("output", "files")
+        selected = set(params["writers"]) if params.get("writers") else None
+
+        start = time.perf_counter()
+        modGenerator = generator.ModGenerator.FromProject(project, cache=_cache)
+        issues = {uuid: [str(r) for r in results.values()] for (uuid, results) in modGenerator.validateIcons().items()}
+        result = {"modName": project.modName, "issues": issues}
+
+        if output == "files":
+            sink = sinks.MemorySink()
+            modGenerator.write(sink, writers=selected)
+            result["files"] = {path: base64.b64encode(data).decode("ascii") for (path, data) in sink.files.items()}
+            result["directories"] = sorted(sink.directories)
+        elif output in sinks.ARCHIVE_FORMATS:
+            suffix = sinks.ARCHIVE_FORMATS[output]
+            (fd, path) = tempfile.mkstemp(suffix=suffix)
+            os.close(fd)
+            modGenerator.write(sinks.ArchiveSink(path, output, root=project.modName), writers=selected)
+            return ArchiveResult(path, output, project.modName + suffix)
+        elif output == "disc":
+            modPath = _Confine(params.get("out") or project.modPath, "out")
+            modGenerator.export(modPath, writers=selected)
+            if params.get("pack"):
+                modGenerator.pack(modPath)
+            result["path"] = os.path.abspath(os.path.join(modPath, project.modName))
+        else:
+            raise RPCError(RPCError.INVALID_PARAMS, f"Unknown output '{output}'")
+
+        result["seconds"] = time.perf_counter() - start
+        return result
+    except RPCError:
+        raise
+    except Exception as e:
+        raise RPCError(RPCError.GENERATION_FAILED, f"{type(e).__name__}: {e}", traceback.format_exc())
+
+# Generates mods for other tools over local HTTP JSON-RPC 2.0, e.g. build scripts or a web spell designer
+# Requests run on a fixed pool of worker processes that live as long as the server, so the database, decoded icons and
+# render cache stay loaded between requests
+# Up to queueSize requests wait for a free worker, past that the server answers 503 straight away so clients back off
+#
+#   POST / {"jsonrpc": "2.0", "id": 1, "method": "generate", "params": {"path": "MyMod.json"}}
+#
+# generate params:
+#   project  a project as saved by the GUI, or path to a project .json under the server's root folder
+#   output   "files" (default) returns every file base64 encoded, "zip", "tar" or "tar.gz" returns the archive
+#            as the response body, and "disc" exports to out (defaults to the project's Mod Path)
+#   writers  only run these writers, e.g. ["SpellFile", "LocalizationFile"]
+#   pack     with output "disc", also write the .pak
+#
+# Project paths, icons and disc exports are confined to root (the working directory by default)
+# Only JSON bodies are accepted, so a web page can't post a form or text/plain body without a CORS preflight, and
+# browsers are only answered for the origins in allowOrigins. The Host header must name this machine, against DNS rebinding
+class GenerationServer:
+    DEFAULT_PORT: int = 8765
+    CHUNK_SIZE: int = 1024 * 1024
+    LOCAL_HOSTS: List[str] = ["localhost", "127.0.0.1", "[::1]"]
+
+    def __init__(self, host: str = "127.0.0.1", port: int = None, workers: int = None, queueSize: int = None, root: str = None, allowOrigins: List[str] = None) -> None:
+        self.workers: int = workers or min(8, os.cpu_count() or 1)
+        self.queueSize: int = queueSize if queueSize is not None else self.workers * 4
+        self.root: str = os.path.realpath(root or os.getcwd())
+        self.allowOrigins: Set[str] = {origin.rstrip("/") for origin in allowOrigins or []}
+        self.allowHosts: Set[str] = set(GenerationServer.LOCAL_HOSTS + [host])
+
+        self._slots = threading.BoundedSemaphore(self.workers + self.queueSize)
+
+        # Exports to the same folder run one at a time, staging folders can't be shared
+        self._exportLocks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self.served: int = 0
+        self.failed: int = 0
+        self.rejected: int = 0
+        self.inFlight: int = 0
+
+        # Methods run in the worker processes, except the ones answered by the server itself
+        self.methods: Dict[str, Callable[[dict], any]] = {"generate": _Generate}
+        self.localMethods: Dict[str, Callable[[dict], any]] = {"status": self.status}
+
+        # Loaded before the workers start, so forked workers inherit it
+        _InitWorker(root=self.root)
+        self.executor: ProcessPoolExecutor = self._startPool()
+
+        self.httpServer = ThreadingHTTPServer((host, port if port is not None else self.DEFAULT_PORT), _RequestHandler)
+        self.httpServer.daemon_threads = True
+        self.httpServer.app = self
+
+    def _startPool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_InitWorker, initargs=(self.root,))
+
+    # A worker that dies (e.g. killed for memory) breaks the whole pool, so a new one takes its place
+    def _restartPool(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self.executor is not broken:
+                return
+            self.executor = self._startPool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.httpServer.server_address[:2]
+
+    # Queues a call on the worker pool, or returns None when the queue is full
+    # Exports to the same folder wait for each other here, their staging folders can't be shared
+    def submit(self, method: str, params: dict) -> Future | None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+
+        with self._lock:
+            self.inFlight += 1
+
+        lock = None
+        if params.get("output") == "disc":
+            project = params["project"] if isinstance(params.get("project"), dict) else {}
+            lock = self._exportLock(str(params.get("out") or project.get("modPath") or params.get("path")))
+            lock.acquire()
+
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(self.methods[method], params)
+            except BrokenProcessPool:
+                self._restartPool(executor)
+                executor = self.executor
+                future = executor.submit(self.methods[method], params)
+        except RuntimeError:
+            self._finish(False, lock)
+            raise RPCError(RPCError.GENERATION_FAILED, "The worker pool has stopped")
+
+        future.add_done_callback(lambda f: self._finish(f.exception() is None, lock))
+        future.add_done_callback(lambda f: isinstance(f.exception(), BrokenProcessPool) and self._restartPool(executor))
+        return future
+
+    def _finish(self, ok: bool, lock: threading.Lock = None) -> None:
+        if lock is not None:
+            lock.release()
+        with self._lock:
+            self.inFlight -= 1
+            if ok:
+                self.served += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def _exportLock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._exportLocks.setdefault(os.path.abspath(path), threading.Lock())
+
+    def status(self, params: dict) -> dict:
+        with self._lock:
+            status = {"workers": self.workers, "queueSize": self.queueSize, "inFlight": self.inFlight, "served": self.served, "failed": self.failed, "rejected": self.rejected}
+        status["database"] = BG3Database.IsLoaded()
+        return status
+
+    def serve(self) -> None:
+        try:
+            self.httpServer.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        self.httpServer.shutdown()
+
+    def close(self) -> None:
+        self.httpServer.server_close()
+        self.executor.shutdown(wait=True)
+
+# One HTTP request: a JSON-RPC call in, a JSON-RPC response or an archive out
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Requests are counted by the server, not logged one by one
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    # The Host header must name this machine, and browsers must come from an allowed origin
+    def checkOrigin(self) -> bool:
+        app = self.server.app
+        host = (self.headers.get("Host") or "").lower()
+        host = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+        origin = self.headers.get("Origin")
+        # Refused before the body is read, so the connection can't be reused
+        self.close_connection = True
+        if host not in app.allowHosts:
+            self.sendJSON(403, {"jsonrpc": "2.0", "id": None, "error": {"code": RPCError.INVALID_REQUEST, "message": f"Host '{host}' is not allowed"}})
+            return False
+        if origin is not None and origin.rstrip("/") not in app.allowOrigins:
+            self.sendJSON(403, {"jsonrpc": "2.0", "id": None, "error": {"code": RPCError.INVALID_REQUEST, "message": f"Origin '{origin}' is not allowed"}})
+            return False
+
+        self.close_connection = False
+        return True
+
+    # Lets an allowed origin read the response
+    def end_headers(self) -> None:
+        origin = self.headers.get("Origin") if self.headers else None
+        if origin is not None and origin.rstrip("/") in self.server.app.allowOrigins:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+        super().end_headers()
+
+    # The CORS preflight a browser sends before posting JSON
+    def do_OPTIONS(self) -> None:
+        if not self.checkOrigin():
+            return
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        if not self.checkOrigin():
+            return
+        if self.path.rstrip("/") == "/status":
+            self.sendJSON(200, {"jsonrpc": "2.0", "id": None, "result": self.server.app.status({})})
+        else:
+            self.sendJSON(404, {"jsonrpc": "2.0", "id": None, "error": {"code": RPCError.METHOD_NOT_FOUND, "message": "POST JSON-RPC calls to /"}})
+
+    def do_POST(self) -> None:
+        if not self.checkOrigin():
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if (self.headers.get("Content-Type") or "").split(";")[0].strip().lower() != "application/json":
+            self.sendJSON(415, {"jsonrpc": "2.0", "id": None, "error": {"code": RPCError.INVALID_REQUEST, "message": "Content-Type must be application/json"}})
+            return
+
+        id = None
+        try:
+            try:
+                request = json.loads(body)
+            except ValueError:
+                raise RPCError(RPCError.PARSE_ERROR, "Invalid JSON")
+
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RPCError(RPCError.INVALID_REQUEST, "Expected a JSON-RPC request object")
+            id = request.get("id")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise RPCError(RPCError.INVALID_PARAMS, "Params must be an object")
+            if request["method"] in self.server.app.localMethods:
+                self.sendJSON(200, {"jsonrpc": "2.0", "id": id, "result": self.server.app.localMethods[request["method"]](params)})
+                return
+            if request["method"] not in self.server.app.methods:
+                raise RPCError(RPCError.METHOD_NOT_FOUND, f"Unknown method '{request['method']}'")
+
+            future = self.server.app.submit(request["method"], params)
+            if future is None:
+                self.sendJSON(503, {"jsonrpc": "2.0", "id": id, "error": {"code": RPCError.BUSY, "message": "Server busy, retry later"}}, {"Retry-After": "1"})
+                return
+
+            result = future.result()
+        except RPCError as e:
+            self.sendJSON(200, {"jsonrpc": "2.0", "id": id, "error": e.toDict()})
+            return
+        except Exception as e:
+            # A worker crash or a result that couldn't be sent back from the worker
+            self.sendJSON(200, {"jsonrpc": "2.0", "id": id, "error": {"code": RPCError.GENERATION_FAILED, "message": f"{type(e).__name__}: {e}"}})
+            return
+
+        if isinstance(result, ArchiveResult):
+            self.sendArchive(result)
+        else:
+            self.sendJSON(200, {"jsonrpc": "2.0", "id": id, "result": result})
+
+    def sendJSON(self, status: int, value: dict, headers: Dict[str, str] = None) -> None:
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for (k, v) in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Streams the archive from its temporary file, a chunk at a time
+    def sendArchive(self, archive: ArchiveResult) -> None:
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", archive.contentType)
+            self.send_header("Content-Length", str(os.path.getsize(archive.path)))
+            self.send_header("Content-Disposition", f'attachment; filename="{archive.fileName}"')
+            self.end_headers()
+
+            with open(archive.path, "rb") as file:
+                while chunk := file.read(GenerationServer.CHUNK_SIZE):
+                    self.wfile.write(chunk)
+        finally:
+            os.remove(archive.path)
+
+if __name__ == "__main__":
+    import sys
+    import http.client
+    import models
+    from utils import utils
+
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    BG3Database.LoadData()
+    project = Project(modName="Benchmark", spells=[])
+    for i in range(200):
+        spell = models.Spell(uuid=utils.Generate_UUID("Benchmark", str(i)))
+        (spell.id, spell.spellType, spell.level, spell.damageType) = (f"Spell_{i}", "Projectile", "1", "Fire")
+        project.spells.append(spell)
+    body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "generate", "params": {"project": project.toDict(), "output": "zip"}})
+
+    def Client(latencies: list, busy: list) -> None:
+        connection = http.client.HTTPConnection(*server.address)
+        for _ in range(requests):
+            while True:
+                start = time.perf_counter()
+                connection.request("POST", "/", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 503:
+                    latencies.append(time.perf_counter() - start)
+                    break
+                busy.append(1)
+                time.sleep(0.05)
+        connection.close()
+
+    for (workers, queueSize) in ((1, 64), (4, 64), (4, 2)):
+        server = GenerationServer(port=0, workers=workers, queueSize=queueSize)
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+
+        (latencies, busy) = ([], [])
+        start = time.perf_counter()
+        threads = [threading.Thread(target=Client, args=(latencies, busy)) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        server.shutdown()
+        thread.join()
+
+        latencies.sort()
+        print(f"{workers} workers, queue {queueSize:>2}: {len(latencies) / elapsed:5.1f} req/s, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, {len(busy)} busy retries")
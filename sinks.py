@@ -0,0 +1,449 @@
+from typing import Dict, Set, Iterable, Iterator
+
+import os
+import io
+import sys
+import time
+import gzip
+import shutil
+import filecmp
+import tarfile
+import tempfile
+import zipfile
+import threading
+import ctypes
+import ctypes.util
+
+import packers
+
+# A file taken as is from disc, e.g. an icon, so sinks can copy or link it instead of holding it in memory
+class FileSource:
+    CHUNK_SIZE: int = 1024 * 1024
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def chunks(self) -> Iterator[bytes]:
+        with open(self.path, "rb") as file:
+            while chunk := file.read(FileSource.CHUNK_SIZE):
+                yield chunk
+
+# Where generated files end up: a folder, memory or an archive
+# Paths are relative to the mod root and may use either separator
+class Sink:
+    def write(self, relPath: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    # A file produced in chunks, sinks that can stream it never hold it whole
+    def writeChunks(self, relPath: str, chunks: Iterable[bytes]) -> None:
+        self.write(relPath, b"".join(chunks))
+
+    # A file copied from disc
+    def copy(self, relPath: str, source: FileSource) -> None:
+        self.writeChunks(relPath, source.chunks())
+
+    # An empty folder, e.g. Mods/
+    def addDirectory(self, relPath: str) -> None:
+        pass
+
+    # The current contents of a file, for writers that merge into what is already there
+    def read(self, relPath: str) -> bytes | None:
+        return None
+
+    def close(self) -> None:
+        pass
+
+    # Called instead of close when generation fails part way
+    def abort(self) -> None:
+        self.close()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, excType, *args) -> None:
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+    @staticmethod
+    def Normalize(relPath: str) -> str:
+        return relPath.replace("\\", "/").strip("/")
+
+# Writes each file into a folder on disc, creating each directory only once
+class DirectorySink(Sink):
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._directories: Set[str] = set()
+
+    def _path(self, relPath: str) -> str:
+        return os.path.join(self.path, *Sink.Normalize(relPath).split("/"))
+
+    def _makedirs(self, path: str) -> None:
+        if path not in self._directories:
+            os.makedirs(path, exist_ok=True)
+            self._directories.add(path)
+
+    def write(self, relPath: str, data: bytes) -> None:
+        path = self._path(relPath)
+        self._makedirs(os.path.dirname(path))
+
+        with open(path, "wb") as file:
+            file.write(data)
+
+    def writeChunks(self, relPath: str, chunks: Iterable[bytes]) -> None:
+        path = self._path(relPath)
+        self._makedirs(os.path.dirname(path))
+
+        with open(path, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+    def copy(self, relPath: str, source: FileSource) -> None:
+        path = self._path(relPath)
+        self._makedirs(os.path.dirname(path))
+        shutil.copyfile(source.path, path)
+
+    def addDirectory(self, relPath: str) -> None:
+        self._makedirs(self._path(relPath))
+
+    def read(self, relPath: str) -> bytes | None:
+        try:
+            with open(self._path(relPath), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+# Builds the new tree next to the live folder, then swaps it in when closed
+# A crash or failure part way leaves the live folder untouched, and the next export cleans up
+# Unchanged and untouched files are hard linked from the live folder instead of rewritten
+class StagedDirectorySink(DirectorySink):
+    RENAME_EXCHANGE: int = 0x2
+    AT_FDCWD: int = -100
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        self.livePath: str = os.path.abspath(path)
+        (parent, name) = os.path.split(self.livePath)
+        self.stagingPath: str = os.path.join(parent, f".{name}.staging")
+        self.oldPath: str = os.path.join(parent, f".{name}.old")
+        self.fsync: bool = fsync
+
+        self._written: Set[str] = set()
+        self._lock = threading.Lock()
+
+        self.recover()
+        super().__init__(self.stagingPath)
+        os.makedirs(self.stagingPath)
+
+    # Finishes or rolls back a swap that was interrupted, and drops any abandoned staging tree
+    def recover(self) -> None:
+        if os.path.exists(self.oldPath):
+            if os.path.exists(self.livePath):
+                shutil.rmtree(self.oldPath)
+            else:
+                os.rename(self.oldPath, self.livePath)
+
+        if os.path.exists(self.stagingPath):
+            shutil.rmtree(self.stagingPath)
+
+    def _livePath(self, relPath: str) -> str:
+        return os.path.join(self.livePath, *Sink.Normalize(relPath).split("/"))
+
+    def write(self, relPath: str, data: bytes) -> None:
+        path = self._path(relPath)
+        livePath = self._livePath(relPath)
+        with self._lock:
+            self._makedirs(os.path.dirname(path))
+            self._written.add(Sink.Normalize(relPath))
+
+        # Never write through a hard link into the live tree
+        if os.path.exists(path):
+            os.remove(path)
+
+        if self._unchanged(livePath, data) and self._link(livePath, path):
+            return
+
+        with open(path, "wb") as file:
+            file.write(data)
+
+    # Streamed files are always written, comparing them would mean holding them whole
+    def writeChunks(self, relPath: str, chunks: Iterable[bytes]) -> None:
+        path = self._path(relPath)
+        with self._lock:
+            self._makedirs(os.path.dirname(path))
+            self._written.add(Sink.Normalize(relPath))
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        with open(path, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+    # Linked from the live folder when the copy there is identical
+    def copy(self, relPath: str, source: FileSource) -> None:
+        path = self._path(relPath)
+        livePath = self._livePath(relPath)
+        with self._lock:
+            self._makedirs(os.path.dirname(path))
+            self._written.add(Sink.Normalize(relPath))
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        if self._sameFile(livePath, source.path) and self._link(livePath, path):
+            return
+
+        shutil.copyfile(source.path, path)
+
+    def _sameFile(self, livePath: str, path: str) -> bool:
+        try:
+            return filecmp.cmp(livePath, path, shallow=False)
+        except OSError:
+            return False
+
+    def _unchanged(self, livePath: str, data: bytes) -> bool:
+        try:
+            if os.path.getsize(livePath) != len(data):
+                return False
+            with open(livePath, "rb") as file:
+                return file.read() == data
+        except OSError:
+            return False
+
+    def _link(self, source: str, path: str) -> bool:
+        try:
+            os.link(source, path)
+            return True
+        except OSError:
+            return False
+
+    def read(self, relPath: str) -> bytes | None:
+        if Sink.Normalize(relPath) in self._written:
+            return super().read(relPath)
+
+        try:
+            with open(self._livePath(relPath), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    # Everything in the live folder this export didn't write, e.g. Mods/meta.lsx or files from other writers
+    def _carryOver(self) -> None:
+        if not os.path.isdir(self.livePath):
+            return
+
+        for (directory, directories, files) in os.walk(self.livePath):
+            relDirectory = os.path.relpath(directory, self.livePath)
+            stagedDirectory = os.path.normpath(os.path.join(self.stagingPath, relDirectory))
+            self._makedirs(stagedDirectory)
+
+            for name in files:
+                relPath = name if relDirectory == "." else Sink.Normalize(os.path.join(relDirectory, name))
+                if relPath in self._written:
+                    continue
+
+                source = os.path.join(directory, name)
+                path = os.path.join(stagedDirectory, name)
+                if not self._link(source, path):
+                    shutil.copy2(source, path)
+
+    # One pass over every new file and directory at the end, instead of syncing as each one is written
+    def _sync(self) -> None:
+        for relPath in self._written:
+            path = self._path(relPath)
+            fd = os.open(path, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        for path in self._directories:
+            self._syncDirectory(path)
+
+    # Directory entries can only be synced on posix
+    def _syncDirectory(self, path: str) -> None:
+        if os.name != "posix":
+            return
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Atomically exchanges the staging and live folders where the OS allows it (Linux renameat2)
+    # Otherwise the live folder is renamed aside first, and recover() repairs an interrupted swap
+    def _swap(self) -> None:
+        if not os.path.exists(self.livePath):
+            os.rename(self.stagingPath, self.livePath)
+            return
+
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                if libc.renameat2(self.AT_FDCWD, self.stagingPath.encode(), self.AT_FDCWD, self.livePath.encode(), self.RENAME_EXCHANGE) == 0:
+                    shutil.rmtree(self.stagingPath)
+                    return
+            except (OSError, AttributeError):
+                pass
+
+        os.rename(self.livePath, self.oldPath)
+        os.rename(self.stagingPath, self.livePath)
+        shutil.rmtree(self.oldPath)
+
+    def close(self) -> None:
+        self._carryOver()
+        if self.fsync:
+            self._sync()
+        self._swap()
+        if self.fsync:
+            self._syncDirectory(os.path.dirname(self.livePath))
+
+    def abort(self) -> None:
+        shutil.rmtree(self.stagingPath, ignore_errors=True)
+
+# Keeps every file in a dict, for previews, tests and packing without a disc round trip
+class MemorySink(Sink):
+    def __init__(self) -> None:
+        self.files: Dict[str, bytes] = {}
+        self.directories: Set[str] = set()
+
+    def write(self, relPath: str, data: bytes) -> None:
+        self.files[Sink.Normalize(relPath)] = data
+
+    def addDirectory(self, relPath: str) -> None:
+        self.directories.add(Sink.Normalize(relPath))
+
+    def read(self, relPath: str) -> bytes | None:
+        return self.files.get(Sink.Normalize(relPath))
+
+# Archives get a fixed timestamp, so generating the same mod twice gives the same bytes
+# SOURCE_DATE_EPOCH is the usual way to ask for another one
+def ArchiveTime() -> int:
+    return int(os.environ.get("SOURCE_DATE_EPOCH", 0))
+
+# Streams every file into one .zip, stored under an optional root folder
+class ZipSink(Sink):
+    def __init__(self, path: str, root: str = "", compression: int = zipfile.ZIP_DEFLATED) -> None:
+        self.path: str = path
+        self.root: str = Sink.Normalize(root)
+        self._zip = zipfile.ZipFile(path, "w", compression=compression)
+
+    def _name(self, relPath: str) -> str:
+        return "/".join(p for p in (self.root, Sink.Normalize(relPath)) if p)
+
+    # Zip dates can't be before 1980
+    def _info(self, name: str, mode: int) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=time.gmtime(max(ArchiveTime(), 315532800))[:6])
+        info.compress_type = self._zip.compression
+        info.external_attr = mode << 16
+        return info
+
+    def write(self, relPath: str, data: bytes) -> None:
+        self._zip.writestr(self._info(self._name(relPath), 0o644), data)
+
+    def writeChunks(self, relPath: str, chunks: Iterable[bytes]) -> None:
+        with self._zip.open(self._info(self._name(relPath), 0o644), "w", force_zip64=True) as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+    def copy(self, relPath: str, source: FileSource) -> None:
+        self.writeChunks(relPath, source.chunks())
+
+    def addDirectory(self, relPath: str) -> None:
+        info = self._info(self._name(relPath) + "/", 0o40755)
+        info.external_attr |= 0x10
+        self._zip.writestr(info, b"")
+
+    def close(self) -> None:
+        self._zip.close()
+
+    # Don't leave a truncated archive behind
+    def abort(self) -> None:
+        self._zip.close()
+        os.remove(self.path)
+
+# Streams every file into one .tar, gzip compressed with compression="gz"
+class TarSink(Sink):
+    def __init__(self, path: str, root: str = "", compression: str = "") -> None:
+        self.path: str = path
+        self.root: str = Sink.Normalize(root)
+
+        # tarfile's own gzip stream records the current time in its header
+        self._gzip = gzip.GzipFile(path, "wb", mtime=ArchiveTime()) if compression == "gz" else None
+        self._tar = tarfile.open(fileobj=self._gzip, mode="w") if self._gzip else tarfile.open(path, f"w:{compression}")
+
+    def _info(self, relPath: str) -> tarfile.TarInfo:
+        info = tarfile.TarInfo("/".join(p for p in (self.root, Sink.Normalize(relPath)) if p))
+        info.mtime = ArchiveTime()
+        return info
+
+    def write(self, relPath: str, data: bytes) -> None:
+        info = self._info(relPath)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+
+    # Tar headers need the size up front, so the chunks are spooled to a temporary file
+    def writeChunks(self, relPath: str, chunks: Iterable[bytes]) -> None:
+        with tempfile.TemporaryFile() as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+
+            info = self._info(relPath)
+            info.size = spool.tell()
+            spool.seek(0)
+            self._tar.addfile(info, spool)
+
+    # The size is known up front, so the file is streamed straight in
+    def copy(self, relPath: str, source: FileSource) -> None:
+        info = self._info(relPath)
+        info.size = os.path.getsize(source.path)
+        with open(source.path, "rb") as file:
+            self._tar.addfile(info, file)
+
+    def addDirectory(self, relPath: str) -> None:
+        info = self._info(relPath)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        self._tar.addfile(info)
+
+    def close(self) -> None:
+        self._tar.close()
+        if self._gzip:
+            self._gzip.close()
+
+    def abort(self) -> None:
+        self.close()
+        os.remove(self.path)
+
+# Collects every file into a .pak, written when the sink is closed
+class PakSink(Sink):
+    def __init__(self, path: str, fileName: str, compression: str = "zlib", workers: int = None) -> None:
+        self.path: str = path
+        self.workers: int = workers
+        self.pak = packers.PakFile(fileName=fileName, compression=compression)
+
+    def write(self, relPath: str, data: bytes) -> None:
+        self.pak.addFile(Sink.Normalize(relPath), data)
+
+    def close(self) -> None:
+        self.pak.export(self.path, workers=self.workers)
+
+    # Nothing is written until close
+    def abort(self) -> None:
+        pass
+
+# The archive formats ArchiveSink understands, by file extension
+ARCHIVE_FORMATS = {"zip": ".zip", "tar": ".tar", "tar.gz": ".tar.gz"}
+
+# Opens a zip or tar sink for one of ARCHIVE_FORMATS
+def ArchiveSink(path: str, format: str, root: str = "") -> Sink:
+    if format == "zip":
+        return ZipSink(path, root=root)
+    if format == "tar":
+        return TarSink(path, root=root)
+    if format == "tar.gz":
+        return TarSink(path, root=root, compression="gz")
+
+    raise ValueError(f"Unknown archive format {format}")
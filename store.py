@@ -0,0 +1,219 @@
+from typing import List, Dict, Set, Iterator
+
+import operator
+import numpy as np
+
+import models
+from enums import Enumeration
+from data import BG3Database
+
+# The spells of a project kept as one column of integer codes per field (struct of arrays) next to the spell objects
+# Filters compare whole columns at once, and bulk edits write a column then copy the new value into only the spells it changed
+# Behaves like the uuid -> spell dict it replaces, in insertion order
+class SpellStore:
+    # Fields whose change means the derived spell roll and tooltip must be recalculated
+    META_FIELDS: Set[str] = {"rollType", "attackType", "saveType", "saveDC"}
+
+    def __init__(self, spells: List[models.Spell] = None) -> None:
+        self.spells: Dict[str, models.Spell] = {}
+
+        self._rows: Dict[str, int] = {}
+        self._spells: List[models.Spell] = []
+        self._capacity: int = 0
+
+        # Database fields start from a copy of BG3Database's enumeration so they share its codes, and free text fields start empty
+        # Custom names are only added to the store's own enumerations, which go away with the store
+        self._enumerations: Dict[str, Enumeration] = {}
+        for field in models.Spell.FIELDS:
+            descriptor = models.Spell.__dict__.get(field)
+            self._enumerations[field] = BG3Database.GetEnumeration(descriptor.collection).copy() if isinstance(descriptor, models.EnumField) else Enumeration(field)
+        self._columns: Dict[str, np.ndarray] = {field: np.empty(0, dtype=np.int32) for field in models.Spell.FIELDS}
+
+        self.extend(spells or [])
+
+    def _grow(self, size: int) -> None:
+        if size <= self._capacity:
+            return
+
+        self._capacity = max(size, self._capacity * 2, 64)
+        for (field, column) in self._columns.items():
+            grown = np.full(self._capacity, Enumeration.NONE, dtype=np.int32)
+            grown[:len(column)] = column
+            self._columns[field] = grown
+
+    def _write(self, row: int, spell: models.Spell) -> None:
+        for field in models.Spell.FIELDS:
+            self._columns[field][row] = self._enumerations[field].code(getattr(spell, field))
+
+    def add(self, spell: models.Spell) -> None:
+        if spell.uuid in self._rows:
+            self.remove(spell.uuid)
+
+        row = len(self._spells)
+        self._grow(row + 1)
+        self._spells.append(spell)
+        self._rows[spell.uuid] = row
+        self.spells[spell.uuid] = spell
+        self._write(row, spell)
+
+    # Adds many spells a column at a time
+    def extend(self, spells: List[models.Spell]) -> None:
+        spells = [spell for spell in dict((spell.uuid, spell) for spell in spells).values() if spell.uuid not in self._rows]
+        start = len(self._spells)
+        self._grow(start + len(spells))
+
+        # Known names are a plain dict lookup, only new ones go through the enumeration's lock
+        for field in models.Spell.FIELDS:
+            enumeration = self._enumerations[field]
+            codes = enumeration.codes
+            values = map(operator.attrgetter(field), spells)
+            self._columns[field][start:start + len(spells)] = [codes[v] if v in codes else enumeration.code(v) if v is not None else Enumeration.NONE for v in values]
+
+        for (row, spell) in enumerate(spells, start):
+            self._spells.append(spell)
+            self._rows[spell.uuid] = row
+            self.spells[spell.uuid] = spell
+
+    # Moves the last row into the removed one, so the columns stay packed
+    def remove(self, uuid: str) -> models.Spell:
+        row = self._rows.pop(uuid)
+        spell = self.spells.pop(uuid)
+        last = len(self._spells) - 1
+
+        if row != last:
+            moved = self._spells[last]
+            self._spells[row] = moved
+            self._rows[moved.uuid] = row
+            for column in self._columns.values():
+                column[row] = column[last]
+
+        self._spells.pop()
+        return spell
+
+    # Re-reads a spell that was edited directly, e.g. by the spell widget
+    def refresh(self, spell: models.Spell) -> None:
+        self._write(self._rows[spell.uuid], spell)
+
+    # The codes of a field, one per row. Decode with enumeration(field)[code]
+    def column(self, field: str) -> np.ndarray:
+        return self._columns[field][:len(self._spells)]
+
+    def enumeration(self, field: str) -> Enumeration:
+        return self._enumerations[field]
+
+    # A row mask of the spells matching every condition, e.g. select(school="Evocation", level=["1", "2"])
+    # A list of values matches any of them, None matches unset fields
+    def select(self, **conditions) -> np.ndarray:
+        mask = np.ones(len(self._spells), dtype=bool)
+        for (field, value) in conditions.items():
+            if field not in self._columns:
+                raise KeyError(f"Unknown spell field '{field}'")
+
+            # Only look codes up, a name no spell has can't match anything
+            enumeration = self._enumerations[field]
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            codes = [Enumeration.NONE if v is None else enumeration.codes.get(v) for v in values]
+            mask &= np.isin(self.column(field), [c for c in codes if c is not None])
+
+        return mask
+
+    # The spells of a row mask, in row order
+    def spellsAt(self, mask: np.ndarray) -> List[models.Spell]:
+        return [self._spells[row] for row in np.flatnonzero(mask)]
+
+    def filter(self, **conditions) -> List[models.Spell]:
+        return self.spellsAt(self.select(**conditions))
+
+    # Sets fields on every spell in the mask, e.g. update(store.select(school="Evocation"), damageType="Cold", level="3")
+    # Only spells whose value actually changes are written to, and they are returned
+    def update(self, mask: np.ndarray, **values) -> List[models.Spell]:
+        changed = np.zeros(len(self._spells), dtype=bool)
+        fields: Dict[str, tuple[np.ndarray, int]] = {}
+
+        for (field, value) in values.items():
+            if field not in self._columns:
+                raise KeyError(f"Unknown spell field '{field}'")
+
+            column = self.column(field)
+            code = self._enumerations[field].code(value)
+            rows = mask & (column != code)
+            column[rows] = code
+
+            fields[field] = (rows, code)
+            changed |= rows
+
+        rows = np.flatnonzero(changed)
+        for (field, (fieldRows, code)) in fields.items():
+            value = self._enumerations[field][code]
+            for row in np.flatnonzero(fieldRows):
+                setattr(self._spells[row], field, value)
+
+        # Derived fields follow the fields they are derived from
+        if self.META_FIELDS & fields.keys():
+            for row in rows:
+                self._spells[row].calcMetaValues()
+                self._write(row, self._spells[row])
+
+        return [self._spells[row] for row in rows]
+
+    # The dict interface of uuid -> spell
+    def __getitem__(self, uuid: str) -> models.Spell:
+        return self.spells[uuid]
+
+    def __setitem__(self, uuid: str, spell: models.Spell) -> None:
+        self.add(spell)
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self.spells
+
+    def __len__(self) -> int:
+        return len(self.spells)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.spells)
+
+    def get(self, uuid: str, default: models.Spell = None) -> models.Spell | None:
+        return self.spells.get(uuid, default)
+
+    def keys(self):
+        return self.spells.keys()
+
+    def values(self):
+        return self.spells.values()
+
+    def items(self):
+        return self.spells.items()
+
+    def pop(self, uuid: str) -> models.Spell:
+        return self.remove(uuid)
+
+if __name__ == "__main__":
+    import time
+
+    BG3Database.LoadData()
+    schools = BG3Database.Get("SpellSchool")
+    spells = []
+    for i in range(100000):
+        spell = models.Spell(uuid=str(i))
+        (spell.id, spell.spellType, spell.level, spell.school, spell.damageType) = (f"Spell_{i}", "Projectile", "1", schools[i % len(schools)], "Fire")
+        spells.append(spell)
+
+    start = time.perf_counter()
+    store = SpellStore(spells)
+    print(f"Build:       {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    matched = [s for s in spells if s.school == "Evocation"]
+    print(f"Loop filter: {(time.perf_counter() - start) * 1000:.1f} ms ({len(matched)} spells)")
+
+    start = time.perf_counter()
+    matched = store.filter(school="Evocation")
+    print(f"Filter:      {(time.perf_counter() - start) * 1000:.1f} ms ({len(matched)} spells)")
+
+    start = time.perf_counter()
+    changed = store.update(store.select(school="Evocation"), damageType="Cold", level="3")
+    print(f"Bulk edit:   {(time.perf_counter() - start) * 1000:.1f} ms ({len(changed)} spells changed)")
+
+    start = time.perf_counter()
+    changed = store.update(store.select(school="Evocation"), damageType="Cold", level="3")
+    print(f"Repeat edit: {(time.perf_counter() - start) * 1000:.1f} ms ({len(changed)} spells changed)")
@@ -4,11 +4,19 @@ import uuid
 from PIL import Image
 import os
 
-def Generate_UUID() -> str:
+from dds import DDS
+
+# Namespace for deterministic ids, so the same names always give the same UUID
+UUID_NAMESPACE = uuid.UUID("5b0c3f7e-9a4d-5e21-8f6b-2d7c1e9a0b34")
+
+# Random when called without names, otherwise a UUIDv5 of the names (e.g. mod name, spell id, field)
+def Generate_UUID(*names: str) -> str:
+    if names:
+        return str(uuid.uuid5(UUID_NAMESPACE, "/".join(str(n) for n in names)))
     return str(uuid.uuid4())
 
-def Generate_Handle() -> str:
-    return "h"+Generate_UUID().replace("-", "")
+def Generate_Handle(*names: str) -> str:
+    return "h"+Generate_UUID(*names).replace("-", "")
 
 def Resize_Image(image: Image.Image, display_width: int, display_height: int) -> Image.Image:
     # Calculate the aspect ratio
@@ -30,9 +38,14 @@ def Get_Image_Dims(value: str | Image.Image) -> tuple[int,int] | None:
     size = None
     if type(value) == str:
         if value and os.path.exists(value):
-            image = Image.open(value)
-            size = image.size
-    elif type(value) == Image:
+            # DDS sizes come from the header alone, without decoding the image
+            info = DDS.ReadInfo(value) if value.lower().endswith(".dds") else None
+            if info:
+                size = info.size
+            else:
+                with Image.open(value) as image:
+                    size = image.size
+    elif isinstance(value, Image.Image):
         size = value.size
     
     return size
@@ -0,0 +1,222 @@
+from typing import List, Dict, Set, Callable
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import models
+from dds import DDS
+from data import BG3Database
+from utils import utils
+
+# A single problem found while validating a spell
+class ValidationResult:
+    ERROR: str = "Error"
+    WARNING: str = "Warning"
+
+    def __init__(self, field: str, severity: str, message: str) -> None:
+        self.field: str = field
+        self.severity: str = severity
+        self.message: str = message
+
+    def __str__(self) -> str:
+        return f"{self.severity}: {self.field} - {self.message}"
+
+# Validates spells incrementally
+# Keeps an index of spell ids so an edit only re-checks the edited spell and the spells sharing its old or new id
+class SpellValidator:
+    def __init__(self) -> None:
+        self._spells: Dict[str, models.Spell] = {}
+        self._ids: Dict[str, str] = {}
+        self._idIndex: Dict[str, Set[str]] = {}
+
+        # Spell uuid -> field -> result of the rule that checks that field
+        self.results: Dict[str, Dict[str, ValidationResult]] = {}
+
+        self.rules: Dict[str, Callable[[models.Spell], ValidationResult | None]] = {
+            "ID":             self._CheckID,
+            "SpellType":      self._CheckSpellType,
+            "SpellAnimation": self._CheckAnimation,
+            "Trajectories":   self._CheckTrajectory,
+            "SpellLists":     self._CheckLists,
+            "ControllerIcon": lambda spell: CheckSpellIcon(spell, "ControllerIcon", spell.controllerIcon),
+            "TooltipIcon":    lambda spell: CheckSpellIcon(spell, "TooltipIcon", spell.tooltipIcon),
+            "SourceIcon":     lambda spell: CheckSourceIcon(spell.sourceIcon),
+        }
+
+    def addSpell(self, spell: models.Spell) -> None:
+        self._spells[spell.uuid] = spell
+        self.updateSpell(spell)
+
+    def removeSpell(self, spell: models.Spell) -> None:
+        self._spells.pop(spell.uuid, None)
+        self.results.pop(spell.uuid, None)
+
+        oldID = self._ids.pop(spell.uuid, None)
+        self._unindex(spell.uuid, oldID)
+        self._checkDuplicates(oldID)
+
+    # Re-runs every rule for a single spell, and the duplicate check for the ids it moved between
+    def updateSpell(self, spell: models.Spell) -> None:
+        if spell.uuid not in self._spells:
+            self._spells[spell.uuid] = spell
+
+        results = {}
+        for (field, rule) in self.rules.items():
+            result = rule(spell)
+            if result:
+                results[field] = result
+        self.results[spell.uuid] = results
+
+        oldID = self._ids.get(spell.uuid)
+        if oldID != spell.id:
+            self._unindex(spell.uuid, oldID)
+            self._ids[spell.uuid] = spell.id
+            if spell.id:
+                self._idIndex.setdefault(spell.id, set()).add(spell.uuid)
+            self._checkDuplicates(oldID)
+
+        self._checkDuplicates(spell.id)
+
+    # Re-checks the icons of every spell, as the files may have changed on disc since the spells were edited
+    def validateIcons(self, spells: List[models.Spell]) -> None:
+        results = ValidateIcons(spells)
+        for spell in spells:
+            spellResults = self.results.setdefault(spell.uuid, {})
+            for field in list(ICON_SIZES.keys()) + ["SourceIcon"]:
+                spellResults.pop(field, None)
+            spellResults.update(results.get(spell.uuid, {}))
+
+    def getResults(self, spell: models.Spell) -> List[ValidationResult]:
+        return list(self.results.get(spell.uuid, {}).values())
+
+    def getIssues(self) -> Dict[str, List[ValidationResult]]:
+        return {uuid : list(r.values()) for (uuid, r) in self.results.items() if r}
+
+    def hasErrors(self) -> bool:
+        for results in self.results.values():
+            for r in results.values():
+                if r.severity == ValidationResult.ERROR:
+                    return True
+        return False
+
+    def _unindex(self, uuid: str, id: str) -> None:
+        if id in self._idIndex:
+            self._idIndex[id].discard(uuid)
+            if not self._idIndex[id]:
+                self._idIndex.pop(id)
+
+    def _checkDuplicates(self, id: str) -> None:
+        if not id:
+            return
+
+        uuids = self._idIndex.get(id, set())
+        for uuid in uuids:
+            results = self.results.setdefault(uuid, {})
+            if len(uuids) > 1:
+                results["Duplicate"] = ValidationResult("ID", ValidationResult.ERROR, f"'{id}' is used by {len(uuids)} spells")
+            else:
+                results.pop("Duplicate", None)
+
+    def _CheckID(self, spell: models.Spell) -> ValidationResult | None:
+        if not spell.id:
+            return ValidationResult("ID", ValidationResult.ERROR, "Spell ID is empty")
+        if any(c.isspace() for c in spell.id):
+            return ValidationResult("ID", ValidationResult.ERROR, f"'{spell.id}' must not contain spaces")
+        return None
+
+    def _CheckSpellType(self, spell: models.Spell) -> ValidationResult | None:
+        if spell.spellType not in BG3Database.Get("SpellType", []):
+            return ValidationResult("SpellType", ValidationResult.WARNING, f"Unknown spell type '{spell.spellType}'")
+        return None
+
+    def _CheckAnimation(self, spell: models.Spell) -> ValidationResult | None:
+        return self._CheckKeyedValue("SpellAnimation", spell.spellAnimation, spell.spellType)
+
+    def _CheckTrajectory(self, spell: models.Spell) -> ValidationResult | None:
+        return self._CheckKeyedValue("Trajectories", spell.trajectory, spell.spellType)
+
+    # Custom values are allowed, so names missing from the database are only a warning
+    def _CheckKeyedValue(self, field: str, name: str, key: str) -> ValidationResult | None:
+        collection = BG3Database.Get(field, {})
+        if name and key in collection and name not in collection[key]:
+            return ValidationResult(field, ValidationResult.WARNING, f"Unknown {key} value '{name}'")
+        return None
+
+    def _CheckLists(self, spell: models.Spell) -> ValidationResult | None:
+        if any(not uuid for uuid in spell.lists):
+            return ValidationResult("SpellLists", ValidationResult.ERROR, "Spell list UUID is empty")
+        if not spell.lists:
+            return ValidationResult("SpellLists", ValidationResult.WARNING, "Spell is not on any spell list")
+        return None
+
+# The required square size of each icon, from the README
+ICON_SIZES: Dict[str, int] = {"ControllerIcon": 64, "TooltipIcon": 380}
+
+# Checks an icon is a DDS of the required size, reading only its header
+def CheckIcon(field: str, path: str) -> ValidationResult | None:
+    if not path:
+        return ValidationResult(field, ValidationResult.WARNING, "No icon set")
+    if not os.path.exists(path):
+        return ValidationResult(field, ValidationResult.ERROR, f"'{path}' does not exist")
+
+    # Unreadable (permissions, a folder, a file removed since) is reported like any other bad icon
+    try:
+        info = DDS.ReadInfo(path)
+    except OSError as e:
+        return ValidationResult(field, ValidationResult.ERROR, f"'{os.path.basename(path)}' can't be read: {e.strerror or e}")
+    if not info:
+        return ValidationResult(field, ValidationResult.ERROR, f"'{os.path.basename(path)}' is not a DDS file")
+
+    size = ICON_SIZES[field]
+    if info.size != (size, size):
+        return ValidationResult(field, ValidationResult.ERROR, f"'{os.path.basename(path)}' is {info.width}x{info.height}, expected {size}x{size}")
+
+    return None
+
+# Icons left empty are fine when they will be derived from the spell's source image
+def CheckSpellIcon(spell: models.Spell, field: str, path: str) -> ValidationResult | None:
+    if not path and spell.sourceIcon:
+        return None
+    return CheckIcon(field, path)
+
+# The source image can be any size or format Pillow reads, smaller than the tooltip it is only a warning
+def CheckSourceIcon(path: str) -> ValidationResult | None:
+    if not path:
+        return None
+    if not os.path.exists(path):
+        return ValidationResult("SourceIcon", ValidationResult.ERROR, f"'{path}' does not exist")
+
+    try:
+        size = utils.Get_Image_Dims(path)
+    except (OSError, ValueError):
+        size = None
+    if not size:
+        return ValidationResult("SourceIcon", ValidationResult.ERROR, f"'{os.path.basename(path)}' is not an image")
+
+    largest = max(ICON_SIZES.values())
+    if min(size) < largest:
+        return ValidationResult("SourceIcon", ValidationResult.WARNING, f"'{os.path.basename(path)}' is {size[0]}x{size[1]}, and will be upscaled to {largest}x{largest}")
+
+    return None
+
+# Checks every icon of every spell in parallel, returning spell uuid -> field -> problem
+def ValidateIcons(spells: List[models.Spell], workers: int = None) -> Dict[str, Dict[str, ValidationResult]]:
+    checks = [(spell.uuid, field, path, spell) for spell in spells for (field, path) in (("ControllerIcon", spell.controllerIcon), ("TooltipIcon", spell.tooltipIcon), ("SourceIcon", spell.sourceIcon))]
+
+    def check(c) -> ValidationResult | None:
+        (_, field, path, spell) = c
+        return CheckSourceIcon(path) if field == "SourceIcon" else CheckSpellIcon(spell, field, path)
+
+    # Only checks that read a file are worth a thread
+    reads = [i for (i, c) in enumerate(checks) if c[2]]
+    checked = [None if c[2] else check(c) for c in checks]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (i, result) in zip(reads, executor.map(check, [checks[i] for i in reads])):
+            checked[i] = result
+
+    results = {}
+    for ((uuid, field, _, _), result) in zip(checks, checked):
+        if result:
+            results.setdefault(uuid, {})[field] = result
+
+    return results
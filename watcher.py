@@ -0,0 +1,194 @@
+from typing import List, Dict, Set
+
+import os
+import sys
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+
+import generator
+from project import Project
+from cache import RenderCache
+
+# Reports which of a set of files changed
+# Uses inotify on Linux, and falls back to polling modification times everywhere else
+class FileWatcher:
+    IN_MODIFY: int = 0x002
+    IN_CLOSE_WRITE: int = 0x008
+    IN_MOVED_TO: int = 0x080
+    IN_CREATE: int = 0x100
+    IN_DELETE: int = 0x200
+    EVENT_FORMAT: str = "iIII"
+
+    def __init__(self, paths: List[str], polling: bool = False, interval: float = 0.5) -> None:
+        self.interval: float = interval
+        self.paths: Set[str] = set()
+        self._stats: Dict[str, tuple] = {}
+
+        self._fd: int = None
+        self._directories: Dict[int, str] = {}
+        if not polling:
+            self._fd = self._initInotify()
+
+        self.setPaths(paths)
+
+    @property
+    def polling(self) -> bool:
+        return self._fd is None
+
+    def _initInotify(self) -> int | None:
+        if not sys.platform.startswith("linux"):
+            return None
+
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = self._libc.inotify_init1(os.O_NONBLOCK)
+        except (OSError, AttributeError):
+            return None
+
+        return fd if fd >= 0 else None
+
+    def setPaths(self, paths: List[str]) -> None:
+        self.paths = {os.path.abspath(p) for p in paths if p}
+        self._stats = {p : self._stat(p) for p in self.paths}
+
+        # Editors often save by replacing the file, so watch the containing directories
+        if not self.polling:
+            watched = set(self._directories.values())
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+            for directory in {os.path.dirname(p) for p in self.paths} - watched:
+                if os.path.isdir(directory):
+                    wd = self._libc.inotify_add_watch(self._fd, directory.encode(), mask)
+                    if wd >= 0:
+                        self._directories[wd] = directory
+
+    def _stat(self, path: str) -> tuple | None:
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    # Blocks for up to timeout seconds, returning the watched files that changed
+    def poll(self, timeout: float) -> Set[str]:
+        if self.polling:
+            time.sleep(min(timeout, self.interval))
+            changed = set()
+            for path in self.paths:
+                stat = self._stat(path)
+                if stat != self._stats.get(path):
+                    self._stats[path] = stat
+                    changed.add(path)
+            return changed
+
+        (readable, _, _) = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        data = os.read(self._fd, 65536)
+        offset = 0
+        while offset < len(data):
+            (wd, _, _, length) = struct.unpack_from(self.EVENT_FORMAT, data, offset)
+            offset += struct.calcsize(self.EVENT_FORMAT)
+            name = data[offset:offset+length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+
+            path = os.path.join(self._directories.get(wd, ""), name)
+            if path in self.paths:
+                changed.add(path)
+
+        return changed
+
+    # Waits for a change, then keeps collecting until nothing has changed for `debounce` seconds
+    def wait(self, debounce: float) -> Set[str]:
+        changed = set()
+        while not changed:
+            changed = self.poll(1.0)
+
+        while True:
+            more = self.poll(debounce)
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+# Regenerates a project whenever the project file or one of its icons changes
+# Icon edits only re-run the icon writers, project edits re-run everything they affect
+class ProjectWatcher:
+    # Rendered spells are kept between builds, so an edit only re-renders the spells it changed
+    def __init__(self, projectPath: str, modPath: str = None, debounce: float = 0.3, polling: bool = False, cache: RenderCache = None) -> None:
+        self.projectPath: str = os.path.abspath(projectPath)
+        self.modPath: str = modPath
+        self.debounce: float = debounce
+        self.cache: RenderCache = cache or RenderCache()
+
+        self.project: Project = Project.Load(self.projectPath)
+        self.watcher = FileWatcher(self._watchedPaths(), polling=polling)
+
+    def _watchedPaths(self) -> List[str]:
+        return [self.projectPath] + self.project.iconPaths()
+
+    def _outputPath(self) -> str:
+        return self.modPath if self.modPath is not None else self.project.modPath
+
+    def generate(self, writers: Set[str] = None) -> None:
+        start = time.perf_counter()
+        generator.ModGenerator.FromProject(self.project, cache=self.cache).export(self._outputPath(), writers=writers)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Generated {', '.join(sorted(writers)) if writers else 'all files'} in {elapsed:.0f} ms")
+
+    # Which writers a set of changed files needs, None for all of them
+    def affectedWriters(self, changed: Set[str]) -> Set[str] | None:
+        writers = set()
+
+        if self.projectPath in changed:
+            previous = self.project
+            try:
+                self.project = Project.Load(self.projectPath)
+            except (OSError, ValueError) as e:
+                print(f"Could not reload {self.projectPath}: {e}")
+                return set()
+
+            before = previous.toDict()
+            after = self.project.toDict()
+            if before != after:
+                for spells in (before["spells"], after["spells"]):
+                    for s in spells:
+                        s.pop("controllerIcon")
+                        s.pop("tooltipIcon")
+                        s.pop("sourceIcon")
+
+                # Only icon paths changed
+                if before == after:
+                    writers |= generator.ModGenerator.ICON_WRITERS
+                else:
+                    return None
+
+            self.watcher.setPaths(self._watchedPaths())
+
+        if changed - {self.projectPath}:
+            writers |= generator.ModGenerator.ICON_WRITERS
+
+        return writers
+
+    def run(self) -> None:
+        print(f"Watching {self.projectPath} and {len(self.project.iconPaths())} icons ({'polling' if self.watcher.polling else 'inotify'})")
+        self.generate()
+
+        try:
+            while True:
+                changed = self.watcher.wait(self.debounce)
+                writers = self.affectedWriters(changed)
+                if writers is None or writers:
+                    self.generate(writers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
@@ -9,18 +9,25 @@ import os
 import data as data
 from utils import utils
 import models
+import validators
+from project import Project
 
 from data import BG3Database
+from indexes import SearchIndex
 
-# A drag and drop image frame that accepts DDS files
+# A drag and drop image frame that accepts DDS files, or any of `extensions`
 class DnDImage(tk.Frame):
     def __init__(self, master=None, **kwargs) -> None:
         dropEnabled: bool = kwargs.pop("enabled")
         text: str = kwargs.pop("label")
+        self.extensions: tuple[str] = utils.PopKwArgs(kwargs, "extensions", (".dds",))
         super().__init__(master, **kwargs, relief="solid", borderwidth=1)
 
         self.path: str = ""
 
+        # Set when an image is dropped, cleared when the owner saves or loads a spell
+        self.dirty: bool = False
+
         # Create a Label for displaying the image
         self.data = ttk.Label(self, text=text, anchor="center", justify="center")
         self.data.pack(fill="both", expand=1)
@@ -40,10 +47,15 @@ class DnDImage(tk.Frame):
     # Function to handle image drop
     def on_drop(self, event) -> None:
         path = event.data
-        if path.lower().endswith(('.dds', '.DDS')):
+        if path.lower().endswith(self.extensions):
             self.display_image(path)
+            self.dirty = True
 
+    # Decoding and resizing is the slow part, so showing the image that is already shown does nothing
     def display_image(self, path: str) -> None:
+        if path and path == self.path:
+            return
+
         if path and os.path.exists(path):
             image = Image.open(path)
 
@@ -65,12 +77,14 @@ class DnDImage(tk.Frame):
 class IconWidget(tk.Frame):
     def __init__(self, master=None, **kwargs) -> None:
         text: str = kwargs.pop("label")
+        extensions: tuple[str] = utils.PopKwArgs(kwargs, "extensions", (".dds",))
         super().__init__(master, **kwargs)
 
         label = tk.Label(self, text=text)
         label.pack(side=tk.TOP, fill=tk.X, expand=True)
 
-        self.data = DnDImage(self, enabled=True, width=64, height=64, label="Drop DDS\nHere")
+        dropText = "Drop DDS\nHere" if extensions == (".dds",) else "Drop Image\nHere"
+        self.data = DnDImage(self, enabled=True, width=64, height=64, label=dropText, extensions=extensions)
         self.data.pack(side=tk.TOP)
 
         self.show()
@@ -82,21 +96,61 @@ class IconWidget(tk.Frame):
         self.pack_forget()
 
 # A labeled combo box
+# Typing filters the dropdown through a search index rather than listing every value
 class ComboWidget(tk.Frame):
+    MAX_MATCHES: int = 100
+
     def __init__(self, master=None, **kwargs) -> None:
         text: str = utils.PopKwArgs(kwargs,"label", "")
         labelWidth: str = utils.PopKwArgs(kwargs,"labelWidth", 14)
         value: List[str] = utils.PopKwArgs(kwargs,"value", [])
+        index: SearchIndex = utils.PopKwArgs(kwargs,"index", None)
         super().__init__(master, **kwargs)
 
         label = tk.Label(self, text=text, width=labelWidth, anchor=tk.E, padx=4)
         label.pack(side=tk.LEFT)
 
-        self.data = ttk.Combobox(self, values=value)
-        self.data.set(utils.GetFirstIn(value,""))
+        self.var = tk.StringVar(self)
+        self.data = ttk.Combobox(self, textvariable=self.var)
         self.data.pack(side=tk.RIGHT, fill=tk.X, expand=True)
+        self.data.bind("<KeyRelease>", self.on_key_release)
+
+        # The last value set from code, and whether the user has changed it since
+        self._value: str = ""
+        self.dirty: bool = False
+        self.var.trace_add("write", self.on_change)
+
+        self.setValues(value, index)
+        self.set(utils.GetFirstIn(self.index.values,""))
 
         self.show()
+
+    def setValues(self, values: List[str], index: SearchIndex = None) -> None:
+        self.index: SearchIndex = index or SearchIndex(values)
+        self.data["values"] = self.index.values[:self.MAX_MATCHES]
+
+    # Filter the dropdown to the values matching the typed text
+    def on_key_release(self, event) -> None:
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+
+        self.data["values"] = self.index.search(self.data.get(), self.MAX_MATCHES)
+
+    def on_change(self, *args) -> None:
+        self.dirty = True
+
+    # The value shown, only asking Tk when the user has changed it
+    def get(self) -> str:
+        if self.dirty:
+            self._value = self.var.get()
+        return self._value
+
+    # Shows a value, leaving Tk alone when it is already shown
+    def set(self, value: str) -> None:
+        if value != self.get():
+            self.var.set(value)
+            self._value = self.var.get()
+        self.dirty = False
     
     def show(self) -> None:
         self.pack(fill=tk.X, expand=True, pady=2)
@@ -115,11 +169,32 @@ class EntryWidget(tk.Frame):
         label = tk.Label(self, text=text, width=labelWidth, anchor=tk.E, padx=4)
         label.pack(side=tk.LEFT)
 
-        self.data = tk.Entry(self, font=('calibre',10,'normal'))
+        self.var = tk.StringVar(self, value=value)
+        self.data = tk.Entry(self, font=('calibre',10,'normal'), textvariable=self.var)
         self.data.pack(side=tk.RIGHT, fill=tk.X, expand=True)
-        self.data.insert(0, value)
+
+        # The last value set from code, and whether the user has changed it since
+        self._value: str = self.var.get()
+        self.dirty: bool = False
+        self.var.trace_add("write", self.on_change)
 
         self.show()
+
+    def on_change(self, *args) -> None:
+        self.dirty = True
+
+    # The value shown, only asking Tk when the user has changed it
+    def get(self) -> str:
+        if self.dirty:
+            self._value = self.var.get()
+        return self._value
+
+    # Shows a value, leaving Tk alone when it is already shown
+    def set(self, value: str) -> None:
+        if value != self.get():
+            self.var.set(value)
+            self._value = self.var.get()
+        self.dirty = False
         
     def show(self) -> None:
         self.pack(fill=tk.X, expand=True, pady=2)
@@ -135,6 +210,30 @@ class ModWidget(tk.Frame):
         self._Name = EntryWidget(self, label="Mod Name:", labelWidth=10, value="Default_Mod_Name")
         self._Path = EntryWidget(self, label="Mod Path:", labelWidth=10, value="Default_Mod_Path")
 
+        options_frame = tk.Frame(self)
+        options_frame.pack(fill=tk.X)
+
+        self._WriteFiles = tk.IntVar(value=1)
+        self._Pack = tk.IntVar(value=0)
+        self._Binary = tk.IntVar(value=0)
+        self._FactorStats = tk.IntVar(value=0)
+        self._MergeStats = tk.IntVar(value=0)
+        ttk.Checkbutton(options_frame, text="Write Files", variable=self._WriteFiles, onvalue=1, offvalue=0).pack(side=tk.LEFT, padx=4)
+        ttk.Checkbutton(options_frame, text="Pack .pak", variable=self._Pack, onvalue=1, offvalue=0).pack(side=tk.LEFT, padx=4)
+        ttk.Checkbutton(options_frame, text="Binary LSF", variable=self._Binary, onvalue=1, offvalue=0).pack(side=tk.LEFT, padx=4)
+        ttk.Checkbutton(options_frame, text="Factor Stats", variable=self._FactorStats, onvalue=1, offvalue=0).pack(side=tk.LEFT, padx=4)
+        ttk.Checkbutton(options_frame, text="Merge Stats", variable=self._MergeStats, onvalue=1, offvalue=0).pack(side=tk.LEFT, padx=4)
+
+        tk.Label(options_frame, text="Atlas:").pack(side=tk.LEFT, padx=(8,0))
+        self._AtlasFormat = ttk.Combobox(options_frame, values=["Uncompressed", "BC3", "BC1"], state="readonly", width=14)
+        self._AtlasFormat.set("Uncompressed")
+        self._AtlasFormat.pack(side=tk.LEFT, padx=4)
+
+        tk.Label(options_frame, text="Archive:").pack(side=tk.LEFT, padx=(8,0))
+        self._Archive = ttk.Combobox(options_frame, values=["None", "zip", "tar", "tar.gz"], state="readonly", width=8)
+        self._Archive.set("None")
+        self._Archive.pack(side=tk.LEFT, padx=4)
+
     @property
     def Name(self) -> str:
         return self._Name.data.get()
@@ -143,6 +242,57 @@ class ModWidget(tk.Frame):
     def Path(self) -> str:
         return self._Path.data.get()
 
+    @property
+    def WriteFiles(self) -> bool:
+        return bool(self._WriteFiles.get())
+
+    @property
+    def Pack(self) -> bool:
+        return bool(self._Pack.get())
+
+    @property
+    def Binary(self) -> bool:
+        return bool(self._Binary.get())
+
+    @property
+    def FactorStats(self) -> bool:
+        return bool(self._FactorStats.get())
+
+    @property
+    def MergeStats(self) -> bool:
+        return bool(self._MergeStats.get())
+
+    @property
+    def AtlasFormat(self) -> str | None:
+        value = self._AtlasFormat.get()
+        return value if value != "Uncompressed" else None
+
+    @property
+    def Archive(self) -> str | None:
+        value = self._Archive.get()
+        return value if value != "None" else None
+
+    def fromProject(self, project: Project) -> None:
+        self._Name.data.delete(0, tk.END)
+        self._Name.data.insert(0, project.modName)
+        self._Path.data.delete(0, tk.END)
+        self._Path.data.insert(0, project.modPath)
+
+        self._WriteFiles.set(int(project.options.get("writeFiles", True)))
+        self._Pack.set(int(project.options.get("pack", False)))
+        self._Binary.set(int(project.options.get("binary", False)))
+        self._FactorStats.set(int(project.options.get("factorStats", False)))
+        self._MergeStats.set(int(project.options.get("mergeStats", False)))
+        self._AtlasFormat.set(project.options.get("atlasFormat") or "Uncompressed")
+        self._Archive.set(project.options.get("archive") or "None")
+
+    def toProject(self, project: Project) -> Project:
+        project.modName = self.Name
+        project.modPath = self.Path
+        project.options.update({"writeFiles": self.WriteFiles, "pack": self.Pack, "binary": self.Binary, "factorStats": self.FactorStats, "mergeStats": self.MergeStats, "atlasFormat": self.AtlasFormat, "archive": self.Archive})
+
+        return project
+
 # A widget containing a list of checkboxes allowing multi-select of spell lists to which to add the selected spell  
 class SpellListWidget(tk.Frame):
     def __init__(self, master=None, **kwargs):
@@ -169,7 +319,13 @@ class SpellListWidget(tk.Frame):
             var = tk.IntVar()
             checkbox = ttk.Checkbutton(canvas_frame, text=f"{k}", variable=var, onvalue=1, offvalue=0, takefocus=False)
             checkbox.pack(fill=tk.X)
+            var.trace_add("write", lambda *args, i=len(self._SpellLists): self.on_toggle(i))
             self._SpellLists.append((v,var))
+
+        # Which boxes are ticked, mirrored here so reading and loading lists needs no Tk calls
+        self._checked: List[bool] = [False] * len(self._SpellLists)
+        self._loading: bool = False
+        self.dirty: bool = False
         
         # Add a scrollbar to the canvas
         scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=canvas.yview)
@@ -182,15 +338,36 @@ class SpellListWidget(tk.Frame):
         canvas_frame.update_idletasks()
         canvas.config(scrollregion=canvas.bbox("all"))
     
+    # Boxes ticked by setLists are already mirrored, only a click has to be read back from Tk
+    def on_toggle(self, i: int) -> None:
+        if self._loading:
+            return
+        self._checked[i] = bool(self._SpellLists[i][1].get())
+        self.dirty = True
+
     @property
     def SpellLists(self):
         lists = []
-        for (uuid, var) in self._SpellLists:
-            if var.get():
+        for (i, (uuid, _)) in enumerate(self._SpellLists):
+            if self._checked[i]:
                 lists.append(uuid)
                 
         return lists
 
+    # Ticks exactly the boxes of these lists, only touching the boxes that change
+    def setLists(self, lists: List[str]) -> None:
+        lists = set(lists)
+        self._loading = True
+        try:
+            for (i, (uuid, var)) in enumerate(self._SpellLists):
+                checked = uuid in lists
+                if self._checked[i] != checked:
+                    self._checked[i] = checked
+                    var.set(checked)
+        finally:
+            self._loading = False
+        self.dirty = False
+
 # A widget containing a list of data entry fields to populate the spell template
 class SpellDataWidget(tk.Frame):
     LEVEL_MAPS = ["D4Cantrip", "D6Cantrip", "D8Cantrip", "D10Cantrip", "D12Cantrip"]
@@ -215,6 +392,7 @@ class SpellDataWidget(tk.Frame):
         canvas_frame.place(relwidth=1)
         self.winHnd = self.canvas.create_window((0, 0), window=canvas_frame, anchor=tk.NW)
 
+        self.defaulted: bool = False
         self.fields: Dict[str, ComboWidget | EntryWidget] = {}
         props: List[str] = utils.GetValueFromKey(data.spellProperties,"All", [])
         maxWidth = 14   
@@ -234,8 +412,8 @@ class SpellDataWidget(tk.Frame):
         self._Name            = EntryWidget(canvas_frame, label="Spell Name:",        labelWidth=maxWidth, value="Default Name")
         self._Description     = EntryWidget(canvas_frame, label="Spell Description:", labelWidth=maxWidth, value="Default Description")
         self._SpellType       = ComboWidget(canvas_frame, label="Spell Type:",        labelWidth=maxWidth, value=BG3Database.Get("SpellType", []))
-        self._SpellAnimation  = ComboWidget(canvas_frame, label="Animation:",         labelWidth=maxWidth, value=utils.GetKeys(utils.GetValueFromKey(BG3Database.Get("SpellAnimation"), self._SpellType.data.get()), []))
-        self._Trajectory      = ComboWidget(canvas_frame, label="Trajectory:",        labelWidth=maxWidth, value=utils.GetKeys(utils.GetValueFromKey(BG3Database.Get("Trajectories"), self._SpellType.data.get()), []))
+        self._SpellAnimation  = ComboWidget(canvas_frame, label="Animation:",         labelWidth=maxWidth, index=BG3Database.GetIndex("SpellAnimation", self._SpellType.data.get()))
+        self._Trajectory      = ComboWidget(canvas_frame, label="Trajectory:",        labelWidth=maxWidth, index=BG3Database.GetIndex("Trajectories", self._SpellType.data.get()))
         self._Level           = ComboWidget(canvas_frame, label="Level:",             labelWidth=maxWidth, value=BG3Database.Get("Level", []))
         self._SpellSchool     = ComboWidget(canvas_frame, label="School:",            labelWidth=maxWidth, value=BG3Database.Get("SpellSchool", []))
         self._TargetFloor     = ComboWidget(canvas_frame, label="Target Floor:",      labelWidth=maxWidth, value=BG3Database.Get("TargetFloor", []))
@@ -272,6 +450,11 @@ class SpellDataWidget(tk.Frame):
         #self._VerbalIntent    .hide()
 
 
+        self.inputs: List[EntryWidget | ComboWidget] = [
+            self._ID, self._Name, self._Description, self._SpellType, self._SpellAnimation, self._Trajectory, self._Level, self._SpellSchool, self._TargetFloor, self._Radius,
+            self._TargetCount, self._ProjectileCount, self._SpellRollType, self._AttackType, self._SaveType, self._SaveDC, self._PreviewCursor, self._DamageType, self._VerbalIntent
+        ]
+
         self._SpellType.data.bind("<<ComboboxSelected>>", self.on_SpellType_Changed)
         self._SpellRollType.data.bind("<<ComboboxSelected>>", self.on_SpellRoll_Changed)
         
@@ -296,14 +479,14 @@ class SpellDataWidget(tk.Frame):
         spellType = self._SpellType.data.get()
 
         # Spell Animation
-        keys = utils.GetKeys(utils.GetValueFromKey(BG3Database.Get("SpellAnimation"), spellType), [])
-        self._SpellAnimation.data["values"] = keys
-        self.setCombo(self._SpellAnimation, utils.GetFirstIn(keys, ""))
+        index = BG3Database.GetIndex("SpellAnimation", spellType)
+        self._SpellAnimation.setValues(index.values, index)
+        self.setCombo(self._SpellAnimation, utils.GetFirstIn(index.values, ""))
 
         # Spell Trajectory
-        keys = utils.GetKeys(utils.GetValueFromKey(BG3Database.Get("Trajectories"), spellType), [])
-        self._Trajectory.data["values"] = keys
-        self.setCombo(self._Trajectory, utils.GetFirstIn(keys, ""))
+        index = BG3Database.GetIndex("Trajectories", spellType)
+        self._Trajectory.setValues(index.values, index)
+        self.setCombo(self._Trajectory, utils.GetFirstIn(index.values, ""))
 
         # Target Floor
         if spellType != "Target":
@@ -325,12 +508,25 @@ class SpellDataWidget(tk.Frame):
             self._SaveType.data["state"] = "enabled"
             self._SaveDC.data["state"] = "enabled"
 
+    # Whether the user has changed any field since the last fromSpell or clean
+    @property
+    def edited(self) -> bool:
+        return any(widget.dirty for widget in self.inputs)
+
+    # Also true when fields are only showing defaults the spell doesn't have yet
+    @property
+    def dirty(self) -> bool:
+        return self.defaulted or self.edited
+
+    def clean(self) -> None:
+        for widget in self.inputs:
+            widget.dirty = False
+
     def setEntry(self, widget: EntryWidget, value: str) -> None:
-        widget.data.delete(0, tk.END)
-        widget.data.insert(0, value)
+        widget.set(value)
 
     def setCombo(self, widget: ComboWidget, value: str) -> None:
-        widget.data.set(value)
+        widget.set(value)
 
     def fromSpell(self, spell: models.Spell) -> None:
         self.setEntry(self._ID,              spell.id or                "Default_Spell_ID")
@@ -352,10 +548,21 @@ class SpellDataWidget(tk.Frame):
         self.setCombo(self._SpellSchool,    spell.school or         utils.GetFirstIn(BG3Database.Get("SpellSchool"), ""))
         self.setCombo(self._DamageType,     spell.damageType or     utils.GetFirstIn(BG3Database.Get("DamageType"), ""))
 
-        spellType: str = self._SpellType.data.get()
+        spellType: str = self._SpellType.get()
         self.setCombo(self._SpellAnimation, spell.spellAnimation or utils.GetFirstIn(utils.GetValueFromKey(BG3Database.Get("SpellAnimation"), spellType), ""))
         self.setCombo(self._Trajectory,     spell.trajectory or     utils.GetFirstIn(utils.GetValueFromKey(BG3Database.Get("Trajectories"), spellType), ""))
 
+        # A field the spell has no value for shows a default, which still has to be written to the spell on save
+        # Compared with what is shown rather than tested for truth, so a field whose value is "" isn't saved on every switch
+        self.defaulted = any(widget.get() != value for (widget, value) in (
+            (self._ID, spell.id), (self._Name, spell.getName()), (self._Description, spell.description.value), (self._Radius, spell.targetRadius),
+            (self._TargetCount, spell.targetCount), (self._ProjectileCount, spell.projectileCount), (self._SaveDC, spell.saveDC),
+            (self._SpellRollType, spell.rollType), (self._AttackType, spell.attackType), (self._SaveType, spell.saveType),
+            (self._PreviewCursor, spell.previewCursor), (self._TargetFloor, spell.targetFloor), (self._VerbalIntent, spell.verbalIntent),
+            (self._SpellType, spell.spellType), (self._Level, spell.level), (self._SpellSchool, spell.school), (self._DamageType, spell.damageType),
+            (self._SpellAnimation, spell.spellAnimation), (self._Trajectory, spell.trajectory),
+        ))
+
     # Writes all the data in this widget to a spell
     def toSpell(self, spell: models.Spell) -> models.Spell:
 
@@ -365,34 +572,36 @@ class SpellDataWidget(tk.Frame):
         #    save[k] = v.data.get() or ""
         #print(save)
 
-        spell.id = self._ID.data.get()
-        spell.setName(self._Name.data.get())
-        spell.setDescription(self._Description.data.get())
-        spell.level = self._Level.data.get()
-        spell.targetCount = self._TargetCount.data.get()
-        spell.projectileCount = self._ProjectileCount.data.get()
-        spell.spellType = self._SpellType.data.get()
-        spell.spellAnimation = self._SpellAnimation.data.get()
-        spell.trajectory = self._Trajectory.data.get()
-        spell.school = self._SpellSchool.data.get()
-        spell.targetRadius = self._Radius.data.get()
-        spell.targetFloor = self._TargetFloor.data.get()
-        spell.previewCursor = self._PreviewCursor.data.get()
-        spell.damageType = self._DamageType.data.get()
-        spell.rollType = self._SpellRollType.data.get()
-        spell.attackType = self._AttackType.data.get()
-        spell.saveType = self._SaveType.data.get()
-        spell.saveDC = self._SaveDC.data.get()
-        spell.verbalIntent = self._VerbalIntent.data.get()
+        spell.id = self._ID.get()
+        spell.setName(self._Name.get())
+        spell.setDescription(self._Description.get())
+        spell.level = self._Level.get()
+        spell.targetCount = self._TargetCount.get()
+        spell.projectileCount = self._ProjectileCount.get()
+        spell.spellType = self._SpellType.get()
+        spell.spellAnimation = self._SpellAnimation.get()
+        spell.trajectory = self._Trajectory.get()
+        spell.school = self._SpellSchool.get()
+        spell.targetRadius = self._Radius.get()
+        spell.targetFloor = self._TargetFloor.get()
+        spell.previewCursor = self._PreviewCursor.get()
+        spell.damageType = self._DamageType.get()
+        spell.rollType = self._SpellRollType.get()
+        spell.attackType = self._AttackType.get()
+        spell.saveType = self._SaveType.get()
+        spell.saveDC = self._SaveDC.get()
+        spell.verbalIntent = self._VerbalIntent.get()
 
         return spell
 
 # A widget that holds all UI relevant to a spell
 class SpellWidget(tk.Frame):
     def __init__(self, master=None, **kwargs) -> None:
+        validator: validators.SpellValidator = utils.PopKwArgs(kwargs, "validator", None)
         super().__init__(master, **kwargs)
 
         self.ref_spell: models.Spell = None
+        self.validator: validators.SpellValidator = validator
 
         spellData_frame = tk.Frame(self)
         spellData_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -405,6 +614,7 @@ class SpellWidget(tk.Frame):
 
         self._ControllerImage = IconWidget(icon_container, label="Controller (64)")
         self._TooltipImage    = IconWidget(icon_container, label="Tooltip (380)")
+        self._SourceImage     = IconWidget(icon_container, label="Source (any)", extensions=(".dds", ".png", ".jpg", ".jpeg", ".tga", ".webp"))
 
         right_frame = tk.Frame(self)
         right_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(8,0))
@@ -420,6 +630,11 @@ class SpellWidget(tk.Frame):
     def TooltipImage(self) -> str:
         return self._TooltipImage.data.path
 
+    # Fills in whichever of the controller and tooltip icons are left empty
+    @property
+    def SourceImage(self) -> str:
+        return self._SourceImage.data.path
+
     @property
     def SpellLists(self) -> List[str]:
         return self.spellListWidget.SpellLists
@@ -430,21 +645,35 @@ class SpellWidget(tk.Frame):
 
         self._ControllerImage.data.display_image(spell.controllerIcon)
         self._TooltipImage.data.display_image(spell.tooltipIcon)
+        self._SourceImage.data.display_image(spell.sourceIcon)
 
         # Check / Uncheck boxes to match the input spell list
-        for (uuid, var) in self.spellListWidget._SpellLists:
-            var.set(uuid in spell.lists)
+        self.spellListWidget.setLists(spell.lists)
         
         self.ref_spell = spell
+        self.clean()
 
-    def save(self) -> None:
+    # Whether the user has changed anything since the spell was loaded or saved
+    @property
+    def edited(self) -> bool:
+        images = (self._ControllerImage, self._TooltipImage, self._SourceImage)
+        return self.spellDataWidget.edited or self.spellListWidget.dirty or any(image.data.dirty for image in images)
 
-        save = {}
-        for (k,v) in self.spellDataWidget.fields.items():
-            save[k] = v.data.get() or ""
+    # Whether save() would change the spell, including defaults that were only shown
+    @property
+    def dirty(self) -> bool:
+        return self.spellDataWidget.defaulted or self.edited
 
-        print(save)
+    def clean(self) -> None:
+        self.spellDataWidget.clean()
+        self.spellListWidget.dirty = False
+        for image in (self._ControllerImage, self._TooltipImage, self._SourceImage):
+            image.data.dirty = False
 
+    # Writes the widgets back to the spell, returning whether anything changed
+    def save(self) -> bool:
+        if not self.dirty:
+            return False
 
         self.spellDataWidget.toSpell(self.ref_spell)
 
@@ -452,8 +681,17 @@ class SpellWidget(tk.Frame):
 
         self.ref_spell.controllerIcon = self.ControllerImage
         self.ref_spell.tooltipIcon = self.TooltipImage
+        self.ref_spell.sourceIcon = self.SourceImage
 
         self.ref_spell.calcMetaValues()
+        self.spellDataWidget.defaulted = False
+
+        # Only the edited spell needs re-checking
+        if self.validator:
+            self.validator.updateSpell(self.ref_spell)
+
+        self.clean()
+        return True
 
 # A Reorderable list for spell selection and export order
 # TODO: Fix bug in which you must click in the area adjacent to the label and not the label
@@ -462,6 +700,9 @@ class ReorderableList(tk.Canvas):
 
     def __init__(self, master, **kwargs):
         self.cellHeight: int = kwargs.pop("cellHeight")
+
+        # Called with (ref_uuid, old index, new index) when the user drags an entry somewhere else
+        self.on_reorder: Callable[[str, int, int], None] = utils.PopKwArgs(kwargs, "on_reorder", None)
         self.borderPad: int = 4
         super().__init__(master, **kwargs, background="pink", relief="ridge", borderwidth=self.borderPad/2)
 
@@ -472,10 +713,14 @@ class ReorderableList(tk.Canvas):
         self.bind("<B1-Motion>", self.on_drag)
         self.bind("<ButtonRelease-1>", self.on_drag_end)
             
-    def add_widget(self, widget: any, ref_uuid: str, callback: Callable[[],None]) -> None:
+    # Appends the widget, or inserts it at index
+    def add_widget(self, widget: any, ref_uuid: str, callback: Callable[[],None], index: int = None) -> None:
         i = len(self.widget_data)
         winHnd = self.create_window(self.borderPad+ReorderableList.hOffset, (i*self.cellHeight)+self.borderPad, anchor=tk.NW, window=widget)
         self.widget_data.append({"handle": winHnd, "widget": widget, "ref_uuid": ref_uuid, "callback": callback})
+        if index is not None and index < i:
+            self.widget_data.insert(index, self.widget_data.pop())
+            self.redraw()
 
     def remove_widget(self, uuid: str) -> None:
         for d in self.widget_data:
@@ -485,6 +730,19 @@ class ReorderableList(tk.Canvas):
                 self.redraw()
                 break
     
+    def index(self, uuid: str) -> int | None:
+        for (i, d) in enumerate(self.widget_data):
+            if d["ref_uuid"] == uuid:
+                return i
+        return None
+
+    # Moves an entry to index, without calling on_reorder
+    def move(self, uuid: str, index: int) -> None:
+        i = self.index(uuid)
+        if i is not None and i != index:
+            self.widget_data.insert(index, self.widget_data.pop(i))
+            self.redraw()
+
     def redraw(self) -> None:
         for i, data in enumerate(self.widget_data):
             self.coords(data["handle"], self.borderPad+ReorderableList.hOffset, (i*self.cellHeight)+self.borderPad)
@@ -493,6 +751,12 @@ class ReorderableList(tk.Canvas):
         for d in self.widget_data:
             d["widget"].config(text=value[d["ref_uuid"]])
 
+    def renameLabel(self, uuid: str, text: str) -> None:
+        for d in self.widget_data:
+            if d["ref_uuid"] == uuid:
+                d["widget"].config(text=text)
+                break
+
     def on_widget_click(self, event) -> None:
         winHnd = self.find_closest(event.x, event.y)[0]
         index = self.find_widget_index(winHnd)
@@ -513,8 +777,13 @@ class ReorderableList(tk.Canvas):
             old_index = self.drag_data["index"]
             
             # Reorder the widgets list
-            self.widget_data.insert(new_index, self.widget_data.pop(old_index))
+            data = self.widget_data.pop(old_index)
+            self.widget_data.insert(new_index, data)
             self.redraw()
+
+            new_index = self.widget_data.index(data)
+            if self.on_reorder and new_index != old_index:
+                self.on_reorder(data["ref_uuid"], old_index, new_index)
             
             self.drag_data["handle"] = None
             self.drag_data["index"] = None
@@ -524,4 +793,86 @@ class ReorderableList(tk.Canvas):
             if winHnd == data["handle"]:
                 return i
         return None
-    
\ No newline at end of file
+
+if __name__ == "__main__":
+    import time
+
+    # Times switching the spell editor between spells without a display: a Tcl interpreter without Tk holds the
+    # fields' StringVars and the spell lists' IntVars, so every variable read, write and trace is real
+    # Only the Entry, Combobox and Checkbutton around them are left out, and icons aren't shown
+    BG3Database.LoadData()
+    interpreter = tk.Tcl()
+
+    # Stands in for the Entry or Combobox showing a variable
+    class HeadlessField:
+        def __init__(self, var: tk.StringVar) -> None:
+            self.var: tk.StringVar = var
+
+        def get(self) -> str:
+            return self.var.get()
+
+        def __setitem__(self, key: str, value) -> None:
+            pass
+
+    class HeadlessImage:
+        def __init__(self) -> None:
+            self.path: str = ""
+            self.dirty: bool = False
+
+        def display_image(self, path: str) -> None:
+            self.path = path or ""
+
+    def Headless(cls, **attributes):
+        widget = cls.__new__(cls)
+        widget.__dict__.update(attributes)
+        return widget
+
+    def Field(cls) -> EntryWidget | ComboWidget:
+        var = tk.StringVar(interpreter)
+        field = Headless(cls, var=var, data=HeadlessField(var), _value="", dirty=False)
+        var.trace_add("write", field.on_change)
+        return field
+
+    entries = ["_ID", "_Name", "_Description", "_Radius", "_TargetCount", "_ProjectileCount"]
+    combos = ["_SpellType", "_SpellAnimation", "_Trajectory", "_Level", "_SpellSchool", "_TargetFloor", "_SpellRollType", "_AttackType", "_SaveType", "_SaveDC", "_PreviewCursor", "_DamageType", "_VerbalIntent"]
+    fields = {name: Field(EntryWidget) for name in entries} | {name: Field(ComboWidget) for name in combos}
+    spellDataWidget = Headless(SpellDataWidget, inputs=list(fields.values()), defaulted=False, **fields)
+
+    spellListWidget = Headless(SpellListWidget, _SpellLists=[], _loading=False, dirty=False)
+    for uuid in data.spellLists.values():
+        var = tk.IntVar(interpreter)
+        var.trace_add("write", lambda *args, i=len(spellListWidget._SpellLists): spellListWidget.on_toggle(i))
+        spellListWidget._SpellLists.append((uuid, var))
+    spellListWidget._checked = [False] * len(spellListWidget._SpellLists)
+
+    images = {name: Headless(IconWidget, data=HeadlessImage()) for name in ("_ControllerImage", "_TooltipImage", "_SourceImage")}
+    spellWidget = Headless(SpellWidget, ref_spell=None, validator=None, spellDataWidget=spellDataWidget, spellListWidget=spellListWidget, **images)
+
+    # Two spells that differ in most fields and lists
+    lists = list(data.spellLists.values())
+    spells = []
+    for (i, (spellType, damageType, school)) in enumerate((("Projectile", "Fire", "Evocation"), ("Target", "Cold", "Abjuration"))):
+        spell = models.Spell(uuid=str(i))
+        (spell.id, spell.spellType, spell.level, spell.damageType, spell.school) = (f"Spell_{i}", spellType, str(i + 1), damageType, school)
+        spell.setName(f"Spell {i}")
+        spell.lists = lists[i::7]
+        spell.calcMetaValues()
+        spells.append(spell)
+    spellWidget.fromSpell(spells[0])
+    spellWidget.save()
+
+    # The best of a few runs, as saving and loading on a click does
+    def Switch(count: int, edit: bool) -> float:
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for i in range(count):
+                if edit:
+                    spellDataWidget._Radius.var.set(str(i))
+                spellWidget.save()
+                spellWidget.fromSpell(spells[(i + 1) % 2])
+            times.append((time.perf_counter() - start) / count * 1000000)
+        return min(times)
+
+    print(f"Switch, nothing edited:   {Switch(500, False):.0f} us")
+    print(f"Switch, one field edited: {Switch(500, True):.0f} us")
@@ -0,0 +1,101 @@
+from typing import List
+
+import os
+import glob
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import generator
+import writers
+from project import Project
+from data import BG3Database
+
+# The outcome of building one mod in a workspace
+class BuildResult:
+    def __init__(self, projectPath: str, modName: str = None, seconds: float = 0, error: str = None) -> None:
+        self.projectPath: str = projectPath
+        self.modName: str = modName
+        self.seconds: float = seconds
+        self.error: str = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self) -> str:
+        status = "OK" if self.ok else f"FAILED\n{self.error}"
+        return f"{self.modName or os.path.basename(self.projectPath):<32} {self.seconds*1000:>9.0f} ms  {status}"
+
+# Runs once per worker process, forked workers already have the database from the parent
+def _InitWorker() -> None:
+    if not BG3Database.IsLoaded():
+        BG3Database.LoadData()
+
+def _BuildProject(projectPath: str, modPath: str, pack: bool) -> BuildResult:
+    start = time.perf_counter()
+    result = BuildResult(projectPath)
+    try:
+        project = Project.Load(projectPath)
+        result.modName = project.modName
+        outPath = modPath if modPath is not None else project.modPath
+
+        modGenerator = generator.ModGenerator.FromProject(project)
+        if project.options.get("writeFiles", True):
+            modGenerator.export(outPath)
+        if pack or project.options.get("pack", False):
+            modGenerator.pack(outPath)
+        if project.options.get("archive"):
+            modGenerator.archive(outPath, project.options["archive"])
+    except Exception:
+        result.error = traceback.format_exc()
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+# Builds many mod projects across a process pool, loading the database once
+class Workspace:
+    def __init__(self, projectPaths: List[str], modPath: str = None, pack: bool = False, workers: int = None) -> None:
+        self.projectPaths: List[str] = Workspace.FindProjects(projectPaths)
+        self.modPath: str = modPath
+        self.pack: bool = pack
+        self.workers: int = workers
+
+    # Expands directories to the project files inside them
+    @staticmethod
+    def FindProjects(paths: List[str]) -> List[str]:
+        projects = []
+        for path in paths:
+            if os.path.isdir(path):
+                projects += sorted(glob.glob(os.path.join(path, "*" + Project.fileExtension)))
+            else:
+                projects.append(path)
+
+        return projects
+
+    # Decodes the icons used by more than one mod up front
+    # Forked workers inherit them, so shared assets are decoded once for the whole workspace
+    # Only controller icons are decoded, into the atlas. Tooltip icons are copied as they are and source icons go through the icon deriver
+    def preloadSharedIcons(self) -> int:
+        counts = Counter()
+        for path in self.projectPaths:
+            try:
+                counts.update({spell.controllerIcon for spell in Project.Load(path).spells if spell.controllerIcon})
+            except (OSError, ValueError):
+                pass
+
+        shared = [p for (p, n) in counts.items() if n > 1 and os.path.exists(p)]
+        for path in shared:
+            writers.imageCache.get(path)
+
+        return len(shared)
+
+    def build(self) -> List[BuildResult]:
+        if not BG3Database.IsLoaded():
+            BG3Database.LoadData()
+        self.preloadSharedIcons()
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_InitWorker) as executor:
+            futures = [executor.submit(_BuildProject, path, self.modPath, self.pack) for path in self.projectPaths]
+            return [f.result() for f in futures]
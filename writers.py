@@ -1,22 +1,72 @@
 from typing import List
 from typing import Dict
+from typing import Set
+from typing import Iterator
 
 import xml.etree.ElementTree as ET
 from PIL import Image
+import numpy as np
 import os
+import io
+import re
 import json
 import shutil
+import threading
+from collections import OrderedDict
 
 import models
+import lsf
+import bcn
+from dds import DDS
+from cache import RenderCache
 from utils import utils
 
+# Decoded images shared by every atlas built in this process, keyed by path and modification time
+# Mods that reuse the same icons only decode them once. Safe to share between threads, e.g. the generation server's workers
+class ImageCache:
+    def __init__(self, maxImages: int = 4096) -> None:
+        self.maxImages: int = maxImages
+        self._images: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path: str) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    # The returned image is shared, so callers must not modify it
+    def get(self, path: str) -> Image.Image:
+        key = self._key(path)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+
+        # Decoded outside the lock, two threads may both decode a new image but only one is kept
+        with Image.open(path) as image:
+            image.load()
+            decoded = image.copy()
+
+        with self._lock:
+            decoded = self._images.setdefault(key, decoded)
+            self._images.move_to_end(key)
+            if len(self._images) > self.maxImages:
+                self._images.popitem(last=False)
+
+        return decoded
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+imageCache = ImageCache()
+
 # Writes the Localization to it's required mod location
 class LocalizationFile:
     fileExtension: str = ".loca.xml"
 
-    def __init__(self, fileName: str) -> None:
+    def __init__(self, fileName: str, cache: RenderCache = None) -> None:
         self.fileName: str = fileName
         self.localizations: Dict[str, models.Localization] = {}
+        self.cache: RenderCache = cache
 
     def addElement(self, localization: models.Localization) -> None:
         self.localizations[localization.uuid] = localization
@@ -24,64 +74,313 @@ class LocalizationFile:
     def __str__(self) -> str:
         return str(ET.tostring(self.dump()))
     
-    def dump(self) -> ET.Element:
+    def dump(self, language: str = None) -> ET.Element:
         root = ET.Element("contentList")
         for (_,v) in self.localizations.items():
-            root.append(v.toXML())
+            root.append(v.toXML(language))
         
         return root
 
-    def export(self, path: str) -> None:
+    # Every language any localization has a value for
+    def languages(self) -> List[str]:
+        languages = [models.Localization.DEFAULT_LANGUAGE]
+        for v in self.localizations.values():
+            for language in v.languages:
+                if language not in languages:
+                    languages.append(language)
+
+        return languages
+
+    def export(self, path: str, language: str = None) -> None:
         # Create the directory if it doesn't exist
         if not os.path.exists(path):
             os.makedirs(path)
 
-        tree = ET.ElementTree(self.dump())
         with open(os.path.join(path, self.fileName + self.fileExtension), "wb") as file:
-            tree.write(file, encoding="utf-8")
+            for chunk in self.stream(language):
+                file.write(chunk)
+
+    # Stream one content element at a time instead of building the whole tree
+    def stream(self, language: str = None):
+        yield b"<contentList>"
+        yield from self.fragments(language)
+        yield b"</contentList>"
+
+    # Every content element, taken from the render cache when the localization hasn't changed
+    def fragments(self, language: str = None) -> List[bytes]:
+        if self.cache is None:
+            return [self.render(v, language) for v in self.localizations.values()]
+
+        keys = {("loca", *v.renderKey(language)): v for v in self.localizations.values()}
+        cached = self.cache.fetch(list(keys.keys()), lambda k: self.render(keys[k], language))
+        return [cached[k] for k in keys]
+
+    def render(self, localization: models.Localization, language: str = None) -> bytes:
+        return ET.tostring(localization.toXML(language), encoding="unicode").encode("utf-8")
+
+    def serialize(self, language: str = None) -> bytes:
+        return b"".join(self.stream(language))
 
 # Writes the Spell template it's required mod location
+# With factor=True the data lines many spells share are moved into generated base entries the spells inherit with `using`
+# With merge=True an existing file is updated in place: entries of these spells are replaced where they stand,
+# new ones are appended (new base entries go before the first entry of these spells), and every other entry (e.g. written by hand) is kept as it is
 class SpellFile:
     fileExtension: str = ".txt"
+    ENTRY = re.compile(rb'^new entry "([^"]*)"', re.MULTILINE)
+    STATEMENT = re.compile(rb'^[ \t]*(new entry|type|using|data) .*$', re.MULTILINE)
 
-    def __init__(self, fileName: str) -> None:
+    def __init__(self, fileName: str, cache: RenderCache = None, factor: bool = False, merge: bool = False) -> None:
         self.fileName: str = fileName
         self.spells: List[models.Spell] = [] 
+        self.cache: RenderCache = cache
+        self.factor: bool = factor
+        self.merge: bool = merge
     
     def addSpell(self, spell: models.Spell) -> None:
         self.spells.append(spell)
     
     def __str__(self) -> str:
-        value = ""
-        for s in self.spells:
-            value += str(s) + "\n\n"
-
-        return value
+        return "".join(self.fragments())
+
+    # Every spell's stats block, taken from the render cache when the spell hasn't changed
+    # Factored blocks depend on every other spell, so they are always rendered
+    def fragments(self) -> List[str]:
+        if self.factor:
+            return self.factored()
+
+        if self.cache is None:
+            return [self.render(s) for s in self.spells]
+
+        keys = [("stats", *s.statsKey()) for s in self.spells]
+        spells = dict(zip(keys, self.spells))
+        cached = self.cache.fetch(keys, lambda k: self.render(spells[k]).encode("utf-8"))
+        return [cached[k].decode("utf-8") for k in keys]
+
+    def render(self, spell: models.Spell) -> str:
+        return str(spell) + "\n\n"
+
+    # One stats entry, inheriting from using when it's set
+    @staticmethod
+    def RenderEntry(name: str, using: str | None, stats: List[tuple[str, str]]) -> str:
+        lines = [f'new entry "{name}"', f'type "SpellData"']
+        if using:
+            lines.append(f'using "{using}"')
+        lines += [f'data "{k}" "{v}"' for (k, v) in stats]
+        return "\n".join(lines) + "\n\n"
+
+    # Base entries first, then every spell with only the lines its base doesn't already give it
+    # Each spell type gets a base of the values at least two of its spells share, and spells whose remaining
+    # shared values are identical get a second level base of those, so a spell is left with little more than its own names
+    def factored(self) -> List[str]:
+        stats = [spell.toStats() for spell in self.spells]
+        groups: Dict[str, List[int]] = {}
+        for (i, spell) in enumerate(self.spells):
+            groups.setdefault(f"{spell.spellType}", []).append(i)
+
+        bases = []
+        entries = [None] * len(self.spells)
+        for (spellType, members) in groups.items():
+            # The most common value of each key, when it's shared
+            counts: Dict[tuple[str, str], int] = {}
+            for i in members:
+                for pair in stats[i]:
+                    counts[pair] = counts.get(pair, 0) + 1
+            base: Dict[str, tuple[str, int]] = {}
+            for ((k, v), n) in counts.items():
+                if n > 1 and n > base.get(k, (None, 0))[1]:
+                    base[k] = (v, n)
+
+            # A lone spell, or spells with nothing in common, are written out whole rather than from an empty base
+            if len(members) < 2 or not base:
+                for i in members:
+                    entries[i] = SpellFile.RenderEntry(self.spells[i].entryName(), None, stats[i])
+                continue
+
+            baseName = f"{self.fileName}_Base_{spellType}"
+            bases.append(SpellFile.RenderEntry(baseName, None, [(k, base[k][0]) for (k, _) in stats[members[0]] if k in base]))
+
+            # What each spell still overrides, split into values other spells share and values only it has
+            overrides = {i: [(k, v) for (k, v) in stats[i] if base.get(k, (None,))[0] != v] for i in members}
+            signatures = {i: tuple(pair for pair in overrides[i] if counts[pair] > 1) for i in members}
+
+            signatureCounts: Dict[tuple, int] = {}
+            for signature in signatures.values():
+                signatureCounts[signature] = signatureCounts.get(signature, 0) + 1
+
+            # A second level base only pays off when it saves more lines than its own header costs
+            subBases: Dict[tuple, str] = {}
+            for (signature, n) in signatureCounts.items():
+                if signature and (n - 1) * len(signature) > 3:
+                    name = f"{baseName}_{utils.Generate_UUID(*(f'{k}={v}' for (k, v) in signature))[:8]}"
+                    subBases[signature] = name
+                    bases.append(SpellFile.RenderEntry(name, baseName, list(signature)))
+
+            for i in members:
+                signature = signatures[i]
+                if signature in subBases:
+                    entries[i] = SpellFile.RenderEntry(self.spells[i].entryName(), subBases[signature], [pair for pair in overrides[i] if pair not in signature])
+                else:
+                    entries[i] = SpellFile.RenderEntry(self.spells[i].entryName(), baseName, overrides[i])
+
+        return bases + entries
     
     def export(self, path: str) -> None:
         # Create the directory if it doesn't exist
         if not os.path.exists(path):
             os.makedirs(path)
 
-        with open(os.path.join(path, self.fileName + self.fileExtension), "wb") as file:
-            file.write(str(self).encode("utf-8"))
+        filePath = os.path.join(path, self.fileName + self.fileExtension)
+        if not self.merge:
+            with open(filePath, "wb") as file:
+                file.write(self.serialize())
+            return
+
+        existing = self.read(filePath)
+        chunks = self.merged(existing) if existing else [self.serialize()]
+        if existing and len(chunks) == 1 and chunks[0] is existing:
+            return
+
+        # Written beside the old file and swapped in, so a failure never leaves half a file
+        temporary = filePath + ".tmp"
+        with open(temporary, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(temporary, filePath)
+
+    def read(self, filePath: str) -> bytes | None:
+        try:
+            with open(filePath, "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    # The byte range of every entry in a stats file, in file order. An entry runs up to the next one
+    @staticmethod
+    def Index(data: bytes) -> List[tuple[str, int, int]]:
+        starts = [(m.group(1).decode("utf-8", errors="replace"), m.start()) for m in SpellFile.ENTRY.finditer(data)]
+        ends = [start for (_, start) in starts[1:]] + [len(data)]
+        return [(name, start, end) for ((name, start), end) in zip(starts, ends)]
+
+    # The existing file with this file's entries put in, as chunks to be written in order
+    # Unchanged entries and everything else are slices of the old file, and when nothing changed the old file is the only chunk
+    def merged(self, existing: bytes) -> List[bytes]:
+        ours: Dict[str, bytes] = {}
+        for fragment in self.fragments():
+            ours[fragment[11:fragment.index('"', 11)]] = fragment.encode("utf-8")
+
+        # Generated base entries, those from an earlier factored build that aren't generated any more are dropped
+        basePrefix = f"{self.fileName}_Base_"
+
+        index = SpellFile.Index(existing)
+        chunks = [existing[:index[0][1]] if index else existing]
+        written = set()
+        changed = False
+        first = None
+        for (name, start, end) in index:
+            block = existing[start:end]
+            if name in written or (name not in ours and name.startswith(basePrefix)):
+                changed = True
+                continue
+
+            if name in ours:
+                if first is None:
+                    first = len(chunks)
+                written.add(name)
+                fragment = ours[name]
+
+                # Hand-written text between this entry and the next, e.g. a comment above the next entry, is kept
+                trailing = SpellFile.Trailing(block)
+                if trailing:
+                    fragment = fragment.rstrip(b"\n") + trailing
+                if block != fragment:
+                    (block, changed) = (fragment, True)
+            chunks.append(block)
+
+        # New bases go in front of this file's first entry, so no entry uses a base that is only defined below it
+        added = [(name, fragment) for (name, fragment) in ours.items() if name not in written]
+        bases = [fragment for (name, fragment) in added if name.startswith(basePrefix)]
+        if first is not None and bases:
+            chunks[first:first] = bases
+            added = [(name, fragment) for (name, fragment) in added if not name.startswith(basePrefix)]
+            changed = True
+
+        for (name, fragment) in added:
+            if not chunks[-1].endswith(b"\n\n"):
+                chunks.append(b"\n" if chunks[-1].endswith(b"\n") or not chunks[-1] else b"\n\n")
+            chunks.append(fragment)
+            changed = True
+
+        return chunks if changed else [existing]
+
+    # What follows the last statement of an entry's block, when it is more than blank lines
+    @staticmethod
+    def Trailing(block: bytes) -> bytes:
+        last = None
+        for last in SpellFile.STATEMENT.finditer(block):
+            pass
+        rest = block[last.end():] if last else b""
+        return rest if rest.strip() else b""
+
+    # Merges into existing when it's given, see merged()
+    def serialize(self, existing: bytes = None) -> bytes:
+        if existing and self.merge:
+            return b"".join(self.merged(existing))
+        return str(self).encode("utf-8")
 
 # Writes the SpellList Combiner to it's required mod location
+# One node per spell list, with every spell on that list joined by ';'
 class SpellListCombinerFile:
     fileExtension = ".lsj"
 
     def __init__(self) -> str:
         self.fileName: str = "SpellLists"
-        self.lists: List[tuple[str, List[str]]] = []
+        self.lists: Dict[str, List[str]] = {}
+        self.spells: List[str] = []
 
     def addElement(self, name: str, listUUIDs: List[str]) -> None:
-        self.lists.append((listUUIDs, name))
+        self.spells.append(name)
+        for uuid in listUUIDs:
+            if uuid:
+                self.lists.setdefault(uuid, []).append(name)
         
     def dump(self) -> str:
         root = []
 
-        for e in self.lists:
-            root.append(self.createNode(e[1], [], "", e[0]))
+        for (uuid, spells) in self.lists.items():
+            root.append(self.createNode(";".join(spells), [], "", [uuid]))
+
+        return root
+
+    # Folds this file's spells into an existing .lsj
+    # Entries from other mods are kept, and this file's spells are moved to the lists they are on now
+    # previous are names an earlier build generated, e.g. of spells renamed or removed since, which are dropped from every list
+    def merge(self, existing: List[dict], previous: Set[str] = None) -> List[dict]:
+        ours = set(self.spells) | (previous or set())
+        remaining = dict(self.lists)
+        root = []
+
+        for node in existing:
+            spellLists = []
+            for entry in node.get("SpellLists", []):
+                spells = [s for s in entry.get("Spells", "").split(";") if s]
+                kept = [s for s in spells if s not in ours]
+
+                uuid = entry.get("UUID", "")
+                if uuid in remaining and not entry.get("AdditionalSpellLists"):
+                    kept += [s for s in remaining.pop(uuid) if s not in kept]
+
+                # Drop entries that only held this file's spells
+                if kept or not spells:
+                    entry["Spells"] = ";".join(kept)
+                    spellLists.append(entry)
+
+            if spellLists:
+                node["SpellLists"] = spellLists
+                root.append(node)
+
+        for (uuid, spells) in remaining.items():
+            root.append(self.createNode(";".join(spells), [], "", [uuid]))
 
         return root
 
@@ -110,8 +409,37 @@ class SpellListCombinerFile:
         if not os.path.exists(path):
             os.makedirs(path)
 
-        with open(os.path.join(path, self.fileName + self.fileExtension), "w", encoding="utf-8") as file:
-            json.dump(self.dump(), file, indent=4)
+        filePath = os.path.join(path, self.fileName + self.fileExtension)
+        existing = self.read(filePath)
+
+        with open(filePath, "wb") as file:
+            file.write(self.serialize(existing))
+
+    # The entries of an existing .lsj, or None if there isn't a readable one
+    def read(self, filePath: str) -> List[dict] | None:
+        if not os.path.exists(filePath):
+            return None
+
+        try:
+            with open(filePath, "rb") as file:
+                return self.parse(file.read())
+        except OSError:
+            return None
+
+    def parse(self, data: bytes) -> List[dict] | None:
+        if not data:
+            return None
+
+        try:
+            existing = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+        return existing if type(existing) == list else None
+
+    def serialize(self, existing: List[dict] = None, previous: Set[str] = None) -> bytes:
+        root = self.merge(existing, previous) if existing else self.dump()
+        return json.dumps(root, indent=4).encode("utf-8")
 
 # Moves images to their respective locations
 class ImageMover:
@@ -133,12 +461,22 @@ class ImageMover:
                 if os.path.exists(iv.inPath):
                     shutil.copy(iv.inPath, path)
 
+    # The moved images as (outPath, inPath) pairs, for writing somewhere other than disc
+    # Only the paths are returned, sinks read the icons one at a time as they copy them
+    def files(self) -> Iterator[tuple[str, str]]:
+        for iv in self.imageViews:
+            if iv.inPath and os.path.exists(iv.inPath):
+                yield (iv.outPath, iv.inPath)
+
 # Writes the Merged file to it's required mod location
 class MergedFile:
     fileExtension: str = ".lsf.lsx"
 
-    def __init__(self, uuid, name, sourceFile, template) -> None:
+    def __init__(self, uuid, name, sourceFile, template, binary: bool = False) -> None:
         self.fileName: str = "_merged"
+        self.binary: bool = binary
+        if binary:
+            self.fileExtension = ".lsf"
         self.uuid: str = uuid
         self.name: str = name
         self.sourceFile: str = sourceFile
@@ -177,62 +515,152 @@ class MergedFile:
         if not os.path.exists(path):
             os.makedirs(path)
 
-        tree = ET.ElementTree(self.dump())
         with open(os.path.join(path, self.fileName + self.fileExtension), "wb") as file:
-            tree.write(file, encoding="utf-8")
+            file.write(self.serialize())
+
+    def serialize(self) -> bytes:
+        if self.binary:
+            return lsf.LSFWriter().write(self.dump())
+        return ET.tostring(self.dump(), encoding="unicode").encode("utf-8")
 
 # Creates and writes the Atlas to it's required mod location
 class AtlasFile:
     fileExtension: str = ".dds"
 
-    def __init__(self, uuid: str, fileName: str, atlasTemplate: str, iconSize: tuple[int,int], icons: List[str]) -> None:
+    # Atlases with at least this many pixels are assembled and encoded a band of rows at a time
+    TILED_PIXELS: int = 4096 * 4096
+    BAND_HEIGHT: int = 256
+
+    def __init__(self, uuid: str, fileName: str, atlasTemplate: str, iconSize: tuple[int,int], icons: List[str], compression: str = None, bandHeight: int = None) -> None:
         self.fileName: str = fileName
         self.uuid: str = uuid
 
+        # "BC1" / "BC3" to block compress the atlas with a mip chain, None keeps PIL's uncompressed output
+        self.compression: str = compression
+
         self.atlasTemplate: str = atlasTemplate
         self.size: tuple[int,int] = utils.Get_Image_Dims(atlasTemplate) or [2048,2048]
         self.iconSize: tuple[int,int] = (iconSize,iconSize)
         self.icons: List[str] = icons
 
+        # Rows per band when tiled, None picks one for atlases of TILED_PIXELS or more
+        self.bandHeight: int = bandHeight
+
     def addIcon(self, icon: str) -> None:
         self.icons.append(icon)
 
+    # Large atlases are never held in memory whole, peak memory is about one band
+    @property
+    def tiled(self) -> bool:
+        return self.bandHeight is not None or self.size[0] * self.size[1] >= self.TILED_PIXELS
+
     def dump(self) -> Image:
         count = [int(self.size[0] / self.iconSize[0]),int(self.size[1] / self.iconSize[1])]
         x = 0
         y = 0
         
-        tmp = Image.open(self.atlasTemplate)
-        image = tmp.copy()
-        tmp.close()
+        with Image.open(self.atlasTemplate) as template:
+            image = template.convert("RGBA")
 
         for i,path in enumerate(self.icons):
             if i >= count[0]*count[1]:
                 break
 
             if path and os.path.exists(path):
-                with Image.open(path) as icon:
-                    image.paste(icon, (x*self.iconSize[0],y*self.iconSize[1]))
+                image.paste(imageCache.get(path), (x*self.iconSize[0],y*self.iconSize[1]))
             x += 1
             if x >= count[0]:
                 x = 0
                 y += 1
         return image
+
+    # The largest band of at most BAND_HEIGHT rows that is a whole number of blocks and divides the atlas
+    def _bandHeight(self) -> int:
+        if self.bandHeight:
+            return self.bandHeight
+
+        height = self.size[1]
+        for band in range(min(self.BAND_HEIGHT, height) // 4 * 4, 0, -4):
+            if height % band == 0:
+                return band
+        return height
+
+    # Rows top to top + height of the template as RGBA, never kept or cached
+    # A .dds template is read a band at a time, any other is opened, cropped and closed again for each band
+    def templateBand(self, top: int, height: int) -> Image.Image:
+        if self.atlasTemplate.lower().endswith(".dds"):
+            return DDS.ReadBand(self.atlasTemplate, top, height).convert("RGBA")
+
+        with Image.open(self.atlasTemplate) as template:
+            return template.crop((0, top, self.size[0], top + height)).convert("RGBA")
+
+    # The atlas as RGBA row bands, each decoded from the template and pasted into on its own
+    def bands(self) -> Iterator[np.ndarray]:
+        (width, height) = self.size
+        (iconWidth, iconHeight) = self.iconSize
+        count = [int(width / iconWidth), int(height / iconHeight)]
+        bandHeight = self._bandHeight()
+        for top in range(0, height, bandHeight):
+            band = self.templateBand(top, bandHeight)
+
+            # Every icon row overlapping the band, pasting clips the parts outside it
+            for row in range(top // iconHeight, min(count[1], (top + bandHeight + iconHeight - 1) // iconHeight)):
+                for column in range(count[0]):
+                    i = row * count[0] + column
+                    path = self.icons[i] if i < len(self.icons) else None
+                    if path and os.path.exists(path):
+                        band.paste(imageCache.get(path), (column * iconWidth, row * iconHeight - top))
+
+            yield np.asarray(band, dtype=np.uint8)
+
+    # The .dds file in chunks, tiled atlases are built one band at a time as they are consumed
+    def stream(self) -> Iterator[bytes]:
+        if not self.tiled:
+            yield self.serialize()
+            return
+
+        (width, height) = self.size
+        if self.compression:
+            yield from bcn.BCEncoder(self.compression).encodeBands(self.bands(), width, height, self._bandHeight())
+        else:
+            # The layout PIL writes for RGBA
+            yield DDS.Header(width, height, mipCount=0, bgra=True)
+            for band in self.bands():
+                yield Image.fromarray(band, "RGBA").tobytes("raw", "BGRA")
         
     def export(self, modPath: str) -> None:        
         # Create the directory if it doesn't exist
         if modPath and not os.path.exists(modPath):
             os.makedirs(modPath)
 
-        self.dump().save(os.path.join(modPath, self.fileName+self.fileExtension))
+        if self.compression or self.tiled:
+            with open(os.path.join(modPath, self.fileName+self.fileExtension), "wb") as file:
+                for chunk in self.stream():
+                    file.write(chunk)
+        else:
+            self.dump().save(os.path.join(modPath, self.fileName+self.fileExtension))
+
+    def serialize(self) -> bytes:
+        if self.tiled:
+            return b"".join(self.stream())
+
+        if self.compression:
+            return bcn.BCEncoder(self.compression).encode(self.dump())
+
+        buffer = io.BytesIO()
+        self.dump().save(buffer, format="DDS")
+        return buffer.getvalue()
 
 # Writes the Atlas Template to it's required mod locatin
 class AtlasTemplateFile:
     fileExtension: str = ".lsx"
 
-    def __init__(self, fileName: str, path: str, atlas: AtlasFile, icons: [str]) -> None:
+    def __init__(self, fileName: str, path: str, atlas: AtlasFile, icons: [str], binary: bool = False) -> None:
         self.fileName: str = fileName
         self.path: str = path
+        self.binary: bool = binary
+        if binary:
+            self.fileExtension = ".lsf"
 
         self.atlas: AtlasFile = atlas
         self.icons: List[str] = icons
@@ -309,8 +737,38 @@ class AtlasTemplateFile:
         if not os.path.exists(path):
             os.makedirs(path)
 
-        tree = ET.ElementTree(self.dump())
         with open(os.path.join(path, self.fileName + self.fileExtension), "wb") as file:
-            tree.write(file, encoding="utf-8")
-
-
+            file.write(self.serialize())
+
+    def serialize(self) -> bytes:
+        if self.binary:
+            return lsf.LSFWriter().write(self.dump())
+        return ET.tostring(self.dump(), encoding="unicode").encode("utf-8")
+
+
+
+if __name__ == "__main__":
+    import time
+    from data import BG3Database
+
+    BG3Database.LoadData()
+    schools = BG3Database.Get("SpellSchool")
+    damageTypes = BG3Database.Get("DamageType")
+    spells = []
+    for i in range(10000):
+        spell = models.Spell(uuid=str(i))
+        (spell.id, spell.spellType, spell.level) = (f"Spell_{i}", "Projectile", str(i % 4))
+        (spell.school, spell.damageType) = (schools[i % 3], damageTypes[i % 2])
+        spell.setStableUUIDs("Benchmark")
+        spell.calcMetaValues()
+        spells.append(spell)
+
+    for factor in (False, True):
+        spellFile = SpellFile(fileName="Benchmark", factor=factor)
+        for spell in spells:
+            spellFile.addSpell(spell)
+
+        start = time.perf_counter()
+        data = spellFile.serialize()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{'Factored' if factor else 'Plain'}: {len(data) / 1024:.0f} KB, {data.count(b'new entry')} entries, {data.count(chr(10).encode())} lines in {elapsed:.0f} ms")